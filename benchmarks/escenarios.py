@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+# Escenarios cronometrados del ETL y los dashboards, sin depender de la API real.
+#
+#   python -m benchmarks.escenarios --filas 10000
+#   python -m benchmarks.escenarios --filas 1000000 --url postgresql://... --comparar benchmarks/resultados/anterior.json
+#
+# Escenarios:
+#   extraccion   ciudades/s contra benchmarks.servidor_falso
+#   carga_orm    filas/s de guardar_datos_en_bd
+#   carga_bulk   filas/s de guardar_datos_en_bd_bulk
+#   dashboard_*  tiempo de las consultas que hace cada dashboard al cargar
+#
+# Los resultados se guardan en JSON (benchmarks/resultados/) para comparar ejecuciones.
+#
+# La extracción se mide por defecto con la configuración del ETL (el .env y
+# las mismas variables: TAMANO_LOTE, MAX_CONCURRENCIA, PETICIONES_POR_SEGUNDO);
+# la latencia y los errores del servidor falso son del escenario, no del ETL.
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+load_dotenv(dotenv_path=Path(__file__).resolve().parents[1] / ".env")
+
+DIRECTORIO_RESULTADOS = os.path.join(os.path.dirname(__file__), "resultados")
+
+
+def cronometrar(funcion, repeticiones):
+    # funcion(rep) -> unidades procesadas (ciudades, filas...) o None
+    tiempos, unidades = [], None
+    for rep in range(repeticiones):
+        inicio = time.perf_counter()
+        unidades = funcion(rep)
+        tiempos.append(time.perf_counter() - inicio)
+
+    mediana = statistics.median(tiempos)
+    resultado = {
+        "mediana_s": mediana,
+        "min_s": min(tiempos),
+        "max_s": max(tiempos),
+        "repeticiones": repeticiones,
+    }
+    if unidades:
+        resultado["unidades"] = unidades
+        resultado["por_segundo"] = unidades / mediana if mediana > 0 else None
+    return resultado
+
+
+def _datos_sinteticos(filas, ciudades, desplazamiento):
+    # Filas con el formato de procesar_respuesta y observaciones únicas
+    base = datetime(2000, 1, 1) + timedelta(days=desplazamiento)
+    return [
+        {
+            "ciudad": f"Carga {i % ciudades:03d}",
+            "pais": "Benchmark",
+            "temperatura": 10 + (i % 250) / 10,
+            "humedad": i % 100,
+            "descripcion": "Sunny",
+            "fecha_extraccion": (base + timedelta(minutes=i)).isoformat(),
+            "fecha_observacion": (base + timedelta(minutes=i)).isoformat(),
+        }
+        for i in range(filas)
+    ]
+
+
+def escenario_extraccion(args):
+    from benchmarks.servidor_falso import ServidorFalso
+
+    with ServidorFalso(
+        latencia_ms=args.latencia_ms,
+        tasa_errores=args.tasa_errores,
+        limite_por_segundo=args.limite_por_segundo
+    ) as servidor:
+        os.environ.update({
+            "API_KEY": "benchmark",
+            "WEATHERSTACK_BASE_URL": servidor.url,
+            "CIUDADES": ",".join(f"Ciudad {i:04d}" for i in range(args.ciudades_api)),
+            "CACHE_TTL_SEGUNDOS": "0",
+            "MAX_CONCURRENCIA": str(args.concurrencia),
+            "TAMANO_LOTE": str(args.tamano_lote),
+            "PETICIONES_POR_SEGUNDO": str(args.peticiones_por_segundo),
+        })
+        from scripts.extractor import WeatherstackExtractor
+
+        extractor = WeatherstackExtractor()
+        try:
+            resultado = cronometrar(
+                lambda rep: len(extractor.ejecutar_extraccion()), args.repeticiones
+            )
+        finally:
+            extractor.cerrar()
+
+        resultado["reintentos"] = sum(l["intentos"] - 1 for l in extractor.latencias)
+        resultado["peticiones_servidor"] = servidor.peticiones
+        resultado["limitadas_servidor"] = servidor.limitadas
+    return resultado
+
+
+def escenario_carga(args, bulk):
+    from scripts.loader import guardar_datos_en_bd, guardar_datos_en_bd_bulk
+
+    # Cada repetición usa fechas distintas: siempre son filas nuevas
+    desplazamiento = 0 if bulk else 5000
+
+    def cargar(rep):
+        datos = _datos_sinteticos(args.filas_carga, 50, desplazamiento + rep * 400)
+        if bulk:
+            return guardar_datos_en_bd_bulk(datos, modo="ignorar")
+        guardar_datos_en_bd(datos)
+        return len(datos)
+
+    return cronometrar(cargar, args.repeticiones)
+
+
+def escenarios_dashboards(args):
+    from streamlit.logger import set_log_level
+    from scripts import consultas
+
+    # Fuera de `streamlit run` cada caché avisa que no hay runtime
+    set_log_level("error")
+
+    ciudades = consultas.listar_ciudades(("benchmark", "ciudades"))[:5]
+    hasta = datetime.utcnow()
+    desde = hasta - timedelta(days=7)
+
+    # Lo que ejecuta cada dashboard en una carga completa (con caché fría)
+    dashboards = {
+        "dashboard_app": lambda v: (
+            consultas.resumen(v, None, desde, hasta),
+            consultas.registros(v, None, desde, hasta),
+        ),
+        "dashboard_interactive": lambda v: (
+            consultas.listar_ciudades(v),
+            consultas.registros(v, ciudades, desde, hasta),
+            consultas.serie(v, "temperatura", ciudades, desde, hasta),
+        ),
+        "dashboard_advanced": lambda v: (
+            consultas.conteos(v),
+            consultas.clima_actual(v),
+            consultas.registros(v, ciudades, desde, hasta),
+            consultas.serie(v, "temperatura", ciudades, desde, hasta),
+            consultas.estadisticas(v),
+            consultas.metricas_etl(v),
+        ),
+    }
+
+    def medir(nombre, funcion):
+        # Una `version` distinta por repetición evita los resultados cacheados
+        return lambda rep: funcion((nombre, rep)) and None
+
+    return {
+        nombre: cronometrar(medir(nombre, funcion), args.repeticiones)
+        for nombre, funcion in dashboards.items()
+    }
+
+
+def _commit_actual():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def comparar(actual, anterior):
+    print(f"\nComparación con {anterior['fecha']} ({anterior.get('commit')}):")
+    for nombre, r in actual["escenarios"].items():
+        previo = anterior["escenarios"].get(nombre)
+        if not previo:
+            continue
+        cambio = (r["mediana_s"] / previo["mediana_s"] - 1) * 100 if previo["mediana_s"] else 0
+        print(f"  {nombre:<24} {previo['mediana_s']:9.3f}s -> {r['mediana_s']:9.3f}s ({cambio:+.1f}%)")
+
+
+def imprimir(resultados):
+    for nombre, r in resultados["escenarios"].items():
+        tasa = f"  {r['por_segundo']:,.0f}/s" if r.get("por_segundo") else ""
+        print(f"{nombre:<24} mediana={r['mediana_s']:9.3f}s  min={r['min_s']:9.3f}s{tasa}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks del ETL y los dashboards")
+    parser.add_argument("--url", help="Base a medir (por defecto un SQLite temporal)")
+    parser.add_argument("--filas", type=int, default=10_000, help="Histórico sintético a generar")
+    parser.add_argument("--ciudades", type=int, default=100)
+    parser.add_argument("--sin-generar", action="store_true", help="Usar los datos que ya tiene --url")
+    parser.add_argument("--escenarios", default="extraccion,carga_orm,carga_bulk,dashboards")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--filas-carga", type=int, default=5_000)
+    parser.add_argument("--ciudades-api", type=int, default=100)
+    # Mismas variables y valores por defecto que WeatherstackExtractor
+    parser.add_argument("--concurrencia", type=int, default=int(os.getenv("MAX_CONCURRENCIA", "1")))
+    parser.add_argument("--tamano-lote", type=int, default=int(os.getenv("TAMANO_LOTE", "1")))
+    parser.add_argument("--peticiones-por-segundo", type=float,
+                        default=float(os.getenv("PETICIONES_POR_SEGUNDO", "0")))
+    parser.add_argument("--latencia-ms", type=float, default=50,
+                        help="Latencia simulada del servidor falso (no es configuración del ETL)")
+    parser.add_argument("--tasa-errores", type=float, default=0.0)
+    parser.add_argument("--limite-por-segundo", type=int, default=0)
+    parser.add_argument("--salida", help="Archivo JSON de resultados")
+    parser.add_argument("--comparar", help="JSON de una ejecución anterior")
+    args = parser.parse_args()
+
+    temporal = None
+    if not args.url:
+        temporal = tempfile.TemporaryDirectory()
+        args.url = f"sqlite:///{os.path.join(temporal.name, 'benchmark.db')}"
+
+    # scripts.database lee DATABASE_URL al importarse: se fija antes de importar nada
+    os.environ["DATABASE_URL"] = args.url
+    os.makedirs("logs", exist_ok=True)
+
+    from scripts.database import engine
+    from scripts.migraciones import aplicar_migraciones
+    from benchmarks.generador import generar_historial
+
+    logging.basicConfig(level=logging.WARNING)
+    aplicar_migraciones()
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+
+    resultados = {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "commit": _commit_actual(),
+        "motor": engine.dialect.name,
+        "python": platform.python_version(),
+        "parametros": {k: v for k, v in vars(args).items() if k not in ("url", "salida", "comparar")},
+        "escenarios": {},
+    }
+
+    if not args.sin_generar:
+        generado = generar_historial(engine, args.filas, args.ciudades)
+        resultados["generacion"] = generado
+        print(f"Histórico sintético: {generado['filas']:,} filas en {generado['segundos']:.1f}s")
+
+    elegidos = args.escenarios.split(",")
+    if "extraccion" in elegidos:
+        resultados["escenarios"]["extraccion"] = escenario_extraccion(args)
+    if "carga_orm" in elegidos:
+        resultados["escenarios"]["carga_orm"] = escenario_carga(args, bulk=False)
+    if "carga_bulk" in elegidos:
+        resultados["escenarios"]["carga_bulk"] = escenario_carga(args, bulk=True)
+    if "dashboards" in elegidos:
+        resultados["escenarios"].update(escenarios_dashboards(args))
+
+    imprimir(resultados)
+
+    salida = args.salida or os.path.join(
+        DIRECTORIO_RESULTADOS,
+        f"{datetime.now():%Y%m%d-%H%M%S}-{resultados['motor']}-{args.filas}.json"
+    )
+    os.makedirs(os.path.dirname(salida) or ".", exist_ok=True)
+    with open(salida, "w", encoding="utf-8") as archivo:
+        json.dump(resultados, archivo, indent=2, default=str)
+    print(f"\nResultados guardados en {salida}")
+
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as archivo:
+            comparar(resultados, json.load(archivo))
+
+    engine.dispose()
+    if temporal:
+        temporal.cleanup()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# Genera un histórico sintético en ciudades/registros_clima para medir con
+# volúmenes realistas (10k, 1M, 10M filas).
+#
+#   python -m benchmarks.generador --url sqlite:///bench.db --filas 1000000
+#
+# Cada ciudad recibe una serie horaria consecutiva que termina ahora, así que
+# la clave natural (ciudad_id, fecha_observacion) nunca se repite.
+import argparse
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import insert, select, func
+
+from scripts.agregados import reconstruir_agregados
+from scripts.loader import reconstruir_clima_actual
+from scripts.migraciones import aplicar_migraciones
+from scripts.models import Ciudad, RegistroClima
+
+TAMANO_LOTE = 50_000
+
+
+def generar_historial(engine, filas, ciudades=100, semilla=42):
+    aplicar_migraciones(engine)
+    rng = np.random.default_rng(semilla)
+    ciudades = max(1, min(ciudades, filas))
+    por_ciudad = -(-filas // ciudades)
+    fin = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+    inicio_serie = fin - timedelta(hours=por_ciudad - 1)
+
+    with engine.begin() as conn:
+        existentes = conn.execute(select(func.count(Ciudad.id))).scalar()
+        conn.execute(insert(Ciudad), [
+            {"nombre": f"Ciudad {existentes + i:04d}", "pais": "Benchmark"}
+            for i in range(ciudades)
+        ])
+        ids = conn.execute(
+            select(Ciudad.id).order_by(Ciudad.id.desc()).limit(ciudades)
+        ).scalars().all()
+
+    base_temperatura = rng.uniform(5, 28, size=ciudades)
+    inicio = time.perf_counter()
+    insertadas = 0
+
+    # Lotes de horas consecutivas para todas las ciudades a la vez
+    horas_lote = max(1, TAMANO_LOTE // ciudades)
+    for desde in range(0, por_ciudad, horas_lote):
+        horas = np.arange(desde, min(desde + horas_lote, por_ciudad))
+        if insertadas + len(horas) * ciudades > filas:
+            horas = horas[:max(0, -(-(filas - insertadas) // ciudades))]
+
+        ciclo = 6 * np.sin(2 * np.pi * ((horas % 24) - 9) / 24)
+        temperatura = (
+            base_temperatura[:, None] + ciclo[None, :]
+            + rng.normal(0, 1.5, size=(ciudades, len(horas)))
+        )
+        humedad = rng.integers(20, 100, size=(ciudades, len(horas)))
+        fechas = [inicio_serie + timedelta(hours=int(h)) for h in horas]
+
+        lote = [
+            {
+                "ciudad_id": ciudad_id,
+                "temperatura": float(temperatura[i, j]),
+                "humedad": int(humedad[i, j]),
+                "fecha_extraccion": fecha,
+                "fecha_observacion": fecha,
+            }
+            for i, ciudad_id in enumerate(ids)
+            for j, fecha in enumerate(fechas)
+        ][:filas - insertadas]
+
+        with engine.begin() as conn:
+            conn.execute(insert(RegistroClima), lote)
+        insertadas += len(lote)
+
+    segundos = time.perf_counter() - inicio
+
+    # Tablas derivadas que leen los dashboards
+    with engine.begin() as conn:
+        reconstruir_agregados(conn)
+        reconstruir_clima_actual(conn)
+
+    return {"filas": insertadas, "ciudades": ciudades, "segundos": segundos}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Histórico sintético para benchmarks")
+    parser.add_argument("--url", help="Base destino (por defecto DATABASE_URL)")
+    parser.add_argument("--filas", type=int, default=10_000)
+    parser.add_argument("--ciudades", type=int, default=100)
+    parser.add_argument("--semilla", type=int, default=42)
+    args = parser.parse_args()
+
+    from scripts.database import crear_engine, engine
+
+    destino = crear_engine(args.url) if args.url else engine
+    r = generar_historial(destino, args.filas, args.ciudades, args.semilla)
+    print(
+        f"{r['filas']:,} registros para {r['ciudades']} ciudades en {r['segundos']:.1f}s "
+        f"({r['filas'] / r['segundos']:,.0f} filas/s)"
+    )
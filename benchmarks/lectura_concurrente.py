@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# Latencia de lectura de los dashboards mientras el ETL está cargando.
+#
+#   python -m benchmarks.lectura_concurrente
+#   python -m benchmarks.lectura_concurrente --url postgresql://... --segundos 30
+#
+# Sin --url compara, sobre archivos SQLite temporales, el modo por defecto de
+# SQLite (journal DELETE, synchronous FULL) con el perfil de scripts.database.
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, func
+
+from scripts.database import crear_engine, insert_dialecto, Base
+from scripts.loader import _sentencia_insercion
+from scripts.models import Ciudad, RegistroClima
+
+CIUDADES = 50
+
+
+def _preparar(engine, filas_iniciales):
+    Base.metadata.create_all(bind=engine)
+    nombres = [f"Ciudad {i}" for i in range(CIUDADES)]
+    with engine.begin() as conn:
+        conn.execute(
+            insert_dialecto(conn, Ciudad).on_conflict_do_nothing(index_elements=["nombre"]),
+            [{"nombre": n} for n in nombres]
+        )
+        ids = conn.execute(select(Ciudad.id).where(Ciudad.nombre.in_(nombres))).scalars().all()
+        conn.execute(_sentencia_insercion(conn, "ignorar"), _lote(ids, filas_iniciales))
+    return ids
+
+
+def _lote(ids, filas):
+    # Como las del ETL: con fecha_observacion (clave natural y de partición)
+    # unos minutos antes de la extracción
+    ahora = datetime.utcnow()
+    filas_lote = []
+    for _ in range(filas):
+        extraccion = ahora - timedelta(seconds=random.uniform(0, 60 * 60 * 24 * 30))
+        filas_lote.append({
+            "ciudad_id": random.choice(ids),
+            "temperatura": random.uniform(-5, 35),
+            "humedad": random.randint(10, 100),
+            "fecha_extraccion": extraccion,
+            "fecha_observacion": extraccion - timedelta(seconds=random.uniform(0, 15 * 60)),
+        })
+    return filas_lote
+
+
+def _percentil(valores, q):
+    if not valores:
+        return float("nan")
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(q * len(ordenados)))]
+
+
+def medir(engine, segundos, lectores, filas_lote, filas_iniciales):
+    ids = _preparar(engine, filas_iniciales)
+    fin = time.monotonic() + segundos
+    latencias, errores, escritas = [], [0], [0]
+    lock = threading.Lock()
+
+    def escritor():
+        while time.monotonic() < fin:
+            with engine.begin() as conn:
+                # Mismo INSERT ... ON CONFLICT DO NOTHING que el modo "ignorar"
+                conn.execute(_sentencia_insercion(conn, "ignorar"), _lote(ids, filas_lote))
+            escritas[0] += filas_lote
+
+    def lector():
+        # Consulta típica de dashboard: resumen por ciudad de la última semana
+        consulta = select(
+            RegistroClima.ciudad_id,
+            func.count(),
+            func.avg(RegistroClima.temperatura)
+        ).where(
+            RegistroClima.fecha_extraccion >= datetime.utcnow() - timedelta(days=7)
+        ).group_by(RegistroClima.ciudad_id)
+
+        while time.monotonic() < fin:
+            inicio = time.perf_counter()
+            try:
+                with engine.connect() as conn:
+                    conn.execute(consulta).all()
+                with lock:
+                    latencias.append((time.perf_counter() - inicio) * 1000)
+            except Exception:
+                with lock:
+                    errores[0] += 1
+
+    hilos = [threading.Thread(target=escritor)]
+    hilos += [threading.Thread(target=lector) for _ in range(lectores)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+    engine.dispose()
+    return {
+        "lecturas": len(latencias),
+        "errores": errores[0],
+        "p50_ms": statistics.median(latencias) if latencias else float("nan"),
+        "p95_ms": _percentil(latencias, 0.95),
+        "max_ms": max(latencias) if latencias else float("nan"),
+        "filas_escritas_s": escritas[0] / segundos,
+    }
+
+
+def imprimir(nombre, r):
+    print(
+        f"{nombre:<28} lecturas={r['lecturas']:>6}  errores={r['errores']:>4}  "
+        f"p50={r['p50_ms']:8.2f}ms  p95={r['p95_ms']:8.2f}ms  max={r['max_ms']:8.2f}ms  "
+        f"escritura={r['filas_escritas_s']:,.0f} filas/s"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Latencia de lectura de los dashboards mientras el ETL está cargando"
+    )
+    parser.add_argument("--url", help="Base a medir (por defecto compara perfiles SQLite)")
+    parser.add_argument("--segundos", type=float, default=10)
+    parser.add_argument("--lectores", type=int, default=4)
+    parser.add_argument("--filas-lote", type=int, default=5000)
+    parser.add_argument("--filas-iniciales", type=int, default=200_000)
+    args = parser.parse_args()
+
+    opciones = (args.segundos, args.lectores, args.filas_lote, args.filas_iniciales)
+
+    if args.url:
+        imprimir(args.url.split("://")[0], medir(crear_engine(args.url), *opciones))
+    else:
+        perfiles = {
+            "sqlite por defecto": {"journal_mode": "DELETE", "synchronous": "FULL",
+                                   "mmap_size": 0, "cache_size": -2000},
+            "perfil WAL": {},
+        }
+        for nombre, perfil in perfiles.items():
+            with tempfile.TemporaryDirectory() as directorio:
+                url = f"sqlite:///{os.path.join(directorio, 'bench.db')}"
+                imprimir(nombre, medir(crear_engine(url, **perfil), *opciones))
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+# Servidor HTTP local que imita los endpoints /current y /historical de
+# Weatherstack, con latencia, errores y límite de peticiones configurables.
+#
+#   python -m benchmarks.servidor_falso --puerto 8765 --latencia-ms 80 --tasa-errores 0.05
+#
+# El límite por segundo y la cuota se cuentan por access_key, como en los
+# planes reales.
+#
+# Los valores son deterministas por ciudad y hora, así que dos ejecuciones
+# con la misma configuración devuelven los mismos datos.
+import argparse
+import json
+import math
+import random
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+
+def _valores(ciudad, momento):
+    # Temperatura con ciclo diario y estacional + desplazamiento por ciudad
+    semilla = zlib.crc32(ciudad.encode()) % 1000
+    horas = momento.timestamp() / 3600
+    temperatura = (
+        15 + semilla % 15
+        + 6 * math.sin(2 * math.pi * (horas % 24 - 9) / 24)
+        + 4 * math.sin(2 * math.pi * momento.timetuple().tm_yday / 365)
+    )
+    humedad = int(40 + (semilla + horas) % 55)
+    return round(temperatura, 1), humedad
+
+
+def _ubicacion(ciudad, ahora):
+    return {
+        "name": ciudad,
+        "country": "Benchmark",
+        "localtime": ahora.strftime("%Y-%m-%d %H:%M"),
+        "localtime_epoch": int(ahora.replace(tzinfo=timezone.utc).timestamp()),
+        "utc_offset": "0.0",
+    }
+
+
+def respuesta_current(ciudad):
+    ahora = datetime.utcnow().replace(second=0, microsecond=0)
+    # Una observación nueva cada 15 minutos, como las estaciones reales
+    observacion = ahora - timedelta(minutes=ahora.minute % 15)
+    temperatura, humedad = _valores(ciudad, observacion)
+    return {
+        "request": {"type": "City", "query": ciudad, "unit": "m"},
+        "location": _ubicacion(ciudad, ahora),
+        "current": {
+            "observation_time": observacion.strftime("%I:%M %p"),
+            "temperature": temperatura,
+            "humidity": humedad,
+            "weather_descriptions": ["Partly cloudy"],
+        },
+    }
+
+
+def respuesta_historical(ciudad, fechas, intervalo=1):
+    respuesta = respuesta_current(ciudad)
+    historico = {}
+    for fecha in fechas:
+        dia = datetime.strptime(fecha, "%Y-%m-%d")
+        horas = []
+        for hora in range(0, 24, intervalo):
+            temperatura, humedad = _valores(ciudad, dia + timedelta(hours=hora))
+            horas.append({
+                "time": str(hora * 100),
+                "temperature": temperatura,
+                "humidity": humedad,
+                "weather_descriptions": ["Partly cloudy"],
+            })
+        historico[fecha] = {"date": fecha, "hourly": horas}
+    respuesta["historical"] = historico
+    return respuesta
+
+
+class ServidorFalso:
+    def __init__(self, puerto=0, latencia_ms=0.0, tasa_errores=0.0, limite_por_segundo=0,
+                 cuota_por_clave=0):
+        self.latencia_ms = latencia_ms
+        self.tasa_errores = tasa_errores
+        self.limite_por_segundo = limite_por_segundo
+        self.cuota_por_clave = cuota_por_clave
+        self.peticiones = 0
+        self.limitadas = 0
+        # Ubicaciones servidas por access_key
+        self.usos = {}
+        self._lock = threading.Lock()
+        self._ventanas = {}
+
+        servidor = self
+
+        class Manejador(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                servidor._atender(self)
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", puerto), Manejador)
+        self.httpd.daemon_threads = True
+        self._hilo = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def _limitada(self, clave):
+        # Ventana fija de un segundo, como el rate limit del plan
+        if self.limite_por_segundo <= 0:
+            return False
+        segundo = int(time.monotonic())
+        with self._lock:
+            inicio, cuenta = self._ventanas.get(clave, (0, 0))
+            if inicio != segundo:
+                inicio, cuenta = segundo, 0
+            self._ventanas[clave] = (inicio, cuenta + 1)
+            if cuenta + 1 > self.limite_por_segundo:
+                self.limitadas += 1
+                return True
+        return False
+
+    def _responder(self, manejador, estado, cuerpo):
+        datos = json.dumps(cuerpo).encode()
+        manejador.send_response(estado)
+        manejador.send_header("Content-Type", "application/json")
+        manejador.send_header("Content-Length", str(len(datos)))
+        manejador.end_headers()
+        manejador.wfile.write(datos)
+
+    def _atender(self, manejador):
+        with self._lock:
+            self.peticiones += 1
+
+        if self.latencia_ms:
+            # Latencia con algo de dispersión (+/- 50 %)
+            time.sleep(self.latencia_ms * random.uniform(0.5, 1.5) / 1000)
+
+        url = urlparse(manejador.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        endpoint = url.path.strip("/")
+
+        clave = params.get("access_key", "")
+        if self._limitada(clave):
+            # Weatherstack informa el rate limit dentro del cuerpo con HTTP 200
+            return self._responder(manejador, 200, {
+                "success": False,
+                "error": {"code": 429, "type": "too_many_requests", "info": "Rate limit"},
+            })
+        if self.cuota_por_clave and self.usos.get(clave, 0) >= self.cuota_por_clave:
+            return self._responder(manejador, 200, {
+                "success": False,
+                "error": {"code": 104, "type": "usage_limit_reached", "info": "Cuota mensual agotada"},
+            })
+        if random.random() < self.tasa_errores:
+            return self._responder(manejador, 503, {"error": "Service Unavailable"})
+        if endpoint not in ("current", "historical") or "query" not in params:
+            return self._responder(manejador, 200, {
+                "success": False,
+                "error": {"code": 601, "type": "missing_query", "info": "Consulta inválida"},
+            })
+
+        ciudades = params["query"].split(";")
+        with self._lock:
+            self.usos[clave] = self.usos.get(clave, 0) + len(ciudades)
+        if endpoint == "current":
+            respuestas = [respuesta_current(c) for c in ciudades]
+        else:
+            fechas = params.get("historical_date", datetime.utcnow().strftime("%Y-%m-%d")).split(";")
+            intervalo = int(params.get("interval", "1"))
+            respuestas = [respuesta_historical(c, fechas, intervalo) for c in ciudades]
+
+        self._responder(manejador, 200, respuestas if len(respuestas) > 1 else respuestas[0])
+
+    def iniciar(self):
+        self._hilo = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._hilo.start()
+        return self
+
+    def detener(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, *args):
+        self.detener()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Servidor local que imita Weatherstack")
+    parser.add_argument("--puerto", type=int, default=8765)
+    parser.add_argument("--latencia-ms", type=float, default=50)
+    parser.add_argument("--tasa-errores", type=float, default=0.0, help="Fracción de respuestas HTTP 503")
+    parser.add_argument("--limite-por-segundo", type=int, default=0, help="0 = sin límite")
+    parser.add_argument("--cuota-por-clave", type=int, default=0, help="0 = sin límite")
+    args = parser.parse_args()
+
+    servidor = ServidorFalso(
+        args.puerto, args.latencia_ms, args.tasa_errores, args.limite_por_segundo, args.cuota_por_clave
+    )
+    print(f"Sirviendo en {servidor.url} (Ctrl+C para terminar)")
+    try:
+        servidor.httpd.serve_forever()
+    except KeyboardInterrupt:
+        servidor.httpd.server_close()
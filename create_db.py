@@ -1,6 +1,6 @@
 from scripts.database import engine
-from scripts.models import Base
+from scripts.migraciones import aplicar_migraciones
 
-Base.metadata.create_all(bind=engine)
+aplicar_migraciones(engine)
 
 print("Tablas creadas correctamente")
\ No newline at end of file
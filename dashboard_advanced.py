@@ -3,13 +3,11 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 from datetime import datetime, timedelta
-from sqlalchemy import func
 import sys
 
 sys.path.insert(0, '.')
 
-from scripts.database import SessionLocal
-from scripts.models import Ciudad, RegistroClima, MetricasETL
+from scripts import consultas
 
 # ---------------------------------------------------
 # Configuración
@@ -23,7 +21,7 @@ st.set_page_config(
 st.title("🌍 Dashboard Avanzado - Análisis de Clima")
 st.markdown("---")
 
-db = SessionLocal()
+version = consultas.version_datos()
 
 # ---------------------------------------------------
 # Pestañas
@@ -38,18 +36,20 @@ tab1, tab2, tab3, tab4 = st.tabs(
 with tab1:
     st.subheader("Datos Generales del Sistema")
 
+    totales = consultas.conteos(version)
+
     col1, col2, col3 = st.columns(3)
 
     with col1:
-        ciudades_count = db.query(func.count(Ciudad.id)).scalar()
+        ciudades_count = totales["ciudades"]
         st.metric("🏙️ Ciudades", ciudades_count)
 
     with col2:
-        registros_count = db.query(func.count(RegistroClima.id)).scalar()
+        registros_count = totales["registros"]
         st.metric("📊 Registros Totales", registros_count)
 
     with col3:
-        ultima_fecha = db.query(func.max(RegistroClima.fecha_extraccion)).scalar()
+        ultima_fecha = totales["ultima_fecha"]
         if ultima_fecha:
             st.metric(
                 "⏰ Última Actualización",
@@ -60,26 +60,8 @@ with tab1:
 
     st.markdown("---")
 
-    # Último registro por ciudad
-    subquery = db.query(
-        RegistroClima.ciudad_id,
-        func.max(RegistroClima.fecha_extraccion).label("max_fecha")
-    ).group_by(RegistroClima.ciudad_id).subquery()
-
-    registros_actuales = db.query(
-    Ciudad.nombre,
-    RegistroClima.temperatura,
-    RegistroClima.humedad
-    ).join(RegistroClima).join(
-        subquery,
-        (RegistroClima.ciudad_id == subquery.c.ciudad_id) &
-        (RegistroClima.fecha_extraccion == subquery.c.max_fecha)
-    ).all()
-
-    df_actual = pd.DataFrame(
-    registros_actuales,
-    columns=["Ciudad", "Temperatura", "Humedad"]
-    )
+    # Último registro por ciudad (tabla mantenida por el loader)
+    df_actual = consultas.clima_actual(version)
 
     if not df_actual.empty:
 
@@ -122,38 +104,31 @@ with tab2:
     with col1:
         fecha_inicio = st.date_input(
             "Desde:",
-            value=datetime.now() - timedelta(days=7) + timedelta(days=1)
+            value=datetime.utcnow() - timedelta(days=7) + timedelta(days=1)
         )
 
     with col2:
         fecha_fin = st.date_input(
             "Hasta:",
-            value=datetime.now() + timedelta(days=1)
+            value=datetime.utcnow() + timedelta(days=1)
         )
 
-    registros_historicos = db.query(
-        RegistroClima,
-        Ciudad.nombre
-    ).join(Ciudad).filter(
-        RegistroClima.fecha_extraccion >= fecha_inicio,
-        RegistroClima.fecha_extraccion <= fecha_fin
-    ).all()
-
-    if registros_historicos:
+    df_historico = consultas.registros(
+        version,
+        desde=fecha_inicio,
+        hasta=fecha_fin
+    )
 
-        data = []
-        for registro, ciudad_nombre in registros_historicos:
-            data.append({
-                "Fecha": registro.fecha_extraccion,
-                "Ciudad": ciudad_nombre,
-                "Temperatura": registro.temperatura,
-                "Humedad": registro.humedad
-            })
+    if not df_historico.empty:
 
-        df_historico = pd.DataFrame(data)
+        df_serie = consultas.serie(
+            version,
+            desde=fecha_inicio,
+            hasta=fecha_fin
+        )
 
         fig = px.line(
-            df_historico,
+            df_serie,
             x="Fecha",
             y="Temperatura",
             color="Ciudad",
@@ -176,39 +151,68 @@ with tab2:
 with tab3:
     st.subheader("Análisis Estadístico por Ciudad")
 
-    ciudades = db.query(Ciudad).all()
+    # Estadísticas de todas las ciudades en consultas agregadas (no N+1)
+    df_stats = consultas.estadisticas(version)
 
-    for ciudad in ciudades:
-        with st.expander(f"📍 {ciudad.nombre}"):
-
-            registros = db.query(RegistroClima).filter_by(
-                ciudad_id=ciudad.id
-            ).all()
+    if not df_stats.empty:
+        st.caption(
+            f"Percentiles de los últimos {consultas.VENTANA_PERCENTILES_DIAS} días; "
+            f"el resto de columnas cubre todo el histórico."
+        )
+        st.dataframe(
+            df_stats[[
+                "Ciudad", "registros", "temperatura_media", "temperatura_std",
+                "temperatura_p25", "temperatura_p50", "temperatura_p75",
+                "temperatura_p95", "temperatura_tendencia", "humedad_media"
+            ]].rename(columns={
+                "registros": "Registros",
+                "temperatura_media": "Temp Prom.",
+                "temperatura_std": "Temp Desv.",
+                "temperatura_p25": "P25",
+                "temperatura_p50": "Mediana",
+                "temperatura_p75": "P75",
+                "temperatura_p95": "P95",
+                "temperatura_tendencia": "Tendencia (°C/día)",
+                "humedad_media": "Humedad Prom.",
+            }).round(2),
+            use_container_width=True
+        )
 
-            if registros:
-                temps = [r.temperatura for r in registros]
-                humeds = [r.humedad for r in registros]
+    for _, fila in df_stats.iterrows():
+        with st.expander(f"📍 {fila['Ciudad']}"):
 
-                col1, col2, col3 = st.columns(3)
+            if fila["registros"]:
+                col1, col2, col3, col4 = st.columns(4)
 
                 with col1:
                     st.metric(
                         "🌡️ Temp Prom.",
-                        f"{sum(temps)/len(temps):.1f}°C"
+                        f"{fila['temperatura_media']:.1f}°C",
+                        f"± {fila['temperatura_std']:.1f}"
                     )
 
                 with col2:
                     st.metric(
                         "💧 Humedad Prom.",
-                        f"{sum(humeds)/len(humeds):.1f}%"
+                        f"{fila['humedad_media']:.1f}%"
                     )
 
                 with col3:
-                    st.metric("📊 Registros", len(registros))
+                    st.metric(
+                        "📈 Tendencia",
+                        f"{fila['temperatura_tendencia']:+.2f}°C/día"
+                        if pd.notna(fila["temperatura_tendencia"]) else "N/A"
+                    )
+
+                with col4:
+                    st.metric("📊 Registros", int(fila["registros"]))
 
             else:
                 st.info("No hay registros para esta ciudad.")
 
+    if df_stats.empty:
+        st.info("No hay registros para analizar.")
+
 
 # ===================================================
 # TAB 4 - MÉTRICAS ETL
@@ -216,26 +220,38 @@ with tab3:
 with tab4:
     st.subheader("Métricas de Ejecución ETL")
 
-    metricas = db.query(MetricasETL).order_by(
-        MetricasETL.fecha_ejecucion.desc()
-    ).limit(20).all()
+    df_metricas = consultas.metricas_etl(version)
 
-    if metricas:
+    if not df_metricas.empty:
 
-        data = []
-        for m in metricas:
-            data.append({
-                "Fecha": m.fecha_ejecucion,
-                "Estado": m.estado,
-                "Extraídos": m.registros_extraidos,
-                "Guardados": m.registros_guardados,
-                "Fallidos": m.registros_fallidos,
-                "Tiempo (s)": float(m.tiempo_ejecucion_segundos)
-            })
+        ultima = df_metricas.iloc[-1]
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Última ejecución", str(ultima["Estado"]))
+        col2.metric("Guardados", int(ultima["Guardados"] or 0))
+        col3.metric("Tiempo", f"{ultima['Tiempo (s)']:.1f}s")
+        col4.metric("Reintentos", int(ultima["Reintentos"] or 0))
 
-        df_metricas = pd.DataFrame(data)
+        col1, col2 = st.columns(2)
 
-        st.dataframe(df_metricas, use_container_width=True)
+        with col1:
+            fig = px.line(
+                df_metricas,
+                x="Fecha",
+                y="Filas/s",
+                title="Rendimiento por Ejecución (filas guardadas/s)",
+                markers=True
+            )
+            st.plotly_chart(fig, use_container_width=True)
+
+        with col2:
+            fig = px.line(
+                df_metricas,
+                x="Fecha",
+                y=["Latencia p50 (ms)", "Latencia p95 (ms)"],
+                title="Latencia HTTP por Ejecución",
+                markers=True
+            )
+            st.plotly_chart(fig, use_container_width=True)
 
         col1, col2 = st.columns(2)
 
@@ -243,25 +259,22 @@ with tab4:
             fig = px.bar(
                 df_metricas,
                 x="Fecha",
-                y="Guardados",
-                title="Registros Guardados por Ejecución",
-                color="Estado"
+                y=["Extracción (s)", "Transformación (s)", "Carga (s)"],
+                title="Tiempo por Etapa"
             )
             st.plotly_chart(fig, use_container_width=True)
 
         with col2:
-            fig = px.scatter(
+            fig = px.bar(
                 df_metricas,
                 x="Fecha",
-                y="Tiempo (s)",
-                size="Guardados",
-                title="Duración de Ejecuciones",
+                y="Guardados",
+                title="Registros Guardados por Ejecución",
                 color="Estado"
             )
             st.plotly_chart(fig, use_container_width=True)
 
+        st.dataframe(df_metricas.iloc[::-1], use_container_width=True)
+
     else:
         st.info("No hay métricas registradas aún.")
-
-
-db.close()
\ No newline at end of file
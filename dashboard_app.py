@@ -2,13 +2,15 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-from datetime import datetime
+from datetime import timedelta
+import os
 import sys
+import time
 
 sys.path.insert(0, '.')
 
-from scripts.database import SessionLocal
-from scripts.models import Ciudad, RegistroClima
+from scripts import consultas
+from scripts.agregados import totales, truncar
 
 # -----------------------------
 # Configuración de la página
@@ -23,137 +25,169 @@ st.title("🌍 Dashboard de Clima - ETL Weatherstack")
 st.markdown("---")
 
 # -----------------------------
-# Conexión a la base de datos
-# -----------------------------
-db = SessionLocal()
-
-try:
-    # Consulta con join
-    registros = db.query(
-        RegistroClima,
-        Ciudad.nombre
-    ).join(
-        Ciudad
-    ).order_by(
-        RegistroClima.fecha_extraccion.desc()
-    ).all()
-
-    # Convertir a lista de diccionarios
-    data = []
-    for registro, ciudad_nombre in registros:
-        data.append({
-    "Ciudad": ciudad_nombre,
-    "Temperatura": registro.temperatura,
-    "Humedad": registro.humedad,
-    "Fecha": registro.fecha_extraccion
-    })
-
-    # Crear DataFrame
-    df = pd.DataFrame(data)
-    df["Fecha"] = pd.to_datetime(df["Fecha"]) + pd.Timedelta(days=1)
-
-    if df.empty:
-        st.warning("⚠ No hay datos en la base de datos.")
-        st.stop()
-
-    # -----------------------------
-    # Sidebar filtros
-    # -----------------------------
-    st.sidebar.title("🔧 Filtros")
-
-    ciudades_filtro = st.sidebar.multiselect(
-        "Selecciona Ciudades:",
-        options=df["Ciudad"].unique(),
-        default=df["Ciudad"].unique()
+# Actualización
+# -----------------------------
+st.sidebar.title("🔄 Actualización")
+
+incremental = st.sidebar.checkbox(
+    "Modo incremental",
+    value=os.getenv("DASHBOARD_INCREMENTAL", "0") == "1",
+    help="Conserva los datos en la sesión y en cada refresco solo lee los registros nuevos"
+)
+ventana_horas = st.sidebar.number_input(
+    "Ventana (horas, 0 = todo)", min_value=0, value=int(os.getenv("DASHBOARD_VENTANA_HORAS", "0")),
+    disabled=not incremental
+)
+intervalo = st.sidebar.selectbox(
+    "Auto-actualizar cada",
+    options=[0, 10, 30, 60, 300],
+    format_func=lambda s: "Nunca" if s == 0 else f"{s} s"
+)
+
+# -----------------------------
+# Datos (cacheados hasta que se cargue algo nuevo)
+# -----------------------------
+if incremental:
+    vista = consultas.vista_incremental(timedelta(hours=ventana_horas) if ventana_horas else None)
+    if st.sidebar.button("Recargar todo"):
+        vista.recargar()
+    nuevas = vista.actualizar()
+    st.sidebar.caption(
+        f"{nuevas} registros nuevos · {len(vista.df):,} en memoria · "
+        f"{vista.actualizado:%H:%M:%S} UTC"
     )
+    # La marca de agua sirve de versión: el resumen solo se recalcula con datos nuevos
+    version = ("incremental", vista.ultimo_id)
+    df = vista.df.copy()
+    # Las métricas cubren la misma ventana (redondeada a la hora: cachea por hora)
+    inicio_ventana = vista.inicio_ventana()
+    if inicio_ventana is not None:
+        inicio_ventana = truncar(inicio_ventana, "hora")
+else:
+    version = consultas.version_datos()
+    df = consultas.registros(version).copy()
+    inicio_ventana = None
+
+df["Fecha"] = df["Fecha"] + pd.Timedelta(days=1)
+
+if df.empty:
+    st.warning("⚠ No hay datos en la base de datos.")
+    if intervalo:
+        time.sleep(intervalo)
+        st.rerun()
+    st.stop()
+
+# -----------------------------
+# Sidebar filtros
+# -----------------------------
+st.sidebar.title("🔧 Filtros")
+
+ciudades_filtro = st.sidebar.multiselect(
+    "Selecciona Ciudades:",
+    options=df["Ciudad"].unique(),
+    default=df["Ciudad"].unique()
+)
+
+df_filtrado = df[df["Ciudad"].isin(ciudades_filtro)]
 
-    df_filtrado = df[df["Ciudad"].isin(ciudades_filtro)]
-
-    # -----------------------------
-    # Métricas principales
-    # -----------------------------
-    st.subheader("📈 Métricas Principales")
-
-    col1, col2, col3 = st.columns(3)
-
-    with col1:
-        temp_promedio = df_filtrado["Temperatura"].mean()
-        st.metric(
-            "🌡️ Temp. Promedio",
-            f"{temp_promedio:.1f} °C"
-        )
-
-    with col2:
-        humedad_promedio = df_filtrado["Humedad"].mean()
-        st.metric(
-            "💧 Humedad Promedio",
-            f"{humedad_promedio:.1f} %"
-        )
-
-    with col3:
-        total_registros = len(df_filtrado)
-        st.metric(
-            "📊 Total Registros",
-            total_registros
-        )
-
-    st.markdown("---")
-
-    # -----------------------------
-    # Visualizaciones
-    # -----------------------------
-    st.subheader("📊 Visualizaciones")
-
-    col1, col2 = st.columns(2)
-
-    # Temperatura por ciudad
-    with col1:
-        fig_temp = px.bar(
-            df_filtrado.sort_values("Temperatura", ascending=False),
-            x="Ciudad",
-            y="Temperatura",
-            title="Temperatura por Ciudad",
-            color="Temperatura",
-            color_continuous_scale="RdYlBu_r"
-        )
-        st.plotly_chart(fig_temp, use_container_width=True)
-
-    # Humedad por ciudad
-    with col2:
-        fig_hum = px.bar(
-            df_filtrado,
-            x="Ciudad",
-            y="Humedad",
-            title="Humedad por Ciudad",
-            color="Humedad",
-            color_continuous_scale="Blues"
-        )
-        st.plotly_chart(fig_hum, use_container_width=True)
-
-    # Scatter Temperatura vs Humedad
-    st.subheader("🌡️ Temperatura vs Humedad")
-
-    fig_scatter = px.scatter(
-    df,
-    x="Temperatura",
-    y="Humedad",
-    color="Ciudad"
+# -----------------------------
+# Métricas principales
+# -----------------------------
+st.subheader("📈 Métricas Principales")
+
+# Métricas desde los acumulados (no recorre los datos crudos): diarios, u
+# horarios si hay ventana
+resumen = totales(consultas.resumen(
+    version,
+    ciudades=list(ciudades_filtro),
+    desde=inicio_ventana,
+    grano="hora" if inicio_ventana is not None else "dia"
+))
+
+col1, col2, col3 = st.columns(3)
+
+with col1:
+    temp_promedio = resumen["temperatura_media"] or 0
+    st.metric(
+        "🌡️ Temp. Promedio",
+        f"{temp_promedio:.1f} °C"
     )
 
-    st.plotly_chart(fig_scatter, use_container_width=True)
+with col2:
+    humedad_promedio = resumen["humedad_media"] or 0
+    st.metric(
+        "💧 Humedad Promedio",
+        f"{humedad_promedio:.1f} %"
+    )
 
-    st.markdown("---")
+with col3:
+    total_registros = resumen["registros"]
+    st.metric(
+        "📊 Total Registros",
+        total_registros
+    )
 
-    # -----------------------------
-    # Tabla detallada
-    # -----------------------------
-    st.subheader("📋 Datos Detallados")
+st.markdown("---")
 
-    st.dataframe(
-        df_filtrado.sort_values("Fecha", ascending=False),
-        use_container_width=True,
-        height=400
+# -----------------------------
+# Visualizaciones
+# -----------------------------
+st.subheader("📊 Visualizaciones")
+
+col1, col2 = st.columns(2)
+
+# Temperatura por ciudad
+with col1:
+    fig_temp = px.bar(
+        df_filtrado.sort_values("Temperatura", ascending=False),
+        x="Ciudad",
+        y="Temperatura",
+        title="Temperatura por Ciudad",
+        color="Temperatura",
+        color_continuous_scale="RdYlBu_r"
     )
+    st.plotly_chart(fig_temp, use_container_width=True)
+
+# Humedad por ciudad
+with col2:
+    fig_hum = px.bar(
+        df_filtrado,
+        x="Ciudad",
+        y="Humedad",
+        title="Humedad por Ciudad",
+        color="Humedad",
+        color_continuous_scale="Blues"
+    )
+    st.plotly_chart(fig_hum, use_container_width=True)
+
+# Scatter Temperatura vs Humedad
+st.subheader("🌡️ Temperatura vs Humedad")
 
-finally:
-    db.close()
\ No newline at end of file
+fig_scatter = px.scatter(
+df,
+x="Temperatura",
+y="Humedad",
+color="Ciudad"
+)
+
+st.plotly_chart(fig_scatter, use_container_width=True)
+
+st.markdown("---")
+
+# -----------------------------
+# Tabla detallada
+# -----------------------------
+st.subheader("📋 Datos Detallados")
+
+st.dataframe(
+    df_filtrado.sort_values("Fecha", ascending=False),
+    use_container_width=True,
+    height=400
+)
+
+# -----------------------------
+# Auto-actualización
+# -----------------------------
+if intervalo:
+    time.sleep(intervalo)
+    st.rerun()
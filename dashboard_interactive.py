@@ -1,15 +1,19 @@
 #!/usr/bin/env python3
 import streamlit as st
-import pandas as pd
 import plotly.express as px
 from datetime import datetime, timedelta
-from sqlalchemy import and_
+import os
 import sys
+import tempfile
 
 sys.path.insert(0, '.')
 
-from scripts.database import SessionLocal
-from scripts.models import Ciudad, RegistroClima
+from scripts import consultas
+from scripts.exportador import exportar
+
+# st.download_button guarda el archivo entero en memoria del servidor: por
+# encima de este tamaño se pide usar el exportador por línea de comandos
+MAX_DESCARGA_MB = float(os.getenv("DASHBOARD_MAX_DESCARGA_MB", "100"))
 
 st.set_page_config(
     page_title="Dashboard Interactivo",
@@ -19,7 +23,7 @@ st.set_page_config(
 
 st.title("🎛️ Dashboard Interactivo - Control Total")
 
-db = SessionLocal()
+version = consultas.version_datos()
 
 # =====================================================
 # SIDEBAR CONTROLES
@@ -27,7 +31,7 @@ db = SessionLocal()
 st.sidebar.markdown("### 🔧 Controles")
 
 # Ciudades disponibles
-ciudades_disponibles = [c.nombre for c in db.query(Ciudad).all()]
+ciudades_disponibles = consultas.listar_ciudades(version)
 
 ciudades_seleccionadas = st.sidebar.multiselect(
     "🏙️ Ciudades a Mostrar",
@@ -38,46 +42,34 @@ ciudades_seleccionadas = st.sidebar.multiselect(
 # Rango de fechas
 fecha_inicio = st.sidebar.date_input(
     "📅 Desde:",
-    value=datetime.now() - timedelta(days=30) + timedelta(days=1)
+    value=datetime.utcnow() - timedelta(days=30) + timedelta(days=1)
 )
 
 fecha_fin = st.sidebar.date_input(
     "📅 Hasta:",
-    value=datetime.now() + timedelta(days=1)
+    value=datetime.utcnow() + timedelta(days=1)
 )
 
 # Filtros de temperatura
 temp_min = st.sidebar.slider("🌡️ Temp Mín (°C):", -50, 50, value=-10)
 temp_max = st.sidebar.slider("🌡️ Temp Máx (°C):", -50, 50, value=40)
 
+# Puntos por serie en los gráficos de línea
+puntos_max = st.sidebar.slider(
+    "📉 Puntos máx. por ciudad:", 50, 5000, value=consultas.PUNTOS_MAX_SERIE, step=50
+)
+
 # =====================================================
 # CONSULTA FILTRADA
 # =====================================================
-registros_filtrados = db.query(
-    RegistroClima,
-    Ciudad.nombre
-).join(Ciudad).filter(
-    and_(
-        Ciudad.nombre.in_(ciudades_seleccionadas),
-        RegistroClima.fecha_extraccion >= fecha_inicio,
-        RegistroClima.fecha_extraccion <= fecha_fin,
-        RegistroClima.temperatura >= temp_min,
-        RegistroClima.temperatura <= temp_max
-    )
-).all()
-
-# Construcción del DataFrame
-data = []
-
-for registro, ciudad_nombre in registros_filtrados:
-    data.append({
-        "Ciudad": ciudad_nombre,
-        "Temperatura": registro.temperatura,
-        "Humedad": registro.humedad,
-        "Fecha": registro.fecha_extraccion
-    })
-
-df = pd.DataFrame(data) if data else pd.DataFrame()
+df = consultas.registros(
+    version,
+    ciudades=ciudades_seleccionadas,
+    desde=fecha_inicio,
+    hasta=fecha_fin,
+    temp_min=temp_min,
+    temp_max=temp_max
+).copy()
 
 # =====================================================
 # DASHBOARD
@@ -119,7 +111,7 @@ if not df.empty:
 
     with col2:
         st.markdown("#### Promedio de Humedad por Ciudad")
-        humedad_ciudad = df.groupby("Ciudad")["Humedad"].mean().reset_index()
+        humedad_ciudad = df.groupby("Ciudad", observed=True)["Humedad"].mean().reset_index()
 
         fig = px.bar(
             humedad_ciudad,
@@ -135,11 +127,16 @@ if not df.empty:
     # ---------------- Evolución Temporal ----------------
     st.markdown("#### 📈 Evolución Temporal")
 
-    df["Fecha"] = pd.to_datetime(df["Fecha"])
-
-    temp_tiempo = df.groupby(
-        ["Fecha", "Ciudad"]
-    )["Temperatura"].mean().reset_index()
+    # Serie submuestreada en el servidor (cubetas SQL + LTTB por ciudad)
+    temp_tiempo = consultas.serie(
+        version,
+        ciudades=ciudades_seleccionadas,
+        desde=fecha_inicio,
+        hasta=fecha_fin,
+        puntos_max=puntos_max,
+        temp_min=temp_min,
+        temp_max=temp_max
+    )
 
     fig = px.line(
         temp_tiempo,
@@ -170,19 +167,44 @@ if not df.empty:
     else:
         st.dataframe(df[columnas_mostrar].head(20), use_container_width=True)
 
-    # ---------------- Descarga CSV ----------------
+    # ---------------- Descarga ----------------
     st.markdown("---")
 
-    csv = df.to_csv(index=False)
-
-    st.download_button(
-        label="⬇️ Descargar datos como CSV",
-        data=csv,
-        file_name=f"clima_datos_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-        mime="text/csv"
-    )
+    # El archivo solo se genera cuando se pide, leyendo la base por bloques
+    formato = st.radio("Formato de descarga:", ["csv", "parquet"], horizontal=True)
+
+    if st.button("📦 Preparar descarga"):
+        marca = datetime.now().strftime('%Y%m%d_%H%M%S')
+        archivo = tempfile.NamedTemporaryFile(suffix=f".{formato}", delete=False)
+        archivo.close()
+
+        with st.spinner("Exportando datos..."):
+            exportar(
+                archivo.name,
+                formato,
+                ciudades=ciudades_seleccionadas,
+                desde=fecha_inicio,
+                hasta=fecha_fin,
+                temp_min=temp_min,
+                temp_max=temp_max
+            )
+
+        tamano_mb = os.path.getsize(archivo.name) / (1024 * 1024)
+        if tamano_mb > MAX_DESCARGA_MB:
+            st.warning(
+                f"⚠️ La exportación ocupa {tamano_mb:,.0f} MB (máximo {MAX_DESCARGA_MB:,.0f} MB "
+                f"para descargar desde el dashboard). Acota los filtros o usa "
+                f"`python -m scripts.exportador salida.{formato} --formato {formato}`."
+            )
+        else:
+            with open(archivo.name, "rb") as datos_archivo:
+                st.download_button(
+                    label=f"⬇️ Descargar datos como {formato.upper()}",
+                    data=datos_archivo,
+                    file_name=f"clima_datos_{marca}.{formato}",
+                    mime="text/csv" if formato == "csv" else "application/octet-stream"
+                )
+        os.unlink(archivo.name)
 
 else:
-    st.warning("⚠️ No hay datos que coincidan con los filtros seleccionados")
-
-db.close()
\ No newline at end of file
+    st.warning("⚠️ No hay datos que coincidan con los filtros seleccionados")
\ No newline at end of file
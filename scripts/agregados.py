@@ -0,0 +1,385 @@
+#!/usr/bin/env python3
+import argparse
+import logging
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import select, insert, delete, func, and_, not_
+
+from scripts.database import engine, insert_dialecto
+from scripts.models import Ciudad, RegistroClima, AgregadoHorario, AgregadoDiario
+from scripts.particiones import meses_archivados
+
+logger = logging.getLogger(__name__)
+
+GRANOS = {
+    "hora": AgregadoHorario,
+    "dia": AgregadoDiario,
+}
+
+METRICAS = ("temperatura", "humedad")
+
+
+def truncar(fecha, grano):
+    if grano == "hora":
+        return fecha.replace(minute=0, second=0, microsecond=0)
+    return fecha.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _truncar_sql(columna, grano, dialecto):
+    if dialecto == "postgresql":
+        return func.date_trunc("hour" if grano == "hora" else "day", columna)
+
+    # Mismo formato de texto que SQLAlchemy usa al guardar DateTime en SQLite,
+    # para que los periodos reconstruidos coincidan con los incrementales
+    formato = "%Y-%m-%d %H:00:00.000000" if grano == "hora" else "%Y-%m-%d 00:00:00.000000"
+    return func.strftime(formato, columna)
+
+
+def _minimo(a, b, dialecto):
+    return func.least(a, b) if dialecto == "postgresql" else func.min(a, b)
+
+
+def _maximo(a, b, dialecto):
+    return func.greatest(a, b) if dialecto == "postgresql" else func.max(a, b)
+
+
+def _acumular(filas, grano):
+    acumulados = {}
+
+    for fila in filas:
+        clave = (fila["ciudad_id"], truncar(fila["fecha_extraccion"], grano))
+        acc = acumulados.get(clave)
+        if acc is None:
+            acc = {"ciudad_id": clave[0], "periodo": clave[1], "registros": 0}
+            for m in METRICAS:
+                acc.update({
+                    f"{m}_n": 0, f"{m}_suma": 0.0, f"{m}_min": None,
+                    f"{m}_max": None, f"{m}_suma_cuadrados": 0.0,
+                })
+            acumulados[clave] = acc
+
+        acc["registros"] += 1
+        for m in METRICAS:
+            valor = fila.get(m)
+            if valor is None:
+                continue
+            acc[f"{m}_n"] += 1
+            acc[f"{m}_suma"] += valor
+            acc[f"{m}_suma_cuadrados"] += valor * valor
+            acc[f"{m}_min"] = valor if acc[f"{m}_min"] is None else min(acc[f"{m}_min"], valor)
+            acc[f"{m}_max"] = valor if acc[f"{m}_max"] is None else max(acc[f"{m}_max"], valor)
+
+    return list(acumulados.values())
+
+
+def _sumar_acumulados(conn, modelo, acumulados):
+    # Upsert que suma acumulados ya calculados a los de cada (ciudad, periodo)
+    dialecto = conn.dialect.name
+    stmt = insert_dialecto(conn, modelo)
+    tabla = modelo.__table__
+    nuevos = stmt.excluded
+
+    set_ = {"registros": tabla.c.registros + nuevos.registros}
+    for m in METRICAS:
+        actual_min, nuevo_min = tabla.c[f"{m}_min"], nuevos[f"{m}_min"]
+        actual_max, nuevo_max = tabla.c[f"{m}_max"], nuevos[f"{m}_max"]
+        set_.update({
+            f"{m}_n": tabla.c[f"{m}_n"] + nuevos[f"{m}_n"],
+            f"{m}_suma": tabla.c[f"{m}_suma"] + nuevos[f"{m}_suma"],
+            f"{m}_suma_cuadrados": (
+                tabla.c[f"{m}_suma_cuadrados"] + nuevos[f"{m}_suma_cuadrados"]
+            ),
+            # coalesce: un NULL no debe anular el mínimo/máximo del otro lado
+            f"{m}_min": _minimo(
+                func.coalesce(actual_min, nuevo_min),
+                func.coalesce(nuevo_min, actual_min),
+                dialecto
+            ),
+            f"{m}_max": _maximo(
+                func.coalesce(actual_max, nuevo_max),
+                func.coalesce(nuevo_max, actual_max),
+                dialecto
+            ),
+        })
+
+    conn.execute(
+        stmt.on_conflict_do_update(
+            index_elements=["ciudad_id", "periodo"],
+            set_=set_
+        ),
+        acumulados
+    )
+
+
+def actualizar_agregados(conn, filas):
+    # Suma incremental de las filas recién insertadas en los acumulados de
+    # cada grano; se ejecuta dentro de la transacción del loader
+    if not filas:
+        return
+
+    for grano, modelo in GRANOS.items():
+        _sumar_acumulados(conn, modelo, _acumular(filas, grano))
+
+
+def trasladar_agregados(conn, origen_ids, destino_id):
+    # Suma los acumulados de `origen_ids` a los de `destino_id` y los borra
+    # (fusión de ciudades repetidas)
+    for modelo in GRANOS.values():
+        # Una sentencia por origen: en PostgreSQL un mismo INSERT no puede
+        # actualizar dos veces el mismo (ciudad, periodo)
+        for origen_id in origen_ids:
+            filas = conn.execute(
+                select(*modelo.__table__.c).where(modelo.ciudad_id == origen_id)
+            ).mappings().all()
+            if filas:
+                _sumar_acumulados(conn, modelo, [{**f, "ciudad_id": destino_id} for f in filas])
+        conn.execute(delete(modelo).where(modelo.ciudad_id.in_(origen_ids)))
+
+
+def _sumar_archivo(conn, archivados, desde, hasta, ciudad_ids):
+    # Suma a los acumulados los registros archivados del rango, un Parquet
+    # por vez (con un día de holgura: el mes se define por observación)
+    for inicio, fin, ruta in archivados:
+        if not os.path.exists(ruta) or fin + timedelta(days=1) <= desde:
+            continue
+        if hasta is not None and inicio - timedelta(days=1) >= hasta:
+            continue
+
+        filtros = [("fecha_extraccion", ">=", pd.Timestamp(desde))]
+        if hasta is not None:
+            filtros.append(("fecha_extraccion", "<", pd.Timestamp(hasta)))
+        if ciudad_ids is not None:
+            filtros.append(("ciudad_id", "in", list(ciudad_ids)))
+
+        df = pd.read_parquet(
+            ruta,
+            columns=["ciudad_id", "temperatura", "humedad", "fecha_extraccion"],
+            filters=filtros
+        )
+        filas = [
+            {
+                "ciudad_id": int(fila.ciudad_id),
+                "fecha_extraccion": fila.fecha_extraccion.to_pydatetime(),
+                "temperatura": None if pd.isna(fila.temperatura) else float(fila.temperatura),
+                "humedad": None if pd.isna(fila.humedad) else int(fila.humedad),
+            }
+            for fila in df.itertuples(index=False)
+        ]
+        actualizar_agregados(conn, filas)
+
+
+def reconstruir_agregados(conn, desde=None, hasta=None, ciudad_ids=None):
+    # Recalcula los acumulados del rango (días completos) desde registros_clima
+    # y, si el rango toca meses archivados, desde sus Parquet. Sin `desde` no
+    # se leen los Parquet: los meses archivados conservan sus acumulados.
+    dialecto = conn.dialect.name
+
+    if desde is not None:
+        desde = truncar(desde, "dia")
+    if hasta is not None:
+        hasta = truncar(hasta, "dia") + timedelta(days=1)
+
+    archivados = meses_archivados(conn)
+    # Sin `desde`, los periodos de los meses archivados quedan fuera
+    congelados = [] if desde is not None else [(inicio, fin) for inicio, fin, _ in archivados]
+
+    for grano, modelo in GRANOS.items():
+        filtros_agregado = []
+        filtros_registro = []
+        if desde is not None:
+            filtros_agregado.append(modelo.periodo >= desde)
+            filtros_registro.append(RegistroClima.fecha_extraccion >= desde)
+        if hasta is not None:
+            filtros_agregado.append(modelo.periodo < hasta)
+            filtros_registro.append(RegistroClima.fecha_extraccion < hasta)
+        if ciudad_ids is not None:
+            filtros_agregado.append(modelo.ciudad_id.in_(ciudad_ids))
+            filtros_registro.append(RegistroClima.ciudad_id.in_(ciudad_ids))
+        for inicio, fin in congelados:
+            filtros_agregado.append(not_(and_(modelo.periodo >= inicio, modelo.periodo < fin)))
+            filtros_registro.append(not_(and_(
+                RegistroClima.fecha_extraccion >= inicio, RegistroClima.fecha_extraccion < fin
+            )))
+
+        borrado = delete(modelo)
+        if filtros_agregado:
+            borrado = borrado.where(*filtros_agregado)
+        conn.execute(borrado)
+
+        periodo = _truncar_sql(RegistroClima.fecha_extraccion, grano, dialecto)
+        columnas = [RegistroClima.ciudad_id, periodo, func.count()]
+        for m in METRICAS:
+            valor = getattr(RegistroClima, m)
+            columnas += [
+                func.count(valor),
+                func.coalesce(func.sum(valor), 0),
+                func.min(valor),
+                func.max(valor),
+                func.coalesce(func.sum(valor * valor), 0),
+            ]
+
+        seleccion = select(*columnas).where(
+            RegistroClima.ciudad_id.is_not(None),
+            RegistroClima.fecha_extraccion.is_not(None),
+            *filtros_registro
+        ).group_by(RegistroClima.ciudad_id, periodo)
+
+        nombres = ["ciudad_id", "periodo", "registros"]
+        for m in METRICAS:
+            nombres += [
+                f"{m}_n", f"{m}_suma", f"{m}_min", f"{m}_max", f"{m}_suma_cuadrados"
+            ]
+
+        conn.execute(insert(modelo).from_select(nombres, seleccion))
+
+    if desde is not None:
+        _sumar_archivo(conn, archivados, desde, hasta, ciudad_ids)
+
+    logger.info(f"Agregados reconstruidos (desde={desde}, hasta={hasta})")
+
+
+def resumen_por_ciudad(conn, desde=None, hasta=None, ciudades=None, grano="dia"):
+    # Media, mínimo, máximo, desviación y conteo por ciudad leyendo solo la
+    # tabla de acumulados (cientos de filas en lugar de millones)
+    modelo = GRANOS[grano]
+
+    columnas = [Ciudad.nombre.label("Ciudad"), func.sum(modelo.registros).label("registros")]
+    for m in METRICAS:
+        columnas += [
+            func.sum(getattr(modelo, f"{m}_n")).label(f"{m}_n"),
+            func.sum(getattr(modelo, f"{m}_suma")).label(f"{m}_suma"),
+            func.sum(getattr(modelo, f"{m}_suma_cuadrados")).label(f"{m}_suma_cuadrados"),
+            func.min(getattr(modelo, f"{m}_min")).label(f"{m}_min"),
+            func.max(getattr(modelo, f"{m}_max")).label(f"{m}_max"),
+        ]
+
+    # outer join: las ciudades sin datos en el rango aparecen con 0 registros
+    condicion = Ciudad.id == modelo.ciudad_id
+    if desde is not None:
+        condicion = condicion & (modelo.periodo >= truncar(desde, grano))
+    if hasta is not None:
+        condicion = condicion & (modelo.periodo <= hasta)
+
+    consulta = select(*columnas).select_from(Ciudad).outerjoin(modelo, condicion)
+    if ciudades is not None:
+        consulta = consulta.where(Ciudad.nombre.in_(ciudades))
+    consulta = consulta.group_by(Ciudad.nombre).order_by(Ciudad.nombre)
+
+    df = pd.DataFrame(conn.execute(consulta).mappings().all())
+    if df.empty:
+        return df
+    df["registros"] = df["registros"].fillna(0).astype(int)
+
+    for m in METRICAS:
+        n = df[f"{m}_n"].where(df[f"{m}_n"] > 0)
+        media = df[f"{m}_suma"] / n
+        varianza = (df[f"{m}_suma_cuadrados"] / n - media ** 2).clip(lower=0)
+        df[f"{m}_media"] = media
+        df[f"{m}_std"] = varianza ** 0.5
+
+    return df
+
+
+def percentiles_por_ciudad(conn, cuantiles=(0.25, 0.5, 0.75, 0.95), metrica="temperatura",
+                           desde=None):
+    # Los acumulados no sirven para percentiles: se leen los datos crudos.
+    # PostgreSQL los calcula en la base (percentile_cont); en SQLite se leen
+    # solo dos columnas y se resuelven con un groupby vectorizado. El costo
+    # crece con las filas leídas, así que los dashboards pasan `desde`
+    # (rango sobre el índice de fecha_extraccion); sin él se lee todo.
+    # Solo ve la tabla caliente: los meses archivados en Parquet no cuentan.
+    valor = getattr(RegistroClima, metrica)
+    nombres = [f"{metrica}_p{int(q * 100)}" for q in cuantiles]
+
+    filtros = [valor.is_not(None)]
+    if desde is not None:
+        filtros.append(RegistroClima.fecha_extraccion >= desde)
+
+    if conn.dialect.name == "postgresql":
+        filas = conn.execute(
+            select(
+                Ciudad.nombre,
+                *[func.percentile_cont(q).within_group(valor) for q in cuantiles]
+            )
+            .join(Ciudad, Ciudad.id == RegistroClima.ciudad_id)
+            .where(*filtros)
+            .group_by(Ciudad.nombre)
+        ).all()
+        return pd.DataFrame(filas, columns=["Ciudad", *nombres])
+
+    filas = conn.execute(
+        select(RegistroClima.ciudad_id, valor).where(*filtros)
+    ).all()
+    mapa = dict(conn.execute(select(Ciudad.id, Ciudad.nombre)).all())
+
+    if not filas:
+        return pd.DataFrame(columns=["Ciudad", *nombres])
+
+    datos = pd.DataFrame(filas, columns=["ciudad_id", "valor"])
+    tabla = datos.groupby("ciudad_id")["valor"].quantile(list(cuantiles)).unstack()
+    tabla.columns = nombres
+    tabla.insert(0, "Ciudad", tabla.index.map(mapa))
+    return tabla.reset_index(drop=True)
+
+
+def tendencia_por_ciudad(conn, metrica="temperatura"):
+    # Pendiente de mínimos cuadrados de la media diaria (unidades por día),
+    # calculada sobre los acumulados diarios y vectorizada por ciudad
+    filas = conn.execute(
+        select(
+            Ciudad.nombre,
+            AgregadoDiario.periodo,
+            AgregadoDiario.__table__.c[f"{metrica}_suma"],
+            AgregadoDiario.__table__.c[f"{metrica}_n"],
+        )
+        .join(Ciudad, Ciudad.id == AgregadoDiario.ciudad_id)
+        .where(AgregadoDiario.__table__.c[f"{metrica}_n"] > 0)
+    ).all()
+
+    columna = f"{metrica}_tendencia"
+    if not filas:
+        return pd.DataFrame(columns=["Ciudad", columna])
+
+    df = pd.DataFrame(filas, columns=["Ciudad", "periodo", "suma", "n"])
+    df["x"] = (pd.to_datetime(df["periodo"]) - pd.Timestamp("1970-01-01")).dt.days.astype(float)
+    df["y"] = df["suma"] / df["n"]
+
+    grupos = df.groupby("Ciudad")
+    dx = df["x"] - grupos["x"].transform("mean")
+    dy = df["y"] - grupos["y"].transform("mean")
+    covarianza = (dx * dy).groupby(df["Ciudad"]).sum()
+    varianza = (dx * dx).groupby(df["Ciudad"]).sum()
+
+    pendiente = (covarianza / varianza.replace(0, np.nan)).rename(columna)
+    return pendiente.reset_index()
+
+
+def totales(resumen):
+    # Agrega un resumen por ciudad a un único total ponderado
+    if resumen.empty:
+        return {"registros": 0, "temperatura_media": None, "humedad_media": None}
+
+    resultado = {"registros": int(resumen["registros"].sum())}
+    for m in METRICAS:
+        n = resumen[f"{m}_n"].sum()
+        resultado[f"{m}_media"] = resumen[f"{m}_suma"].sum() / n if n else None
+    return resultado
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Reconstruye los acumulados horarios y diarios por ciudad"
+    )
+    parser.add_argument("--desde", type=datetime.fromisoformat, default=None)
+    parser.add_argument("--hasta", type=datetime.fromisoformat, default=None)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    with engine.begin() as conn:
+        reconstruir_agregados(conn, args.desde, args.hasta)
+
+    print("Agregados reconstruidos correctamente")
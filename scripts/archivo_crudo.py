@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+# Archivo de respuestas crudas de Weatherstack: JSONL comprimido (zstd, o
+# gzip si zstandard no está instalado) en segmentos rotados por tamaño, con
+# un índice SQLite por segmento, ciudad y rango de fechas.
+#
+# Cada volcado escribe un frame zstd / miembro gzip independiente al final del
+# segmento: lo ya volcado sobrevive aunque el proceso se corte.
+import gzip
+import io
+import json
+import logging
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+DIRECTORIO_ARCHIVO_CRUDO = os.getenv('ARCHIVO_CRUDO_DIR', 'archivo/crudo')
+MB_POR_SEGMENTO = float(os.getenv('ARCHIVO_CRUDO_SEGMENTO_MB', '64'))
+# Respuestas en memoria antes de volcar un frame
+MAX_PENDIENTES = 1000
+
+
+class ArchivoCrudo:
+    def __init__(self, directorio=DIRECTORIO_ARCHIVO_CRUDO, mb_por_segmento=MB_POR_SEGMENTO):
+        self.directorio = directorio
+        self.max_bytes = int(mb_por_segmento * 1024 * 1024)
+        self.extension = ".jsonl.zst" if zstandard else ".jsonl.gz"
+        os.makedirs(directorio, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._pendientes = []
+        self._indice = sqlite3.connect(
+            os.path.join(directorio, "indice.db"), check_same_thread=False
+        )
+        self._indice.executescript("""
+            CREATE TABLE IF NOT EXISTS segmentos (
+                nombre TEXT PRIMARY KEY,
+                desde TEXT,
+                hasta TEXT,
+                registros INTEGER NOT NULL DEFAULT 0,
+                bytes INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE TABLE IF NOT EXISTS segmento_ciudades (
+                segmento TEXT NOT NULL,
+                ciudad TEXT NOT NULL,
+                desde TEXT,
+                hasta TEXT,
+                registros INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (segmento, ciudad)
+            );
+            CREATE INDEX IF NOT EXISTS ix_segmento_ciudades_ciudad
+                ON segmento_ciudades (ciudad, desde, hasta);
+        """)
+        self._indice.commit()
+
+    # ---------------------------------------------------
+    # Escritura
+    # ---------------------------------------------------
+    def agregar(self, endpoint, consulta, data, fecha=None):
+        # Una línea por ciudad; las respuestas en lote (';') se separan
+        fecha = (fecha or datetime.utcnow()).isoformat()
+        elementos = data if isinstance(data, list) else [data]
+        consultas = consulta.split(';') if len(elementos) > 1 else [consulta]
+
+        with self._lock:
+            for i, elemento in enumerate(elementos):
+                ciudad = (elemento.get('location') or {}).get('name') or consultas[min(i, len(consultas) - 1)]
+                self._pendientes.append({
+                    "ciudad": ciudad.strip(),
+                    "fecha": fecha,
+                    "endpoint": endpoint,
+                    "respuesta": elemento,
+                })
+            lleno = len(self._pendientes) >= MAX_PENDIENTES
+
+        if lleno:
+            self.volcar()
+
+    def _segmento_actual(self):
+        fila = self._indice.execute(
+            "SELECT nombre, bytes FROM segmentos ORDER BY nombre DESC LIMIT 1"
+        ).fetchone()
+        if fila and fila[1] < self.max_bytes and fila[0].endswith(self.extension):
+            return fila[0]
+
+        numero = int(fila[0].split("-")[1].split(".")[0]) + 1 if fila else 1
+        nombre = f"segmento-{numero:06d}{self.extension}"
+        self._indice.execute("INSERT INTO segmentos (nombre) VALUES (?)", (nombre,))
+        return nombre
+
+    def _comprimir(self, datos):
+        if zstandard:
+            return zstandard.ZstdCompressor(level=10).compress(datos)
+        return gzip.compress(datos, compresslevel=6)
+
+    def volcar(self):
+        with self._lock:
+            pendientes, self._pendientes = self._pendientes, []
+            if not pendientes:
+                return 0
+
+            segmento = self._segmento_actual()
+            lineas = "".join(json.dumps(p, ensure_ascii=False) + "\n" for p in pendientes)
+            frame = self._comprimir(lineas.encode("utf-8"))
+
+            with open(os.path.join(self.directorio, segmento), "ab") as archivo:
+                archivo.write(frame)
+
+            desde = min(p["fecha"] for p in pendientes)
+            hasta = max(p["fecha"] for p in pendientes)
+            self._indice.execute("""
+                UPDATE segmentos SET
+                    desde = min(coalesce(desde, :desde), :desde),
+                    hasta = max(coalesce(hasta, :hasta), :hasta),
+                    registros = registros + :registros,
+                    bytes = bytes + :bytes
+                WHERE nombre = :nombre
+            """, {"desde": desde, "hasta": hasta, "registros": len(pendientes),
+                  "bytes": len(frame), "nombre": segmento})
+
+            por_ciudad = {}
+            for p in pendientes:
+                d, h, n = por_ciudad.get(p["ciudad"], (p["fecha"], p["fecha"], 0))
+                por_ciudad[p["ciudad"]] = (min(d, p["fecha"]), max(h, p["fecha"]), n + 1)
+
+            self._indice.executemany("""
+                INSERT INTO segmento_ciudades (segmento, ciudad, desde, hasta, registros)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (segmento, ciudad) DO UPDATE SET
+                    desde = min(desde, excluded.desde),
+                    hasta = max(hasta, excluded.hasta),
+                    registros = registros + excluded.registros
+            """, [(segmento, c, d, h, n) for c, (d, h, n) in por_ciudad.items()])
+            self._indice.commit()
+
+        return len(pendientes)
+
+    # ---------------------------------------------------
+    # Lectura
+    # ---------------------------------------------------
+    def segmentos(self, desde=None, hasta=None, ciudades=None):
+        # Segmentos que según el índice pueden tener registros del filtro
+        consulta = "SELECT DISTINCT segmento FROM segmento_ciudades WHERE 1 = 1"
+        params = []
+        if desde is not None:
+            consulta += " AND hasta >= ?"
+            params.append(desde.isoformat())
+        if hasta is not None:
+            consulta += " AND desde <= ?"
+            params.append(hasta.isoformat())
+        if ciudades is not None:
+            ciudades = [c.strip() for c in ciudades]
+            consulta += f" AND ciudad IN ({', '.join('?' * len(ciudades))})"
+            params.extend(ciudades)
+
+        with self._lock:
+            return [fila[0] for fila in self._indice.execute(consulta + " ORDER BY segmento", params)]
+
+    def _abrir(self, segmento):
+        ruta = os.path.join(self.directorio, segmento)
+        if segmento.endswith(".gz"):
+            return gzip.open(ruta, "rt", encoding="utf-8")
+        if zstandard is None:
+            raise ImportError(f"Leer {segmento} requiere zstandard (pip install zstandard)")
+        lector = zstandard.ZstdDecompressor().stream_reader(
+            open(ruta, "rb"), read_across_frames=True, closefd=True
+        )
+        return io.TextIOWrapper(lector, encoding="utf-8")
+
+    def iterar(self, desde=None, hasta=None, ciudades=None, endpoint="current"):
+        # Registros archivados (dicts con ciudad, fecha, endpoint, respuesta)
+        # en orden de escritura, leyendo solo los segmentos necesarios
+        filtro_ciudades = {c.strip() for c in ciudades} if ciudades is not None else None
+        desde_iso = desde.isoformat() if desde is not None else None
+        hasta_iso = hasta.isoformat() if hasta is not None else None
+
+        for segmento in self.segmentos(desde, hasta, ciudades):
+            with self._abrir(segmento) as archivo:
+                for linea in archivo:
+                    registro = json.loads(linea)
+                    if endpoint and registro["endpoint"] != endpoint:
+                        continue
+                    if filtro_ciudades is not None and registro["ciudad"] not in filtro_ciudades:
+                        continue
+                    if desde_iso and registro["fecha"] < desde_iso:
+                        continue
+                    if hasta_iso and registro["fecha"] > hasta_iso:
+                        continue
+                    yield registro
+
+    def cerrar(self):
+        self.volcar()
+        self._indice.close()
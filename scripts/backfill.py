@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+# Backfill histórico desde el endpoint /historical (datos horarios).
+#
+#   python -m scripts.backfill --desde 2024-01-01 --hasta 2024-03-31
+#   python -m scripts.backfill --ciudades Bogota,Cali --desde 2024-01-01 --hasta 2024-01-31 --concurrencia 4
+#
+# El rango se parte en tramos de DIAS_POR_PETICION días por ciudad que se
+# piden en paralelo respetando el límite de peticiones del extractor. Cada
+# tramo se guarda junto a su checkpoint en backfill_progreso, así que si el
+# proceso se corta basta con volver a lanzarlo: los días completos se saltan.
+import argparse
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+
+from scripts.agregados import reconstruir_agregados
+from scripts.database import engine, insert_dialecto
+from scripts.extractor import WeatherstackExtractor
+from scripts.loader import (
+    _resolver_ciudades,
+    _refrescar_clima_actual,
+    _sin_duplicados,
+    insertar_masivo,
+)
+from scripts.models import BackfillProgreso
+
+logger = logging.getLogger(__name__)
+
+DIAS_POR_PETICION = int(os.getenv('BACKFILL_DIAS_POR_PETICION', '7'))
+
+
+def _dias(desde, hasta):
+    dia = datetime(desde.year, desde.month, desde.day)
+    while dia <= hasta:
+        yield dia
+        dia += timedelta(days=1)
+
+
+def procesar_historico(data):
+    # Respuesta de /historical -> filas con el formato de procesar_respuesta.
+    # Las horas de "hourly" son locales ("0", "100" ... "2300"): se pasan a UTC
+    location = data.get('location', {})
+    desfase = timedelta(hours=float(location.get('utc_offset') or 0))
+    filas = []
+
+    for fecha, dia in (data.get('historical') or {}).items():
+        base = datetime.strptime(fecha, "%Y-%m-%d")
+        for hora in dia.get('hourly', []):
+            hhmm = int(hora.get('time', 0))
+            observacion = base + timedelta(hours=hhmm // 100, minutes=hhmm % 100) - desfase
+            filas.append({
+                'ciudad': location.get('name'),
+                'pais': location.get('country'),
+                'temperatura': hora.get('temperature'),
+                'humedad': hora.get('humidity'),
+                # En un backfill la extracción "ocurrió" en la hora observada:
+                # así los gráficos, que filtran por fecha_extraccion, la ubican bien
+                'fecha_extraccion': observacion,
+                'fecha_observacion': observacion,
+            })
+
+    return filas
+
+
+def pendientes(ciudades, desde, hasta, dias_por_peticion=DIAS_POR_PETICION):
+    # Tramos (ciudad, [días]) que aún no figuran en backfill_progreso
+    with engine.connect() as conn:
+        hechos = set(conn.execute(
+            select(BackfillProgreso.ciudad, BackfillProgreso.fecha).where(
+                BackfillProgreso.ciudad.in_(ciudades),
+                BackfillProgreso.fecha >= datetime(desde.year, desde.month, desde.day),
+                BackfillProgreso.fecha <= hasta
+            )
+        ).all())
+
+    tramos = []
+    for ciudad in ciudades:
+        dias = [d for d in _dias(desde, hasta) if (ciudad, d) not in hechos]
+        for i in range(0, len(dias), dias_por_peticion):
+            tramos.append((ciudad, dias[i:i + dias_por_peticion]))
+    return tramos
+
+
+def descargar_tramo(extractor, ciudad, dias):
+    data = extractor.llamar_api(
+        'historical',
+        {
+            'query': ciudad,
+            'historical_date': ';'.join(f"{d:%Y-%m-%d}" for d in dias),
+            'hourly': 1,
+            'interval': 1,
+        },
+        ciudad
+    )
+    if 'error' in data:
+        raise ValueError(f"API: {data['error'].get('info')}")
+
+    conteos = {
+        datetime.strptime(fecha, "%Y-%m-%d"): len(dia.get('hourly', []))
+        for fecha, dia in (data.get('historical') or {}).items()
+    }
+    return procesar_historico(data), conteos
+
+
+def guardar_tramo(ciudad, dias, datos, conteos):
+    # Registros + acumulados + clima_actual + checkpoint en una transacción
+    with engine.begin() as conn:
+        insertadas = 0
+        if datos:
+            ids = _resolver_ciudades(conn, datos)
+            filas = _sin_duplicados([
+                {
+                    'ciudad_id': ids[d['ciudad']],
+                    'temperatura': d['temperatura'],
+                    'humedad': d['humedad'],
+                    'fecha_extraccion': d['fecha_extraccion'],
+                    'fecha_observacion': d['fecha_observacion'],
+                }
+                for d in datos
+            ])
+            insertadas = insertar_masivo(conn, filas)
+
+            fechas = [f['fecha_extraccion'] for f in filas]
+            reconstruir_agregados(
+                conn, min(fechas), max(fechas), ciudad_ids=list(set(ids.values()))
+            )
+            # insertar_masivo ignora lo que ya existía: se relee lo guardado
+            _refrescar_clima_actual(conn, set(ids.values()))
+
+        # Solo los días que volvieron con datos: el resto queda pendiente
+        completos = [dia for dia in dias if conteos.get(dia, 0) > 0]
+        if completos:
+            stmt = insert_dialecto(conn, BackfillProgreso)
+            conn.execute(
+                stmt.on_conflict_do_nothing(index_elements=['ciudad', 'fecha']),
+                [
+                    {'ciudad': ciudad, 'fecha': dia, 'registros': conteos[dia],
+                     'fecha_completado': datetime.utcnow()}
+                    for dia in completos
+                ]
+            )
+
+    faltantes = [dia for dia in dias if conteos.get(dia, 0) == 0]
+    if faltantes:
+        logger.warning(
+            f"{ciudad}: {len(faltantes)} días sin datos en la respuesta, se reintentarán "
+            f"({', '.join(f'{d:%Y-%m-%d}' for d in faltantes)})"
+        )
+
+    return insertadas, len(faltantes)
+
+
+def ejecutar_backfill(desde, hasta, ciudades=None, concurrencia=None,
+                      dias_por_peticion=DIAS_POR_PETICION, extractor=None):
+    propio = extractor is None
+    extractor = extractor or WeatherstackExtractor()
+    ciudades = [c.strip() for c in (ciudades or extractor.ciudades)]
+    concurrencia = concurrencia or extractor.max_concurrencia
+
+    tramos = pendientes(ciudades, desde, hasta, dias_por_peticion)
+    logger.info(
+        f"Backfill {desde:%Y-%m-%d} - {hasta:%Y-%m-%d}: {len(tramos)} tramos pendientes "
+        f"para {len(ciudades)} ciudades (concurrencia={concurrencia})"
+    )
+
+    total, fallidos, sin_datos = 0, 0, 0
+    try:
+        # Las descargas van en paralelo; la carga se hace en este hilo, una
+        # transacción por tramo, para no competir por el lock de escritura
+        with ThreadPoolExecutor(max_workers=max(1, concurrencia)) as executor:
+            futuros = {
+                executor.submit(descargar_tramo, extractor, ciudad, dias): (ciudad, dias)
+                for ciudad, dias in tramos
+            }
+            for futuro in as_completed(futuros):
+                ciudad, dias = futuros[futuro]
+                try:
+                    insertadas, faltantes = guardar_tramo(ciudad, dias, *futuro.result())
+                    total += insertadas
+                    sin_datos += faltantes
+                    logger.info(
+                        f"{ciudad} {dias[0]:%Y-%m-%d} - {dias[-1]:%Y-%m-%d}: "
+                        f"{insertadas} registros"
+                    )
+                except Exception as e:
+                    # Sin checkpoint: se reintenta en la próxima ejecución
+                    fallidos += 1
+                    logger.error(f"Tramo {ciudad} desde {dias[0]:%Y-%m-%d} falló: {str(e)}")
+    finally:
+        if propio:
+            extractor.cerrar()
+        elif extractor.archivo:
+            extractor.archivo.volcar()
+
+    logger.info(
+        f"Backfill terminado: {total} registros, {fallidos} tramos fallidos, "
+        f"{sin_datos} días sin datos"
+    )
+    return total
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill histórico desde /historical")
+    parser.add_argument("--desde", type=datetime.fromisoformat, required=True)
+    parser.add_argument("--hasta", type=datetime.fromisoformat, required=True)
+    parser.add_argument("--ciudades", help="Lista separada por comas (por defecto CIUDADES)")
+    parser.add_argument("--concurrencia", type=int)
+    parser.add_argument("--dias-por-peticion", type=int, default=DIAS_POR_PETICION)
+    args = parser.parse_args()
+
+    ejecutar_backfill(
+        args.desde,
+        args.hasta,
+        ciudades=args.ciudades.split(",") if args.ciudades else None,
+        concurrencia=args.concurrencia,
+        dias_por_peticion=args.dias_por_peticion,
+    )
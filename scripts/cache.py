@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+import json
+import sqlite3
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def marca_observacion(data):
+    # Weatherstack solo da la hora de observación (UTC, "12:14 PM"), así que
+    # se combina con la fecha local para distinguir observaciones de días distintos
+    current = data.get('current', {})
+    location = data.get('location', {})
+    fecha = (location.get('localtime') or '')[:10]
+    return f"{fecha} {current.get('observation_time', '')}".strip()
+
+
+# Caché persistente (SQLite) de respuestas de Weatherstack por ciudad.
+# Una entrada se sirve mientras tenga menos de `ttl` segundos; después solo
+# se conserva su observation_time para detectar si la estación publicó algo nuevo.
+# `confirmada` es la última observación cuya carga en la BD se confirmó: una
+# respuesta solo cuenta como "sin cambios" si coincide con ella, así una carga
+# fallida se reintenta en la próxima ejecución aunque la entrada siga vigente.
+class CacheRespuestas:
+    def __init__(self, ruta, ttl=600, retencion=7 * 24 * 3600, max_entradas=10000):
+        self.ttl = ttl
+        self.retencion = retencion
+        self.max_entradas = max_entradas
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(ruta, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS respuestas (
+                ciudad TEXT PRIMARY KEY,
+                observacion TEXT,
+                payload TEXT NOT NULL,
+                guardado REAL NOT NULL,
+                accedido REAL NOT NULL,
+                confirmada TEXT
+            )
+        """)
+        columnas = {fila[1] for fila in self._conn.execute("PRAGMA table_info(respuestas)")}
+        if "confirmada" not in columnas:
+            self._conn.execute("ALTER TABLE respuestas ADD COLUMN confirmada TEXT")
+        self._conn.commit()
+
+        self.reiniciar_estadisticas()
+
+    @staticmethod
+    def _clave(ciudad):
+        return ciudad.strip().lower()
+
+    def reiniciar_estadisticas(self):
+        self.hits = 0
+        self.misses = 0
+        self.sin_cambios = 0
+
+    def estadisticas(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'sin_cambios': self.sin_cambios,
+        }
+
+    def obtener(self, ciudad):
+        ahora = time.time()
+
+        with self._lock:
+            fila = self._conn.execute(
+                "SELECT payload, guardado FROM respuestas WHERE ciudad = ?",
+                (self._clave(ciudad),)
+            ).fetchone()
+
+            if fila and ahora - fila[1] < self.ttl:
+                self._conn.execute(
+                    "UPDATE respuestas SET accedido = ? WHERE ciudad = ?",
+                    (ahora, self._clave(ciudad))
+                )
+                self._conn.commit()
+                self.hits += 1
+                return json.loads(fila[0])
+
+            self.misses += 1
+            return None
+
+    def ya_cargada(self, ciudad, data):
+        # True si la observación de `data` ya se confirmó en la BD
+        observacion = marca_observacion(data)
+        if not observacion:
+            return False
+
+        with self._lock:
+            fila = self._conn.execute(
+                "SELECT confirmada FROM respuestas WHERE ciudad = ?",
+                (self._clave(ciudad),)
+            ).fetchone()
+
+        return bool(fila) and fila[0] == observacion
+
+    def guardar(self, ciudad, data):
+        # Devuelve True si la observación aún no está cargada en la BD
+        ahora = time.time()
+        observacion = marca_observacion(data)
+
+        with self._lock:
+            fila = self._conn.execute(
+                "SELECT confirmada FROM respuestas WHERE ciudad = ?",
+                (self._clave(ciudad),)
+            ).fetchone()
+
+            self._conn.execute(
+                """
+                INSERT INTO respuestas (ciudad, observacion, payload, guardado, accedido)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(ciudad) DO UPDATE SET
+                    observacion = excluded.observacion,
+                    payload = excluded.payload,
+                    guardado = excluded.guardado,
+                    accedido = excluded.accedido
+                """,
+                (self._clave(ciudad), observacion, json.dumps(data), ahora, ahora)
+            )
+            self._conn.commit()
+
+            cambio = not fila or not observacion or fila[0] != observacion
+            if not cambio:
+                self.sin_cambios += 1
+            return cambio
+
+    def confirmar(self, pares):
+        # (ciudad, data) cuya carga ya hizo commit en la BD
+        filas = [
+            (marca_observacion(data), self._clave(ciudad))
+            for ciudad, data in pares
+            if marca_observacion(data)
+        ]
+        if not filas:
+            return
+
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE respuestas SET confirmada = ? WHERE ciudad = ?", filas
+            )
+            self._conn.commit()
+
+    def purgar(self):
+        # Expulsa por antigüedad y después por LRU hasta max_entradas
+        with self._lock:
+            borradas = self._conn.execute(
+                "DELETE FROM respuestas WHERE guardado < ?",
+                (time.time() - self.retencion,)
+            ).rowcount
+
+            borradas += self._conn.execute(
+                """
+                DELETE FROM respuestas WHERE ciudad IN (
+                    SELECT ciudad FROM respuestas
+                    ORDER BY accedido DESC
+                    LIMIT -1 OFFSET ?
+                )
+                """,
+                (self.max_entradas,)
+            ).rowcount
+            self._conn.commit()
+
+        if borradas:
+            logger.info(f"Caché: {borradas} entradas expulsadas")
+        return borradas
+
+    def cerrar(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+# Pool de API keys de Weatherstack: reparte las peticiones entre varias
+# suscripciones, cada una con su propio límite por segundo y su cuota
+# mensual, y lleva la cuenta del mes en claves_api_uso.
+#
+#   API_KEYS=clave1,clave2:50000     (":N" fija la cuota de esa clave)
+#   python -m scripts.claves         (holgura de cada clave este mes)
+#
+# Una clave sale del reparto cuando Weatherstack responde que agotó la cuota
+# (104, hasta fin de mes), que superó el rate limit (429, durante
+# CLAVES_PAUSA_LIMITE segundos) o que no es válida (101/102).
+import argparse
+import hashlib
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import or_, select, func
+
+from scripts.database import engine, insert_dialecto
+from scripts.limitador import LimitadorTasa
+from scripts.models import UsoClaveAPI
+from scripts.particiones import inicio_mes
+
+logger = logging.getLogger(__name__)
+
+# Cuota mensual por defecto de cada clave (0 = sin límite conocido)
+CUOTA_MENSUAL = int(os.getenv('API_CUOTA_MENSUAL', '0'))
+# Segundos fuera del reparto tras un 429
+PAUSA_LIMITE = float(os.getenv('CLAVES_PAUSA_LIMITE', '60'))
+# Aviso cuando a una clave le queda menos de esta fracción de la cuota
+FRACCION_AVISO = 0.1
+
+CODIGO_CUOTA_AGOTADA = 104
+CODIGO_RATE_LIMIT = 429
+CODIGOS_CLAVE_INVALIDA = {101, 102}
+CODIGOS_CLAVE = {CODIGO_CUOTA_AGOTADA, CODIGO_RATE_LIMIT} | CODIGOS_CLAVE_INVALIDA
+
+
+class SinClavesDisponibles(Exception):
+    pass
+
+
+def huella(valor):
+    return hashlib.sha256(valor.encode()).hexdigest()[:12]
+
+
+class ClaveAPI:
+    def __init__(self, valor, cuota, tasa, rafaga):
+        self.valor = valor
+        self.huella = huella(valor)
+        self.cuota = cuota
+        self.limitador = LimitadorTasa(tasa, rafaga)
+
+        # Peticiones del mes (de todos los procesos, a la última sincronización)
+        self.usadas = 0
+        # Peticiones de este proceso aún no sumadas en la base
+        self.pendientes = 0
+        self.asignadas = 0
+        self.agotada = False
+        self.invalida = False
+        self.pausada_hasta = 0.0
+        self.ultimo_error = None
+        self._avisada = False
+
+    def restante(self):
+        return max(0, self.cuota - self.usadas) if self.cuota else None
+
+    def fraccion_restante(self):
+        return self.restante() / self.cuota if self.cuota else 1.0
+
+    def estado(self, ahora=None):
+        if self.invalida:
+            return "invalida"
+        if self.agotada or (self.cuota and self.usadas >= self.cuota):
+            return "agotada"
+        if self.pausada_hasta > (ahora or time.monotonic()):
+            return "pausada"
+        return "disponible"
+
+
+class PoolClaves:
+    def __init__(self, valores, cuota=CUOTA_MENSUAL, tasa=0, rafaga=None,
+                 pausa_limite=PAUSA_LIMITE, bind=engine):
+        self.pausa_limite = pausa_limite
+        self.bind = bind
+        self.mes = inicio_mes(datetime.utcnow())
+        self._lock = threading.Lock()
+
+        self.claves = []
+        for valor in valores:
+            valor, _, cuota_propia = valor.strip().partition(':')
+            if valor:
+                self.claves.append(
+                    ClaveAPI(valor, int(cuota_propia) if cuota_propia else cuota, tasa, rafaga)
+                )
+
+    @classmethod
+    def desde_entorno(cls, **kwargs):
+        # API_KEYS (lista) o, por compatibilidad, la API_KEY única
+        valores = os.getenv('API_KEYS') or os.getenv('API_KEY') or ''
+        return cls(
+            valores.split(','),
+            tasa=float(os.getenv('PETICIONES_POR_SEGUNDO', '0')),
+            rafaga=os.getenv('RAFAGA_PETICIONES'),
+            **kwargs
+        )
+
+    def __len__(self):
+        return len(self.claves)
+
+    # ---------------------------------------------------
+    # Reparto
+    # ---------------------------------------------------
+    def adquirir(self):
+        # Clave disponible con más cuota restante (a igualdad, la menos
+        # usada por este proceso), esperando su límite por segundo
+        while True:
+            with self._lock:
+                ahora = time.monotonic()
+                disponibles = [c for c in self.claves if c.estado(ahora) == "disponible"]
+                if disponibles:
+                    clave = max(disponibles, key=lambda c: (c.fraccion_restante(), -c.asignadas))
+                    clave.asignadas += 1
+                    break
+
+                pausadas = [c.pausada_hasta for c in self.claves if c.estado(ahora) == "pausada"]
+                if not pausadas:
+                    raise SinClavesDisponibles(
+                        "Ninguna API key disponible (cuota agotada o claves inválidas)"
+                    )
+                espera = min(pausadas) - ahora
+
+            logger.info(f"Todas las API keys en pausa por rate limit; esperando {espera:.1f}s")
+            time.sleep(espera)
+
+        clave.limitador.adquirir()
+        return clave
+
+    def registrar(self, clave, peticiones=1):
+        with self._lock:
+            clave.usadas += peticiones
+            clave.pendientes += peticiones
+            restante = clave.restante()
+
+        if restante is not None and not clave._avisada and restante < clave.cuota * FRACCION_AVISO:
+            clave._avisada = True
+            logger.warning(f"API key {clave.huella}: quedan {restante} de {clave.cuota} peticiones este mes")
+
+    def descartar(self, clave, codigo, info=None):
+        # Saca la clave del reparto según el error de Weatherstack
+        with self._lock:
+            clave.ultimo_error = f"{codigo}: {info}" if info else str(codigo)
+            if codigo == CODIGO_CUOTA_AGOTADA:
+                clave.agotada = True
+            elif codigo in CODIGOS_CLAVE_INVALIDA:
+                clave.invalida = True
+            elif codigo == CODIGO_RATE_LIMIT:
+                clave.pausada_hasta = time.monotonic() + self.pausa_limite
+
+        nivel = logging.ERROR if codigo in CODIGOS_CLAVE_INVALIDA else logging.WARNING
+        logger.log(nivel, f"API key {clave.huella} fuera del reparto ({clave.ultimo_error})")
+
+    # ---------------------------------------------------
+    # Persistencia
+    # ---------------------------------------------------
+    def sincronizar(self):
+        # Suma lo usado por este proceso en claves_api_uso y relee los
+        # totales del mes (incluidos los de otros procesos o máquinas)
+        with self._lock:
+            mes = self.mes
+            filas = [
+                {
+                    'huella': c.huella,
+                    'mes': mes,
+                    'peticiones': c.pendientes,
+                    'cuota': c.cuota or None,
+                    'agotada': c.agotada,
+                    'ultimo_error': c.ultimo_error,
+                    'fecha_actualizacion': datetime.utcnow(),
+                }
+                for c in self.claves
+            ]
+            volcadas = {c.huella: c.pendientes for c in self.claves}
+            for c in self.claves:
+                c.pendientes = 0
+
+        if not filas:
+            return
+
+        try:
+            with self.bind.begin() as conn:
+                stmt = insert_dialecto(conn, UsoClaveAPI)
+                conn.execute(
+                    stmt.on_conflict_do_update(
+                        index_elements=['huella', 'mes'],
+                        set_={
+                            'peticiones': UsoClaveAPI.peticiones + stmt.excluded.peticiones,
+                            'cuota': stmt.excluded.cuota,
+                            'agotada': or_(UsoClaveAPI.agotada, stmt.excluded.agotada),
+                            'ultimo_error': func.coalesce(stmt.excluded.ultimo_error, UsoClaveAPI.ultimo_error),
+                            'fecha_actualizacion': stmt.excluded.fecha_actualizacion,
+                        }
+                    ),
+                    filas
+                )
+                totales = {
+                    fila.huella: fila for fila in conn.execute(
+                        select(UsoClaveAPI.huella, UsoClaveAPI.peticiones, UsoClaveAPI.agotada)
+                        .where(UsoClaveAPI.mes == mes, UsoClaveAPI.huella.in_(list(volcadas)))
+                    )
+                }
+        except Exception as e:
+            # Sin base se sigue contando en memoria; se reintenta en la próxima
+            with self._lock:
+                for c in self.claves:
+                    c.pendientes += volcadas[c.huella]
+            logger.error(f"No se pudo sincronizar el uso de API keys: {str(e)}")
+            return
+
+        with self._lock:
+            for c in self.claves:
+                if c.huella in totales:
+                    c.usadas = totales[c.huella].peticiones + c.pendientes
+                    c.agotada = c.agotada or bool(totales[c.huella].agotada)
+
+            # Cambio de mes: la cuota se renueva
+            actual = inicio_mes(datetime.utcnow())
+            if actual != self.mes:
+                self.mes = actual
+                for c in self.claves:
+                    c.usadas, c.agotada, c._avisada = c.pendientes, False, False
+                logger.info(f"Nuevo mes {actual:%Y-%m}: cuotas de API keys renovadas")
+
+    # ---------------------------------------------------
+    # Reporte
+    # ---------------------------------------------------
+    def reporte(self):
+        with self._lock:
+            ahora = time.monotonic()
+            return [
+                {
+                    'clave': c.huella,
+                    'estado': c.estado(ahora),
+                    'usadas': c.usadas,
+                    'cuota': c.cuota or None,
+                    'restante': c.restante(),
+                    'ultimo_error': c.ultimo_error,
+                }
+                for c in self.claves
+            ]
+
+    def holgura(self):
+        # Peticiones restantes del mes entre las claves utilizables
+        # (None si alguna no tiene cuota conocida)
+        filas = [r for r in self.reporte() if r['estado'] in ("disponible", "pausada")]
+        if any(r['restante'] is None for r in filas):
+            return None
+        return sum(r['restante'] for r in filas)
+
+    def resumen(self):
+        reporte = self.reporte()
+        disponibles = sum(r['estado'] == "disponible" for r in reporte)
+        holgura = self.holgura()
+        texto = f"API keys: {disponibles}/{len(reporte)} disponibles"
+        if holgura is not None:
+            texto += f", {holgura:,} peticiones restantes en {self.mes:%Y-%m}"
+        return texto
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Uso y cuota restante de las API keys")
+    parser.parse_args()
+
+    pool = PoolClaves.desde_entorno()
+    pool.sincronizar()
+    for r in pool.reporte():
+        cuota = f"{r['usadas']:>8,} / {r['cuota']:,}" if r['cuota'] else f"{r['usadas']:>8,} / -"
+        print(f"{r['clave']}  {r['estado']:<10} {cuota}  {r['ultimo_error'] or ''}")
+    print(pool.resumen())
@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+# Capa de acceso a datos compartida por los dashboards de Streamlit.
+#
+# Cada consulta cacheada recibe `version` como primer argumento: mientras
+# version_datos() no cambie (no se cargó nada nuevo) Streamlit devuelve el
+# resultado guardado y mover un filtro no vuelve a consultar la base.
+import os
+from datetime import datetime, timedelta
+
+import streamlit as st
+import pandas as pd
+from sqlalchemy import select, func
+
+from scripts.database import engine
+from scripts.models import Ciudad, RegistroClima, ClimaActual, MetricasETL, ParticionArchivada
+from scripts.muestreo import serie_submuestreada
+from scripts.particiones import leer_archivo
+from scripts.agregados import (
+    resumen_por_ciudad,
+    percentiles_por_ciudad,
+    tendencia_por_ciudad,
+)
+
+# Columnas que los dashboards pueden pedir: expresión SQL y dtype compacto.
+# "Ciudad" se lee como ciudad_id (entero) y se convierte a categórica.
+COLUMNAS_REGISTROS = {
+    "Ciudad": (RegistroClima.ciudad_id, None),
+    "Temperatura": (RegistroClima.temperatura, "float32"),
+    "Humedad": (RegistroClima.humedad, "float32"),
+    "Fecha": (RegistroClima.fecha_extraccion, "datetime64[ns]"),
+}
+
+TAMANO_BLOQUE = 50_000
+
+# Máximo de puntos por serie (ciudad) que se envían a los gráficos de línea
+PUNTOS_MAX_SERIE = int(os.getenv("PUNTOS_MAX_SERIE", "500"))
+
+# Días de datos crudos sobre los que se calculan los percentiles
+VENTANA_PERCENTILES_DIAS = int(os.getenv("PERCENTILES_DIAS", "30"))
+
+# Ids bajo la marca de agua que VistaIncremental relee en cada actualización
+SOLAPE_IDS = int(os.getenv("DASHBOARD_SOLAPE_IDS", "1000"))
+
+
+@st.cache_resource
+def obtener_engine():
+    return engine
+
+
+def version_datos():
+    # Es la única consulta por rerun. Cada max() va en su propia subconsulta:
+    # SQLite solo resuelve min/max desde el índice si es el único agregado
+    with obtener_engine().connect() as conn:
+        return tuple(conn.execute(select(
+            select(func.max(RegistroClima.id)).scalar_subquery(),
+            select(func.max(RegistroClima.fecha_extraccion)).scalar_subquery(),
+            select(func.count(Ciudad.id)).scalar_subquery(),
+            select(func.max(MetricasETL.id)).scalar_subquery(),
+            select(func.max(ParticionArchivada.id)).scalar_subquery(),
+        )).one())
+
+
+def _mapa_ciudades(conn):
+    return dict(conn.execute(select(Ciudad.id, Ciudad.nombre)).all())
+
+
+def leer_dataframe(conn, consulta, columnas, tipos, mapa_ciudades=None,
+                   tamano_bloque=TAMANO_BLOQUE):
+    # Lee un SELECT de Core por bloques (stream_results) y arma el DataFrame
+    # con dtypes compactos: nunca se crean objetos ORM ni listas de dicts
+    if mapa_ciudades is not None:
+        tipo_ciudad = pd.CategoricalDtype(sorted(set(mapa_ciudades.values())))
+
+    resultado = conn.execution_options(
+        stream_results=True,
+        yield_per=tamano_bloque
+    ).execute(consulta)
+
+    bloques = []
+    for filas in resultado.partitions():
+        bloque = pd.DataFrame.from_records(filas, columns=columnas)
+        for columna, tipo in tipos.items():
+            if tipo:
+                bloque[columna] = bloque[columna].astype(tipo)
+        if mapa_ciudades is not None and "Ciudad" in bloque:
+            bloque["Ciudad"] = bloque["Ciudad"].map(mapa_ciudades).astype(tipo_ciudad)
+        bloques.append(bloque)
+
+    if not bloques:
+        vacio = pd.DataFrame(columns=columnas)
+        for columna, tipo in tipos.items():
+            if tipo:
+                vacio[columna] = vacio[columna].astype(tipo)
+        if mapa_ciudades is not None and "Ciudad" in vacio:
+            vacio["Ciudad"] = vacio["Ciudad"].astype(tipo_ciudad)
+        return vacio
+
+    return pd.concat(bloques, ignore_index=True)
+
+
+@st.cache_data(show_spinner=False)
+def listar_ciudades(version):
+    with obtener_engine().connect() as conn:
+        return conn.execute(
+            select(Ciudad.nombre).order_by(Ciudad.nombre)
+        ).scalars().all()
+
+
+@st.cache_data(show_spinner=False)
+def conteos(version):
+    with obtener_engine().connect() as conn:
+        ciudades, registros, ultima = conn.execute(select(
+            select(func.count(Ciudad.id)).scalar_subquery(),
+            func.count(RegistroClima.id),
+            func.max(RegistroClima.fecha_extraccion),
+        )).one()
+
+    return {"ciudades": ciudades, "registros": registros, "ultima_fecha": ultima}
+
+
+@st.cache_data(show_spinner=False)
+def registros(version, ciudades=None, desde=None, hasta=None,
+              temp_min=None, temp_max=None, columnas=None):
+    columnas = list(columnas or COLUMNAS_REGISTROS)
+    consulta = select(*[COLUMNAS_REGISTROS[c][0] for c in columnas])
+
+    with obtener_engine().connect() as conn:
+        mapa = _mapa_ciudades(conn)
+
+        if ciudades is not None:
+            ids = [i for i, nombre in mapa.items() if nombre in set(ciudades)]
+            consulta = consulta.where(RegistroClima.ciudad_id.in_(ids))
+        if desde is not None:
+            consulta = consulta.where(RegistroClima.fecha_extraccion >= desde)
+        if hasta is not None:
+            consulta = consulta.where(RegistroClima.fecha_extraccion <= hasta)
+        if temp_min is not None:
+            consulta = consulta.where(RegistroClima.temperatura >= temp_min)
+        if temp_max is not None:
+            consulta = consulta.where(RegistroClima.temperatura <= temp_max)
+
+        consulta = consulta.order_by(RegistroClima.fecha_extraccion)
+
+        df = leer_dataframe(
+            conn,
+            consulta,
+            columnas,
+            {c: COLUMNAS_REGISTROS[c][1] for c in columnas},
+            mapa_ciudades=mapa
+        )
+
+        # Meses fríos movidos a Parquet por el job de retención
+        archivado = leer_archivo(conn, desde=desde, hasta=hasta, ciudades=ciudades)
+
+    if archivado.empty:
+        return df
+
+    if temp_min is not None:
+        archivado = archivado[archivado["Temperatura"] >= temp_min]
+    if temp_max is not None:
+        archivado = archivado[archivado["Temperatura"] <= temp_max]
+
+    # Los meses archivados son siempre anteriores a la tabla caliente
+    tipos = {c: COLUMNAS_REGISTROS[c][1] or "category" for c in columnas}
+    combinado = pd.concat(
+        [archivado[columnas].astype(object), df.astype(object)],
+        ignore_index=True
+    )
+    return combinado.astype(tipos)
+
+
+class VistaIncremental:
+    # Registros ya leídos más la marca de agua (max id). registros_clima solo
+    # crece por inserciones, así que cada actualizar() pide únicamente las
+    # filas con id mayor: una consulta sobre la clave primaria en lugar de
+    # releer la tabla. Lo que sale de la ventana se descarta de memoria.
+    # Las filas modificadas en su lugar (MODO_CARGA=actualizar) no se releen
+    # hasta recargar().
+    #
+    # En PostgreSQL el id se asigna al insertar pero la fila se ve al hacer
+    # commit: una transacción más lenta puede confirmar ids por debajo de la
+    # marca. Por eso se releen los últimos `solape` ids y se descartan los
+    # que ya están en memoria.
+    def __init__(self, ventana=None, solape=SOLAPE_IDS):
+        self.ventana = ventana
+        self.solape = solape
+        self.recargar()
+
+    def recargar(self):
+        self.df = None
+        self.ultimo_id = 0
+        self.actualizado = None
+        self._mapa = {}
+        self._vistos = set()
+
+    def inicio_ventana(self):
+        # En UTC, como fecha_extraccion
+        return datetime.utcnow() - self.ventana if self.ventana else None
+
+    def _leer_nuevas(self, conn, desde):
+        consulta = select(
+            RegistroClima.id, *[expresion for expresion, _ in COLUMNAS_REGISTROS.values()]
+        ).where(RegistroClima.id > max(0, self.ultimo_id - self.solape))
+        if desde is not None:
+            consulta = consulta.where(RegistroClima.fecha_extraccion >= desde)
+
+        tipos = {c: tipo for c, (_, tipo) in COLUMNAS_REGISTROS.items()}
+        # Ciudad llega como ciudad_id: se traduce abajo con el mapa de la vista
+        nuevas = leer_dataframe(
+            conn, consulta.order_by(RegistroClima.id), ["id", *COLUMNAS_REGISTROS], tipos
+        )
+        return nuevas.set_index("id")
+
+    def actualizar(self):
+        # Devuelve cuántas filas nuevas se agregaron
+        desde = self.inicio_ventana()
+        archivado = None
+
+        with obtener_engine().connect() as conn:
+            nuevas = self._leer_nuevas(conn, desde)
+            nuevas = nuevas[~nuevas.index.isin(self._vistos)]
+            # El mapa de ciudades solo se relee si aparece una ciudad nueva
+            if not set(nuevas["Ciudad"].unique()) <= set(self._mapa):
+                self._mapa = _mapa_ciudades(conn)
+            if self.df is None:
+                # Primera carga: los meses archivados en Parquet no tienen id
+                archivado = leer_archivo(conn, desde=desde)
+
+        tipo_ciudad = pd.CategoricalDtype(sorted(set(self._mapa.values())))
+        nuevas["Ciudad"] = nuevas["Ciudad"].map(self._mapa).astype(tipo_ciudad)
+        if len(nuevas):
+            self.ultimo_id = max(self.ultimo_id, int(nuevas.index.max()))
+        # Solo hace falta recordar los ids que la próxima lectura vuelve a ver
+        limite = self.ultimo_id - self.solape
+        self._vistos = {i for i in self._vistos if i > limite}
+        self._vistos.update(i for i in nuevas.index if i > limite)
+
+        partes = [nuevas]
+        if self.df is not None:
+            self.df["Ciudad"] = self.df["Ciudad"].astype(tipo_ciudad)
+            partes.insert(0, self.df)
+        elif archivado is not None and not archivado.empty:
+            # Índice 0: ningún id real es 0 y quedan antes que la tabla caliente
+            archivado.index = pd.Index([0] * len(archivado), name="id")
+            partes.insert(0, archivado.astype(
+                {c: tipo or tipo_ciudad for c, (_, tipo) in COLUMNAS_REGISTROS.items()}
+            ))
+
+        self.df = pd.concat(partes) if len(partes) > 1 else nuevas
+        if desde is not None:
+            self.df = self.df[self.df["Fecha"] >= desde]
+
+        self.actualizado = datetime.utcnow()
+        return len(nuevas)
+
+
+def vista_incremental(ventana=None):
+    # Una vista por sesión de Streamlit; cambiar la ventana la reinicia
+    vista = st.session_state.get("vista_incremental")
+    if vista is None or vista.ventana != ventana:
+        vista = st.session_state["vista_incremental"] = VistaIncremental(ventana)
+    return vista
+
+
+@st.cache_data(show_spinner=False)
+def serie(version, metrica="temperatura", ciudades=None, desde=None, hasta=None,
+          puntos_max=PUNTOS_MAX_SERIE, temp_min=None, temp_max=None):
+    with obtener_engine().connect() as conn:
+        # Meses fríos movidos a Parquet por el job de retención
+        archivado = leer_archivo(conn, desde=desde, hasta=hasta, ciudades=ciudades)
+        if temp_min is not None:
+            archivado = archivado[archivado["Temperatura"] >= temp_min]
+        if temp_max is not None:
+            archivado = archivado[archivado["Temperatura"] <= temp_max]
+
+        return serie_submuestreada(
+            conn, metrica, ciudades=ciudades, desde=desde, hasta=hasta,
+            puntos_max=puntos_max, temp_min=temp_min, temp_max=temp_max,
+            archivado=archivado
+        )
+
+
+@st.cache_data(show_spinner=False)
+def clima_actual(version):
+    with obtener_engine().connect() as conn:
+        filas = conn.execute(
+            select(Ciudad.nombre, ClimaActual.temperatura, ClimaActual.humedad)
+            .join(ClimaActual, ClimaActual.ciudad_id == Ciudad.id)
+            .order_by(Ciudad.nombre)
+        ).all()
+
+    return pd.DataFrame(filas, columns=["Ciudad", "Temperatura", "Humedad"])
+
+
+@st.cache_data(show_spinner=False)
+def resumen(version, ciudades=None, desde=None, hasta=None, grano="dia"):
+    # Los acumulados tienen la resolución del grano: `desde` se redondea al
+    # inicio de su hora o de su día
+    with obtener_engine().connect() as conn:
+        return resumen_por_ciudad(conn, desde=desde, hasta=hasta, ciudades=ciudades, grano=grano)
+
+
+@st.cache_data(show_spinner=False)
+def estadisticas(version):
+    # Resumen (acumulados) + percentiles + tendencia: tres consultas en total,
+    # sin importar cuántas ciudades haya. Los percentiles leen datos crudos,
+    # solo de los últimos VENTANA_PERCENTILES_DIAS días: con la ventana dentro
+    # de MESES_RETENCION nunca caen en meses archivados.
+    desde = datetime.utcnow() - timedelta(days=VENTANA_PERCENTILES_DIAS)
+    with obtener_engine().connect() as conn:
+        df = resumen_por_ciudad(conn)
+        if df.empty:
+            return df
+        df = df.merge(percentiles_por_ciudad(conn, desde=desde), on="Ciudad", how="left")
+        df = df.merge(tendencia_por_ciudad(conn), on="Ciudad", how="left")
+
+    return df
+
+
+@st.cache_data(show_spinner=False)
+def metricas_etl(version, limite=50):
+    # Últimas `limite` ejecuciones en orden cronológico, para ver tendencias
+    m = MetricasETL
+    consulta = select(
+        m.fecha_ejecucion.label("Fecha"),
+        m.estado.label("Estado"),
+        m.registros_extraidos.label("Extraídos"),
+        m.registros_guardados.label("Guardados"),
+        m.registros_fallidos.label("Fallidos"),
+        m.tiempo_ejecucion_segundos.label("Tiempo (s)"),
+        m.tiempo_extraccion.label("Extracción (s)"),
+        m.tiempo_transformacion.label("Transformación (s)"),
+        m.tiempo_carga.label("Carga (s)"),
+        m.peticiones.label("Peticiones"),
+        m.reintentos.label("Reintentos"),
+        m.latencia_p50_ms.label("Latencia p50 (ms)"),
+        m.latencia_p95_ms.label("Latencia p95 (ms)"),
+        m.cache_hits.label("Cache hits"),
+        m.memoria_rss_mb.label("Memoria RSS (MB)"),
+        m.memoria_pico_incremento_mb.label("Incremento pico (MB)"),
+    ).where(m.estado.is_not(None)).order_by(m.fecha_ejecucion.desc()).limit(limite)
+
+    with obtener_engine().connect() as conn:
+        df = pd.DataFrame(conn.execute(consulta).all(), columns=list(consulta.selected_columns.keys()))
+
+    df = df.iloc[::-1].reset_index(drop=True)
+    tiempo = df["Tiempo (s)"].astype(float)
+    df["Filas/s"] = (df["Guardados"].astype(float) / tiempo).where(tiempo > 0)
+    return df
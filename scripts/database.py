@@ -1,12 +1,63 @@
-from sqlalchemy import create_engine
+import os
+from pathlib import Path
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, event
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.orm import sessionmaker, declarative_base
 
-DATABASE_URL = "sqlite:///clima-pitacho.db"
+env_path = Path(__file__).resolve().parents[1] / ".env"
+load_dotenv(dotenv_path=env_path)
 
-engine = create_engine(
-    DATABASE_URL,
-    connect_args={"check_same_thread": False}
-)
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///clima-pitacho.db")
+
+# Perfil SQLite: WAL deja leer a los dashboards mientras el ETL escribe
+PERFIL_SQLITE = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    # Negativo = KiB (64 MB por defecto)
+    "cache_size": -int(os.getenv("SQLITE_CACHE_MB", "64")) * 1024,
+    "mmap_size": int(os.getenv("SQLITE_MMAP_MB", "256")) * 1024 * 1024,
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+    "temp_store": "MEMORY",
+}
+
+# Perfil PostgreSQL: pool de conexiones reutilizables
+PERFIL_POSTGRES = {
+    "pool_size": int(os.getenv("DB_POOL_SIZE", "10")),
+    "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "20")),
+    "pool_timeout": int(os.getenv("DB_POOL_TIMEOUT", "30")),
+    "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+    "pool_pre_ping": True,
+}
+
+
+def _aplicar_pragmas(perfil):
+    def conectar(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma, valor in perfil.items():
+            cursor.execute(f"PRAGMA {pragma}={valor}")
+        cursor.close()
+
+    return conectar
+
+
+def crear_engine(url=DATABASE_URL, **perfil):
+    # `perfil` sobreescribe valores del perfil por defecto del motor
+    if url.startswith("sqlite"):
+        engine = create_engine(
+            url,
+            connect_args={"check_same_thread": False}
+        )
+        event.listen(engine, "connect", _aplicar_pragmas({**PERFIL_SQLITE, **perfil}))
+        return engine
+
+    if url.startswith("postgresql"):
+        return create_engine(url, **{**PERFIL_POSTGRES, **perfil})
+
+    return create_engine(url, **perfil)
+
+
+engine = crear_engine()
 
 SessionLocal = sessionmaker(
     autocommit=False,
@@ -14,4 +65,13 @@ SessionLocal = sessionmaker(
     bind=engine
 )
 
-Base = declarative_base()
\ No newline at end of file
+Base = declarative_base()
+
+
+def insert_dialecto(conn, modelo):
+    # insert() con soporte de ON CONFLICT según el motor
+    dialectos = {"postgresql": postgresql, "sqlite": sqlite}
+    if conn.dialect.name not in dialectos:
+        raise ValueError(f"Upsert no soportado para {conn.dialect.name}")
+
+    return dialectos[conn.dialect.name].insert(modelo)
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+import argparse
+import logging
+import time
+from datetime import datetime
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import select
+
+from scripts.database import engine
+from scripts.models import Ciudad, RegistroClima
+from scripts.particiones import rutas_archivadas
+
+logger = logging.getLogger(__name__)
+
+TAMANO_BLOQUE = 100_000
+FORMATOS = ("csv", "parquet")
+
+
+def consulta_exportacion(ciudades=None, desde=None, hasta=None,
+                         temp_min=None, temp_max=None):
+    consulta = select(
+        Ciudad.nombre.label("ciudad"),
+        Ciudad.pais.label("pais"),
+        RegistroClima.temperatura,
+        RegistroClima.humedad,
+        RegistroClima.fecha_extraccion,
+        RegistroClima.fecha_observacion,
+    ).join(Ciudad, Ciudad.id == RegistroClima.ciudad_id)
+
+    if ciudades is not None:
+        consulta = consulta.where(Ciudad.nombre.in_(ciudades))
+    if desde is not None:
+        consulta = consulta.where(RegistroClima.fecha_extraccion >= desde)
+    if hasta is not None:
+        consulta = consulta.where(RegistroClima.fecha_extraccion <= hasta)
+    if temp_min is not None:
+        consulta = consulta.where(RegistroClima.temperatura >= temp_min)
+    if temp_max is not None:
+        consulta = consulta.where(RegistroClima.temperatura <= temp_max)
+
+    return consulta.order_by(RegistroClima.fecha_extraccion)
+
+
+def _tipar(bloque):
+    bloque["temperatura"] = bloque["temperatura"].astype("float32")
+    bloque["humedad"] = bloque["humedad"].astype("Int16")
+    bloque["fecha_extraccion"] = pd.to_datetime(bloque["fecha_extraccion"])
+    bloque["fecha_observacion"] = pd.to_datetime(bloque["fecha_observacion"])
+    return bloque
+
+
+def iterar_bloques(conn, consulta, tamano_bloque=TAMANO_BLOQUE):
+    # Cursor del lado del servidor: en memoria solo vive un bloque a la vez
+    resultado = conn.execution_options(
+        stream_results=True,
+        yield_per=tamano_bloque
+    ).execute(consulta)
+    columnas = list(resultado.keys())
+
+    for filas in resultado.partitions():
+        yield _tipar(pd.DataFrame.from_records(filas, columns=columnas))
+
+
+def iterar_archivo(conn, tamano_bloque=TAMANO_BLOQUE, ciudades=None, desde=None,
+                   hasta=None, temp_min=None, temp_max=None):
+    # Meses archivados en Parquet por el job de retención, leídos por lotes
+    # con los mismos filtros y columnas que consulta_exportacion
+    rutas = rutas_archivadas(conn, desde, hasta)
+    if not rutas:
+        return
+
+    paises = dict(conn.execute(select(Ciudad.nombre, Ciudad.pais)).all())
+    columnas = ["ciudad", "temperatura", "humedad", "fecha_extraccion", "fecha_observacion"]
+
+    for ruta in rutas:
+        for lote in pq.ParquetFile(ruta).iter_batches(batch_size=tamano_bloque, columns=columnas):
+            bloque = lote.to_pandas()
+            filtro = pd.Series(True, index=bloque.index)
+            if ciudades is not None:
+                filtro &= bloque["ciudad"].isin(list(ciudades))
+            if desde is not None:
+                filtro &= bloque["fecha_extraccion"] >= pd.Timestamp(desde)
+            if hasta is not None:
+                filtro &= bloque["fecha_extraccion"] <= pd.Timestamp(hasta)
+            if temp_min is not None:
+                filtro &= bloque["temperatura"] >= temp_min
+            if temp_max is not None:
+                filtro &= bloque["temperatura"] <= temp_max
+
+            bloque = bloque[filtro.fillna(False)]
+            if bloque.empty:
+                continue
+            bloque.insert(1, "pais", bloque["ciudad"].map(paises))
+            yield _tipar(bloque.reset_index(drop=True))
+
+
+def iterar_exportacion(conn, tamano_bloque=TAMANO_BLOQUE, **filtros):
+    # Meses archivados (siempre anteriores) y después la tabla caliente
+    yield from iterar_archivo(conn, tamano_bloque, **filtros)
+    yield from iterar_bloques(conn, consulta_exportacion(**filtros), tamano_bloque)
+
+
+def exportar_csv(destino, tamano_bloque=TAMANO_BLOQUE, **filtros):
+    # `destino` puede ser una ruta o un archivo de texto abierto
+    filas = 0
+    archivo = open(destino, "w", newline="", encoding="utf-8") if isinstance(destino, str) else destino
+
+    try:
+        with engine.connect() as conn:
+            for bloque in iterar_exportacion(conn, tamano_bloque, **filtros):
+                bloque.to_csv(archivo, index=False, header=(filas == 0))
+                filas += len(bloque)
+
+        if filas == 0:
+            archivo.write(",".join(consulta_exportacion().selected_columns.keys()) + "\n")
+
+    finally:
+        if isinstance(destino, str):
+            archivo.close()
+
+    return filas
+
+
+def exportar_parquet(destino, compresion="zstd", tamano_bloque=TAMANO_BLOQUE, **filtros):
+    # Esquema fijo: todos los bloques (y un archivo sin filas) lo comparten
+    # aunque una columna venga entera en NULL
+    esquema = pa.schema([
+        ("ciudad", pa.string()),
+        ("pais", pa.string()),
+        ("temperatura", pa.float32()),
+        ("humedad", pa.int16()),
+        ("fecha_extraccion", pa.timestamp("us")),
+        ("fecha_observacion", pa.timestamp("us")),
+    ])
+    filas = 0
+
+    with pq.ParquetWriter(destino, esquema, compression=compresion) as escritor:
+        with engine.connect() as conn:
+            for bloque in iterar_exportacion(conn, tamano_bloque, **filtros):
+                escritor.write_table(
+                    pa.Table.from_pandas(bloque, schema=esquema, preserve_index=False)
+                )
+                filas += len(bloque)
+
+    if filas == 0:
+        logger.warning("No hay registros que exportar: el archivo Parquet queda vacío")
+
+    return filas
+
+
+def exportar(destino, formato="csv", **kwargs):
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato no soportado: {formato}")
+
+    inicio = time.perf_counter()
+    filas = exportar_csv(destino, **kwargs) if formato == "csv" else exportar_parquet(destino, **kwargs)
+    logger.info(f"{filas} registros exportados a {destino} en {time.perf_counter() - inicio:.2f}s")
+    return filas
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Exporta registros_clima a CSV o Parquet")
+    parser.add_argument("salida", help="Ruta del archivo de salida")
+    parser.add_argument("--formato", choices=FORMATOS, default="csv")
+    parser.add_argument("--ciudades", help="Lista separada por comas")
+    parser.add_argument("--desde", type=datetime.fromisoformat)
+    parser.add_argument("--hasta", type=datetime.fromisoformat)
+    parser.add_argument("--compresion", default="zstd", help="Solo Parquet (zstd, snappy, gzip...)")
+    parser.add_argument("--tamano-bloque", type=int, default=TAMANO_BLOQUE)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    opciones = {
+        "ciudades": args.ciudades.split(",") if args.ciudades else None,
+        "desde": args.desde,
+        "hasta": args.hasta,
+        "tamano_bloque": args.tamano_bloque,
+    }
+    if args.formato == "parquet":
+        opciones["compresion"] = args.compresion
+
+    exportar(args.salida, args.formato, **opciones)
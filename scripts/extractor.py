@@ -1,12 +1,22 @@
 #!/usr/bin/env python3
+import argparse
 import os
+import random
+import threading
+import time
 import requests
-import json
-import pandas as pd
 from datetime import datetime
 from dotenv import load_dotenv
 from pathlib import Path
-from scripts.loader import guardar_datos_en_bd
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from scripts.metricas import ejecutar_etl
+from scripts.claves import PoolClaves, CODIGOS_CLAVE, CODIGO_RATE_LIMIT
+from scripts.cache import CacheRespuestas
+from scripts.transformador import transformar_respuestas, a_registros
+from scripts.archivo_crudo import ArchivoCrudo, DIRECTORIO_ARCHIVO_CRUDO
+from scripts.database import engine
+from scripts.loader import AgregadosPendientes, guardar_datos_en_bd_bulk
 import logging
 
 # Cargar .env correctamente
@@ -24,87 +34,445 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Errores transitorios que vale la pena reintentar
+ESTADOS_HTTP_REINTENTABLES = {429, 500, 502, 503, 504}
+# Códigos de error que Weatherstack devuelve dentro del cuerpo con HTTP 200:
+# 429 = demasiadas peticiones (rate limit), 615 = fallo interno de la petición
+CODIGOS_API_REINTENTABLES = {429, 615}
+
+
+class ErrorReintentable(Exception):
+    pass
+
+
+class ErrorClave(ErrorReintentable):
+    # Fallo de la API key (cuota, rate limit, inválida), no del servicio:
+    # la clave ya salió del reparto y se reintenta enseguida con otra
+    pass
+
+
+def peticiones_facturadas(params):
+    # Weatherstack descuenta una petición por ubicación consultada y, en
+    # /historical, por cada fecha de historical_date (hourly no suma)
+    ubicaciones = len(str(params.get('query', '')).split(';'))
+    fechas = params.get('historical_date')
+    return ubicaciones * (len(str(fechas).split(';')) if fechas else 1)
+
+
 class WeatherstackExtractor:
-    def __init__(self):
-        self.api_key = os.getenv('API_KEY')
+    def __init__(self, reproduccion=False):
+        # reproduccion=True: solo se relee el archivo crudo, sin red (no
+        # hacen falta API_KEY ni CIUDADES)
         self.base_url = os.getenv('WEATHERSTACK_BASE_URL')
 
         ciudades_env = os.getenv('CIUDADES')
-        if not ciudades_env:
+        if not ciudades_env and not reproduccion:
             raise ValueError("CIUDADES no fue cargado desde el .env")
 
-        self.ciudades = ciudades_env.split(',')
+        self.ciudades = ciudades_env.split(',') if ciudades_env else []
 
-        if not self.api_key:
-            raise ValueError("API_KEY no configurada en .env")
+        # Una o varias API keys (API_KEYS), cada una con su límite por
+        # segundo (PETICIONES_POR_SEGUNDO) y su cuota mensual
+        self.claves = PoolClaves.desde_entorno()
+        if not self.claves and not reproduccion:
+            raise ValueError("API_KEY / API_KEYS no configuradas en .env")
+        if self.claves:
+            self.claves.sincronizar()
 
-    def extraer_clima(self, ciudad):
+        # Modo bulk: ciudades por petición (1 = una ciudad por petición)
+        self.tamano_lote = int(os.getenv('TAMANO_LOTE', '1'))
+
+        self.max_concurrencia = int(os.getenv('MAX_CONCURRENCIA', '1'))
+
+        # Sesión HTTP con pool de conexiones keep-alive
+        self.timeout = float(os.getenv('TIMEOUT_HTTP', '10'))
+        self.max_reintentos = int(os.getenv('MAX_REINTENTOS', '3'))
+        self.backoff_base = float(os.getenv('BACKOFF_BASE', '0.5'))
+        self.backoff_max = float(os.getenv('BACKOFF_MAX', '8'))
+
+        pool_conexiones = int(
+            os.getenv('POOL_CONEXIONES', str(max(10, self.max_concurrencia)))
+        )
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=pool_conexiones,
+            pool_maxsize=pool_conexiones
+        )
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        # Latencia e intentos de cada llamada a la API
+        self.latencias = []
+        self._lock_latencias = threading.Lock()
+        # Segundos de la transformación por lotes de la última extracción
+        self.tiempo_transformacion = 0.0
+
+        # Caché de respuestas: evita gastar cuota si la estación no publicó
+        # una observación nueva desde la última ejecución (TTL 0 = sin caché)
+        ttl_cache = int(os.getenv('CACHE_TTL_SEGUNDOS', '600'))
+        self.cache = None
+        if ttl_cache > 0:
+            self.cache = CacheRespuestas(
+                os.getenv('CACHE_RUTA', 'cache-weatherstack.db'),
+                ttl=ttl_cache,
+                max_entradas=int(os.getenv('CACHE_MAX_ENTRADAS', '10000'))
+            )
+        self._sin_cambios = set()
+        self.por_confirmar = []
+
+        # Archivo comprimido de respuestas crudas (ARCHIVO_CRUDO_DIR vacío lo desactiva)
+        directorio_crudo = os.getenv('ARCHIVO_CRUDO_DIR', DIRECTORIO_ARCHIVO_CRUDO)
+        self.archivo = ArchivoCrudo(directorio_crudo) if directorio_crudo else None
+
+    def cerrar(self):
+        self.session.close()
+        if self.claves:
+            self.claves.sincronizar()
+        if self.cache:
+            self.cache.cerrar()
+        if self.archivo:
+            self.archivo.cerrar()
+
+    def _desde_cache(self, ciudad):
+        if not self.cache:
+            return None
+
+        data = self.cache.obtener(ciudad)
+        if data:
+            # Solo está "sin cambios" si esa observación ya llegó a la BD
+            if self.cache.ya_cargada(ciudad, data):
+                with self._lock_latencias:
+                    self._sin_cambios.add(ciudad)
+            logger.info(f"Datos de {ciudad} servidos desde caché")
+        return data
+
+    def _guardar_en_cache(self, ciudad, data):
+        if self.cache and not self.cache.guardar(ciudad, data):
+            with self._lock_latencias:
+                self._sin_cambios.add(ciudad)
+            logger.info(f"Sin observación nueva para {ciudad}")
+
+    def _espera_backoff(self, intento):
+        # Backoff exponencial con jitter completo
+        limite = min(self.backoff_max, self.backoff_base * (2 ** intento))
+        return random.uniform(0, limite)
+
+    def _registrar_latencia(self, consulta, inicio, tiempos, intentos, ok):
+        # latencia: solo HTTP (session.get, sumado entre intentos); espera: el
+        # resto (límite por segundo, adquirir clave, backoff)
+        total = time.perf_counter() - inicio
+        with self._lock_latencias:
+            self.latencias.append({
+                'ciudad': consulta,
+                'latencia_ms': tiempos['http'] * 1000,
+                'espera_ms': max(0.0, total - tiempos['http']) * 1000,
+                'intentos': intentos,
+                'ok': ok,
+            })
+
+    def _peticion(self, endpoint, params, clave, tiempos):
+        inicio = time.perf_counter()
         try:
-            url = f"{self.base_url}/current"
-            params = {
-                'access_key': self.api_key,
-                'query': ciudad.strip()
-            }
+            response = self.session.get(
+                f"{self.base_url}/{endpoint}",
+                params={'access_key': clave.valor, **params},
+                timeout=self.timeout
+            )
+        finally:
+            tiempos['http'] += time.perf_counter() - inicio
+
+        if response.status_code == CODIGO_RATE_LIMIT:
+            self.claves.descartar(clave, CODIGO_RATE_LIMIT, "HTTP 429")
+            raise ErrorClave("HTTP 429")
+        if response.status_code in ESTADOS_HTTP_REINTENTABLES:
+            raise ErrorReintentable(f"HTTP {response.status_code}")
+        response.raise_for_status()
+
+        data = response.json()
+
+        if isinstance(data, dict) and 'error' in data:
+            codigo = data['error'].get('code')
+            if codigo in CODIGOS_CLAVE:
+                # Cuota, rate limit o clave inválida: se reintenta con otra clave
+                self.claves.descartar(clave, codigo, data['error'].get('info'))
+                raise ErrorClave(
+                    f"API {codigo}: {data['error'].get('info')}"
+                )
+            if codigo in CODIGOS_API_REINTENTABLES:
+                raise ErrorReintentable(
+                    f"API {codigo}: {data['error'].get('info')}"
+                )
+
+        if not (isinstance(data, dict) and 'error' in data):
+            self.claves.registrar(clave, peticiones_facturadas(params))
+        return data
+
+    def llamar_api(self, endpoint, params, consulta):
+        inicio = time.perf_counter()
+        tiempos = {'http': 0.0}
+        intento = 1
+        # Cambios de clave sin espera; acotados para no girar sin fin si todas
+        # las claves devuelven 429
+        rotaciones = 0
+
+        while True:
+            try:
+                clave = self.claves.adquirir()
+                data = self._peticion(endpoint, params, clave, tiempos)
+                ok = not (isinstance(data, dict) and 'error' in data)
+                self._registrar_latencia(consulta, inicio, tiempos, intento, ok)
+                if ok and self.archivo:
+                    self.archivo.agregar(endpoint, consulta, data, fecha=datetime.utcnow())
+                return data
+
+            except (ErrorReintentable, requests.ConnectionError, requests.Timeout) as e:
+                if isinstance(e, ErrorClave) and rotaciones < len(self.claves):
+                    # Ni backoff ni reintento consumido: adquirir() ya no da esa clave
+                    rotaciones += 1
+                    logger.info(f"Otra API key para {consulta} ({str(e)})")
+                    continue
+
+                if intento > self.max_reintentos:
+                    self._registrar_latencia(consulta, inicio, tiempos, intento, False)
+                    raise
+
+                espera = self._espera_backoff(intento - 1)
+                logger.warning(
+                    f"Reintento {intento}/{self.max_reintentos} para {consulta} "
+                    f"en {espera:.2f}s: {str(e)}"
+                )
+                time.sleep(espera)
+                intento += 1
+
+            except Exception:
+                self._registrar_latencia(consulta, inicio, tiempos, intento, False)
+                raise
+
+    def extraer_clima(self, ciudad):
+        ciudad = ciudad.strip()
 
-            response = requests.get(url, params=params, timeout=10)
-            response.raise_for_status()
+        cacheado = self._desde_cache(ciudad)
+        if cacheado:
+            return cacheado
 
-            data = response.json()
+        return self._extraer_api(ciudad)
+
+    def _extraer_api(self, ciudad):
+        try:
+            data = self.llamar_api('current', {'query': ciudad}, ciudad)
 
             if 'error' in data:
                 logger.error(f"Error en API para {ciudad}: {data['error']['info']}")
                 return None
 
             logger.info(f"Datos extraídos para {ciudad}")
+            self._guardar_en_cache(ciudad, data)
             return data
 
         except Exception as e:
             logger.error(f"Error extrayendo datos para {ciudad}: {str(e)}")
             return None
 
-    def procesar_respuesta(self, response_data):
+    def extraer_clima_lote(self, ciudades):
+        # Una sola petición con las ciudades separadas por ';'. Si el lote
+        # falla (p. ej. error 604, plan sin bulk) se consulta ciudad por ciudad.
+        ciudades = [c.strip() for c in ciudades]
+        cacheados = {c: self._desde_cache(c) for c in ciudades}
+        pendientes = [c for c in ciudades if not cacheados[c]]
+
+        if len(pendientes) <= 1:
+            return [cacheados[c] or self._extraer_api(c) for c in ciudades]
+
+        obtenidos = self._extraer_lote_api(pendientes)
+        return [cacheados[c] or obtenidos[c] for c in ciudades]
+
+    def _extraer_lote_api(self, ciudades):
+        consulta = ';'.join(ciudades)
+
         try:
-            current = response_data.get('current', {})
-            location = response_data.get('location', {})
-
-            return {
-                'ciudad': location.get('name'),
-                'pais': location.get('country'),
-                'temperatura': current.get('temperature'),
-                'humedad': current.get('humidity'),
-                'descripcion': current.get('weather_descriptions', ['N/A'])[0],
-                'fecha_extraccion': datetime.now().isoformat(),
-            }
+            data = self.llamar_api('current', {'query': consulta}, consulta)
 
-        except Exception as e:
-            logger.error(f"Error procesando respuesta: {str(e)}")
-            return None
+            if isinstance(data, dict) and 'error' in data:
+                raise ValueError(data['error'].get('info'))
 
-    def ejecutar_extraccion(self):
-        datos_extraidos = []
+            if not isinstance(data, list) or len(data) != len(ciudades):
+                raise ValueError("respuesta bulk con formato inesperado")
 
-        logger.info(f"Iniciando extracción para {len(self.ciudades)} ciudades...")
+            resultados = {}
+            for ciudad, item in zip(ciudades, data):
+                if not isinstance(item, dict) or 'error' in item:
+                    resultados[ciudad] = self._extraer_api(ciudad)
+                else:
+                    self._guardar_en_cache(ciudad, item)
+                    resultados[ciudad] = item
 
-        for ciudad in self.ciudades:
-            response = self.extraer_clima(ciudad)
+            logger.info(f"Datos extraídos en lote para {len(ciudades)} ciudades")
+            return resultados
+
+        except Exception as e:
+            logger.warning(
+                f"Lote de {len(ciudades)} ciudades falló ({str(e)}), "
+                f"consultando individualmente"
+            )
+            return {ciudad: self._extraer_api(ciudad) for ciudad in ciudades}
+
+    def procesar_respuesta(self, response_data):
+        # Una sola respuesta; el ETL transforma por lotes con transformar_respuestas
+        registros = a_registros(transformar_respuestas([response_data]))
+        return registros[0] if registros else None
+
+    def extraer_nuevas(self, lote):
+        # Pares (ciudad, respuesta) del lote con observación aún no cargada
+        pares = []
+        for ciudad, response in zip(lote, self.extraer_clima_lote(lote)):
+            # Lo que la caché ya confirmó en la BD no se vuelve a guardar
+            if ciudad.strip() in self._sin_cambios:
+                continue
             if response:
-                datos_procesados = self.procesar_respuesta(response)
-                if datos_procesados:
-                    datos_extraidos.append(datos_procesados)
+                pares.append((ciudad.strip(), response))
+        return pares
+
+    def confirmar_cargadas(self, pares):
+        # Llamar solo tras el commit de la carga: hasta entonces la caché no
+        # da esas observaciones por guardadas
+        if self.cache and pares:
+            self.cache.confirmar(pares)
+
+    def ciudades_sin_cambios(self):
+        # Ciudades de la última extracción sin observación nueva
+        with self._lock_latencias:
+            return set(self._sin_cambios)
+
+    def preparar_extraccion(self, ciudades=None, tamano_lote=None):
+        # Reinicia el estado de la ejecución y devuelve los lotes a pedir
+        ciudades = list(ciudades) if ciudades is not None else self.ciudades
+        tamano = max(1, tamano_lote or self.tamano_lote)
+        self.latencias = []
+        self.tiempo_transformacion = 0.0
+        self._sin_cambios = set()
+        self.por_confirmar = []
+        if self.cache:
+            self.cache.reiniciar_estadisticas()
+            self.cache.purgar()
+
+        return [
+            ciudades[i:i + tamano]
+            for i in range(0, len(ciudades), tamano)
+        ]
 
-        return datos_extraidos
+    def finalizar_extraccion(self):
+        if self.archivo:
+            self.archivo.volcar()
+
+        if self.claves:
+            self.claves.sincronizar()
+            logger.info(self.claves.resumen())
+
+        if self.cache:
+            stats = self.cache.estadisticas()
+            logger.info(
+                f"Caché: {stats['hits']} hits, {stats['misses']} misses, "
+                f"{stats['sin_cambios']} sin observación nueva"
+            )
+
+    def ejecutar_extraccion(self, max_concurrencia=None, tamano_lote=None, ciudades=None):
+        # `ciudades` permite extraer solo un subconjunto (p. ej. el planificador)
+        concurrencia = max_concurrencia or self.max_concurrencia
+        lotes = self.preparar_extraccion(ciudades, tamano_lote)
+
+        logger.info(
+            f"Iniciando extracción para {sum(map(len, lotes))} ciudades "
+            f"en {len(lotes)} peticiones (concurrencia={concurrencia})..."
+        )
+
+        if concurrencia <= 1:
+            resultados = map(self.extraer_nuevas, lotes)
+            pares = [p for lote in resultados for p in lote]
+        else:
+            # executor.map conserva el orden de CIUDADES y los errores de cada
+            # ciudad ya quedan aislados en extraer_clima
+            with ThreadPoolExecutor(max_workers=concurrencia) as executor:
+                resultados = executor.map(self.extraer_nuevas, lotes)
+                pares = [p for lote in resultados for p in lote]
+
+        # Quien cargue `datos` llama a confirmar_cargadas(por_confirmar) tras el commit
+        self.por_confirmar = pares
+
+        # Una sola transformación vectorizada para todo el lote
+        inicio = time.perf_counter()
+        datos = transformar_respuestas([r for _, r in pares])
+        self.tiempo_transformacion = time.perf_counter() - inicio
+
+        self.finalizar_extraccion()
+        return datos
+
+    def reproducir(self, desde=None, hasta=None, ciudades=None, modo="actualizar",
+                   tamano_bloque=10_000):
+        # Reprocesa respuestas archivadas (sin red ni cuota): transformación
+        # por lotes + carga bulk. Cada fila conserva la fecha en que se extrajo.
+        # Los acumulados se reconstruyen una sola vez al final, sobre todo el
+        # rango cargado, en lugar de una vez por bloque.
+        if not self.archivo:
+            raise ValueError("El archivo crudo está desactivado (ARCHIVO_CRUDO_DIR)")
+
+        respuestas, fechas = [], []
+        leidas, guardadas = 0, 0
+        pendientes = AgregadosPendientes()
+        inicio = time.perf_counter()
+
+        def cargar():
+            df = transformar_respuestas(respuestas, fecha_extraccion=fechas)
+            respuestas.clear()
+            fechas.clear()
+            return guardar_datos_en_bd_bulk(df, modo=modo, pendientes=pendientes)
+
+        for registro in self.archivo.iterar(desde, hasta, ciudades):
+            respuestas.append(registro["respuesta"])
+            fechas.append(registro["fecha"])
+            leidas += 1
+            if len(respuestas) >= tamano_bloque:
+                guardadas += cargar()
+        if respuestas:
+            guardadas += cargar()
+
+        with engine.begin() as conn:
+            pendientes.reconstruir(conn)
+
+        segundos = time.perf_counter() - inicio
+        logger.info(
+            f"Reproducción: {leidas} respuestas archivadas, {guardadas} registros "
+            f"cargados en {segundos:.2f}s"
+        )
+        return guardadas
 
 
 
 if __name__ == "__main__":
-    try:
-        extractor = WeatherstackExtractor()
-        datos = extractor.ejecutar_extraccion()
+    parser = argparse.ArgumentParser(description="ETL Weatherstack")
+    parser.add_argument("--reproducir", action="store_true",
+                        help="Recargar desde el archivo crudo, sin llamar a la API")
+    parser.add_argument("--desde", type=datetime.fromisoformat)
+    parser.add_argument("--hasta", type=datetime.fromisoformat)
+    parser.add_argument("--ciudades", help="Lista separada por comas (solo --reproducir)")
+    parser.add_argument("--modo", help="Modo de carga (por defecto MODO_CARGA, o actualizar al reproducir)")
+    args = parser.parse_args()
 
-        if datos:
-            guardar_datos_en_bd(datos)
+    try:
+        extractor = WeatherstackExtractor(reproduccion=args.reproducir)
+        try:
+            if args.reproducir:
+                extractor.reproducir(
+                    args.desde,
+                    args.hasta,
+                    ciudades=args.ciudades.split(",") if args.ciudades else None,
+                    modo=args.modo or "actualizar"
+                )
+            else:
+                ejecutar_etl(extractor, modo=args.modo or os.getenv('MODO_CARGA', 'ignorar'))
+        finally:
+            extractor.cerrar()
 
         print("Proceso ETL completado correctamente.")
 
     except Exception as e:
-        logger.error(f"Error en extracción: {str(e)}")
\ No newline at end of file
+        logger.error(f"Error en extracción: {str(e)}")
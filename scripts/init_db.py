@@ -1,6 +1,5 @@
-from scripts.database import engine, Base
-from scripts import models  # IMPORTANTE: carga los modelos
+from scripts.migraciones import aplicar_migraciones
 
-Base.metadata.create_all(bind=engine)
+aplicar_migraciones()
 
 print("Tablas creadas correctamente")
\ No newline at end of file
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+import threading
+import time
+
+
+# Token bucket seguro entre hilos: `tasa` son las peticiones por segundo
+# del plan de Weatherstack y `capacidad` la ráfaga máxima. Tasa <= 0 = sin límite.
+class LimitadorTasa:
+    def __init__(self, tasa, capacidad=None):
+        self.tasa = float(tasa)
+        self.capacidad = float(capacidad) if capacidad else max(1.0, self.tasa)
+        self._tokens = self.capacidad
+        self._ultimo = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _recargar(self):
+        ahora = time.monotonic()
+        self._tokens = min(
+            self.capacidad,
+            self._tokens + (ahora - self._ultimo) * self.tasa
+        )
+        self._ultimo = ahora
+
+    def adquirir(self):
+        if self.tasa <= 0:
+            return
+
+        while True:
+            with self._lock:
+                self._recargar()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                espera = (1 - self._tokens) / self.tasa
+
+            time.sleep(espera)
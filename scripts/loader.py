@@ -1,15 +1,45 @@
 #!/usr/bin/env python3
-from scripts.database import SessionLocal
-from scripts.models import Ciudad, RegistroClima
+from scripts.database import SessionLocal, engine, insert_dialecto
+from scripts.models import Ciudad, RegistroClima, ClimaActual
+from scripts.agregados import actualizar_agregados, reconstruir_agregados, truncar
+from scripts.transformador import a_registros
+from sqlalchemy import select, insert, delete, func, or_, text, tuple_
 from datetime import datetime
+import csv
+import io
+import time
+import pandas as pd
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Tamaño de los IN (...) al resolver ciudades (SQLite limita las variables)
+TAMANO_CONSULTA_CIUDADES = 500
+
+# Modos de carga de registros:
+#   insertar   -> INSERT simple
+#   ignorar    -> INSERT ... ON CONFLICT DO NOTHING (re-ejecuciones idempotentes)
+#   actualizar -> INSERT ... ON CONFLICT DO UPDATE (la última lectura gana)
+MODOS_CARGA = ("insertar", "ignorar", "actualizar")
+CLAVE_NATURAL = ["ciudad_id", "fecha_observacion"]
+
+# Filas por executemany en las cargas masivas de SQLite
+TAMANO_LOTE_INSERCION = 10_000
+COLUMNAS_COPIA = ["ciudad_id", "temperatura", "humedad", "fecha_extraccion", "fecha_observacion"]
+
+
+def _registrar_rendimiento(filas, inicio):
+    segundos = time.perf_counter() - inicio
+    tasa = filas / segundos if segundos > 0 else 0
+    logger.info(f"{filas} registros en {segundos:.3f}s ({tasa:,.0f} filas/s)")
+
+
 def guardar_datos_en_bd(datos):
+    inicio = time.perf_counter()
     db = SessionLocal()
 
     try:
+        filas = []
         for item in datos:
 
             # Buscar o crear ciudad
@@ -30,17 +60,379 @@ def guardar_datos_en_bd(datos):
                 temperatura=item["temperatura"],
                 humedad=item["humedad"],
                 fecha_extraccion=datetime.fromisoformat(item["fecha_extraccion"]),
+                fecha_observacion=(
+                    _a_datetime(item.get("fecha_observacion"))
+                    or datetime.fromisoformat(item["fecha_extraccion"])
+                ),
                 ciudad_id=ciudad.id
             )
 
             db.add(nuevo_registro)
+            filas.append({
+                "ciudad_id": ciudad.id,
+                "temperatura": nuevo_registro.temperatura,
+                "humedad": nuevo_registro.humedad,
+                "fecha_extraccion": nuevo_registro.fecha_extraccion,
+                "fecha_observacion": nuevo_registro.fecha_observacion,
+            })
 
+        _actualizar_clima_actual(db.connection(), filas)
+        actualizar_agregados(db.connection(), filas)
         db.commit()
         logger.info("Datos guardados correctamente en la base de datos")
+        _registrar_rendimiento(len(datos), inicio)
 
     except Exception as e:
         db.rollback()
         logger.error(f"Error guardando en BD: {str(e)}")
 
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+def _resolver_ciudades(conn, datos):
+    # Devuelve {nombre: id}, creando en una sola sentencia las ciudades nuevas
+    paises = {}
+    for item in datos:
+        paises.setdefault(item["ciudad"], item.get("pais"))
+    nombres = list(paises)
+
+    ids = {}
+    for i in range(0, len(nombres), TAMANO_CONSULTA_CIUDADES):
+        bloque = nombres[i:i + TAMANO_CONSULTA_CIUDADES]
+        ids.update(conn.execute(
+            select(Ciudad.nombre, Ciudad.id).where(Ciudad.nombre.in_(bloque))
+        ).all())
+
+    nuevas = [n for n in nombres if n not in ids]
+    if nuevas:
+        # Otro cargador puede crear la misma ciudad a la vez: uq_ciudades_nombre
+        # deja entrar una sola fila y la relectura trae el id que quedó
+        conn.execute(
+            insert_dialecto(conn, Ciudad).on_conflict_do_nothing(index_elements=["nombre"]),
+            [{"nombre": n, "pais": paises[n]} for n in nuevas]
+        )
+        for i in range(0, len(nuevas), TAMANO_CONSULTA_CIUDADES):
+            bloque = nuevas[i:i + TAMANO_CONSULTA_CIUDADES]
+            ids.update(conn.execute(
+                select(Ciudad.nombre, Ciudad.id).where(Ciudad.nombre.in_(bloque))
+            ).all())
+
+    return ids
+
+
+def _a_datetime(valor):
+    if isinstance(valor, str):
+        return datetime.fromisoformat(valor)
+    return valor
+
+
+def _sin_duplicados(filas):
+    # Un mismo INSERT no puede tocar dos veces la misma clave natural en
+    # PostgreSQL (ON CONFLICT DO UPDATE), así que se deja la última lectura
+    unicas = {}
+    for fila in filas:
+        if fila["fecha_observacion"] is None:
+            unicas[id(fila)] = fila
+        else:
+            unicas[(fila["ciudad_id"], fila["fecha_observacion"])] = fila
+    return list(unicas.values())
+
+
+def _extracciones_previas(conn, filas):
+    # (ciudad_id, fecha_extraccion) guardados hoy para las claves naturales
+    # de `filas`: el upsert puede mover esas lecturas a otro día
+    claves = [(f["ciudad_id"], f["fecha_observacion"]) for f in filas]
+    previas = []
+    for i in range(0, len(claves), TAMANO_CONSULTA_CIUDADES):
+        previas += conn.execute(
+            select(RegistroClima.ciudad_id, RegistroClima.fecha_extraccion).where(
+                tuple_(RegistroClima.ciudad_id, RegistroClima.fecha_observacion)
+                .in_(claves[i:i + TAMANO_CONSULTA_CIUDADES])
+            )
+        ).all()
+    return previas
+
+
+class AgregadosPendientes:
+    # Días y ciudades cuyos acumulados quedan por reconstruir: las lecturas
+    # escritas (como rango) más los días de los que salió una lectura
+    # actualizada, para que no conserven su cuenta anterior. Permite juntar
+    # varias cargas (p. ej. los bloques de una reproducción) en una sola
+    # reconstrucción al final.
+    def __init__(self):
+        self.desde = None
+        self.hasta = None
+        self.ciudad_ids = set()
+        self.dias_previos = {}
+
+    def registrar(self, filas, previas=()):
+        if filas:
+            fechas = [f["fecha_extraccion"] for f in filas]
+            desde, hasta = truncar(min(fechas), "dia"), truncar(max(fechas), "dia")
+            self.desde = desde if self.desde is None else min(self.desde, desde)
+            self.hasta = hasta if self.hasta is None else max(self.hasta, hasta)
+            self.ciudad_ids.update(f["ciudad_id"] for f in filas)
+
+        for ciudad_id, fecha in previas:
+            if fecha is not None:
+                self.dias_previos.setdefault(truncar(fecha, "dia"), set()).add(ciudad_id)
+
+    def reconstruir(self, conn):
+        if self.desde is not None:
+            reconstruir_agregados(conn, self.desde, self.hasta, ciudad_ids=list(self.ciudad_ids))
+
+        for dia, ciudad_ids in sorted(self.dias_previos.items()):
+            if self.desde is None or not self.desde <= dia <= self.hasta:
+                reconstruir_agregados(conn, dia, dia, ciudad_ids=list(ciudad_ids))
+
+
+def _sentencia_insercion(conn, modo):
+    if modo == "insertar":
+        return insert(RegistroClima)
+
+    stmt = insert_dialecto(conn, RegistroClima)
+
+    if modo == "ignorar":
+        return stmt.on_conflict_do_nothing(index_elements=CLAVE_NATURAL)
+
+    return stmt.on_conflict_do_update(
+        index_elements=CLAVE_NATURAL,
+        set_={
+            "temperatura": stmt.excluded.temperatura,
+            "humedad": stmt.excluded.humedad,
+            "fecha_extraccion": stmt.excluded.fecha_extraccion,
+        }
+    )
+
+
+def _actualizar_clima_actual(conn, filas):
+    # Solo la lectura más reciente de cada ciudad del lote, y solo si es más
+    # nueva que la guardada en clima_actual
+    ultimas = {}
+    for fila in filas:
+        actual = ultimas.get(fila["ciudad_id"])
+        if not actual or fila["fecha_extraccion"] >= actual["fecha_extraccion"]:
+            ultimas[fila["ciudad_id"]] = fila
+
+    if not ultimas:
+        return
+
+    stmt = insert_dialecto(conn, ClimaActual)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["ciudad_id"],
+        set_={
+            "temperatura": stmt.excluded.temperatura,
+            "humedad": stmt.excluded.humedad,
+            "fecha_extraccion": stmt.excluded.fecha_extraccion,
+            "fecha_observacion": stmt.excluded.fecha_observacion,
+        },
+        where=or_(
+            ClimaActual.fecha_extraccion.is_(None),
+            ClimaActual.fecha_extraccion <= stmt.excluded.fecha_extraccion
+        )
+    )
+    conn.execute(stmt, [
+        {
+            "ciudad_id": fila["ciudad_id"],
+            "temperatura": fila["temperatura"],
+            "humedad": fila["humedad"],
+            "fecha_extraccion": fila["fecha_extraccion"],
+            "fecha_observacion": fila["fecha_observacion"],
+        }
+        for fila in ultimas.values()
+    ])
+
+
+def _refrescar_clima_actual(conn, ciudad_ids):
+    # Relee la última lectura de cada ciudad desde registros_clima, para
+    # cargas que no devuelven las filas insertadas (COPY de insertar_masivo)
+    ciudad_ids = list(ciudad_ids)
+    filas = []
+    for i in range(0, len(ciudad_ids), TAMANO_CONSULTA_CIUDADES):
+        bloque = ciudad_ids[i:i + TAMANO_CONSULTA_CIUDADES]
+        ultima = select(
+            RegistroClima.ciudad_id,
+            func.max(RegistroClima.fecha_extraccion).label("max_fecha")
+        ).where(RegistroClima.ciudad_id.in_(bloque)).group_by(RegistroClima.ciudad_id).subquery()
+
+        filas += conn.execute(
+            select(
+                RegistroClima.ciudad_id,
+                RegistroClima.temperatura,
+                RegistroClima.humedad,
+                RegistroClima.fecha_extraccion,
+                RegistroClima.fecha_observacion,
+            ).join(
+                ultima,
+                (RegistroClima.ciudad_id == ultima.c.ciudad_id) &
+                (RegistroClima.fecha_extraccion == ultima.c.max_fecha)
+            )
+        ).mappings().all()
+
+    _actualizar_clima_actual(conn, filas)
+
+
+def reconstruir_clima_actual(conn):
+    # Recalcula clima_actual desde el histórico completo (migraciones/backfills)
+    ultima = select(
+        RegistroClima.ciudad_id,
+        func.max(RegistroClima.fecha_extraccion).label("max_fecha")
+    ).group_by(RegistroClima.ciudad_id).subquery()
+
+    seleccion = select(
+        RegistroClima.ciudad_id,
+        func.max(RegistroClima.temperatura),
+        func.max(RegistroClima.humedad),
+        RegistroClima.fecha_extraccion,
+        func.max(RegistroClima.fecha_observacion),
+    ).join(
+        ultima,
+        (RegistroClima.ciudad_id == ultima.c.ciudad_id) &
+        (RegistroClima.fecha_extraccion == ultima.c.max_fecha)
+    ).group_by(RegistroClima.ciudad_id, RegistroClima.fecha_extraccion)
+
+    conn.execute(delete(ClimaActual))
+    conn.execute(insert(ClimaActual).from_select(
+        ["ciudad_id", "temperatura", "humedad", "fecha_extraccion", "fecha_observacion"],
+        seleccion
+    ))
+
+
+def _copiar_postgres(conn, filas):
+    # COPY a una tabla temporal y de ahí INSERT ... ON CONFLICT DO NOTHING
+    # (COPY no admite ON CONFLICT)
+    conn.execute(text("""
+        CREATE TEMP TABLE IF NOT EXISTS registros_clima_carga (
+            ciudad_id INTEGER,
+            temperatura DOUBLE PRECISION,
+            humedad INTEGER,
+            fecha_extraccion TIMESTAMP,
+            fecha_observacion TIMESTAMP
+        ) ON COMMIT DELETE ROWS
+    """))
+    conn.execute(text("TRUNCATE registros_clima_carga"))
+
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    for fila in filas:
+        escritor.writerow(["" if fila[c] is None else fila[c] for c in COLUMNAS_COPIA])
+    buffer.seek(0)
+
+    columnas = ", ".join(COLUMNAS_COPIA)
+    cursor = conn.connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY registros_clima_carga ({columnas}) FROM STDIN WITH (FORMAT csv)", buffer
+        )
+    finally:
+        cursor.close()
+
+    return conn.execute(text(
+        f"INSERT INTO registros_clima ({columnas}) "
+        f"SELECT {columnas} FROM registros_clima_carga "
+        f"ON CONFLICT (ciudad_id, fecha_observacion) DO NOTHING"
+    )).rowcount
+
+
+def insertar_masivo(conn, filas):
+    # Carga de volumen (backfills) con la ruta más rápida de cada motor:
+    # COPY en PostgreSQL y executemany por lotes en SQLite. Las filas que ya
+    # existen se ignoran. No toca acumulados ni clima_actual.
+    if not filas:
+        return 0
+
+    if conn.dialect.name == "postgresql":
+        return _copiar_postgres(conn, filas)
+
+    stmt = _sentencia_insercion(conn, "ignorar")
+    insertadas = 0
+    for i in range(0, len(filas), TAMANO_LOTE_INSERCION):
+        insertadas += conn.execute(stmt, filas[i:i + TAMANO_LOTE_INSERCION]).rowcount
+    return insertadas
+
+
+def guardar_datos_en_bd_bulk(datos, modo="ignorar", pendientes=None):
+    # Carga por conjuntos: una consulta para ciudades, un INSERT multi-fila
+    # (executemany) para los registros y todo dentro de una transacción.
+    # Con `pendientes` (AgregadosPendientes) los acumulados no se tocan: se
+    # anota qué reconstruir y quien llama lo hace una vez al terminar.
+    if modo not in MODOS_CARGA:
+        raise ValueError(f"Modo de carga inválido: {modo}")
+
+    # Acepta la lista de dicts de siempre o el DataFrame de transformar_respuestas
+    if isinstance(datos, pd.DataFrame):
+        datos = a_registros(datos)
+
+    if not datos:
+        return 0
+
+    inicio = time.perf_counter()
+
+    try:
+        with engine.begin() as conn:
+            ids = _resolver_ciudades(conn, datos)
+
+            filas = [
+                {
+                    "ciudad_id": ids[item["ciudad"]],
+                    "temperatura": item["temperatura"],
+                    "humedad": item["humedad"],
+                    "fecha_extraccion": _a_datetime(item["fecha_extraccion"]),
+                    # Sin hora de observación se usa la de extracción: la columna es
+                    # clave de partición en PostgreSQL y no admite NULL
+                    "fecha_observacion": (
+                        _a_datetime(item.get("fecha_observacion"))
+                        or _a_datetime(item["fecha_extraccion"])
+                    ),
+                }
+                for item in datos
+            ]
+            if modo != "insertar":
+                filas = _sin_duplicados(filas)
+            stmt = _sentencia_insercion(conn, modo)
+
+            if modo == "actualizar":
+                # Las filas actualizadas ya estaban contadas en los acumulados:
+                # se recalculan los días afectados en lugar de sumarlas otra vez
+                previas = _extracciones_previas(conn, filas)
+                conn.execute(stmt, filas)
+                afectados = pendientes if pendientes is not None else AgregadosPendientes()
+                afectados.registrar(filas, previas)
+                if pendientes is None:
+                    afectados.reconstruir(conn)
+                guardadas = len(filas)
+                escritas = filas
+            else:
+                # RETURNING devuelve solo lo realmente insertado (no los conflictos)
+                insertadas = conn.execute(
+                    stmt.returning(
+                        RegistroClima.ciudad_id,
+                        RegistroClima.temperatura,
+                        RegistroClima.humedad,
+                        RegistroClima.fecha_extraccion,
+                        RegistroClima.fecha_observacion,
+                    ),
+                    filas
+                ).mappings().all()
+                if pendientes is not None:
+                    pendientes.registrar(insertadas)
+                else:
+                    actualizar_agregados(conn, insertadas)
+                guardadas = len(insertadas)
+                # Un duplicado ignorado no debe pisar clima_actual
+                escritas = insertadas
+
+            _actualizar_clima_actual(conn, escritas)
+
+        logger.info(
+            f"Datos guardados correctamente en la base de datos "
+            f"({guardadas} de {len(filas)} registros nuevos)"
+        )
+        _registrar_rendimiento(len(filas), inicio)
+        return guardadas
+
+    except Exception as e:
+        # La transacción ya se revirtió; quien llama registra la ejecución fallida
+        logger.error(f"Error guardando en BD: {str(e)}")
+        raise
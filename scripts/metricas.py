@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# Instrumentación de cada ejecución del ETL: tiempos por etapa, latencias
+# HTTP, reintentos, caché, filas y memoria. Se guarda en metricas_etl y el
+# detalle por petición en metricas_etl_peticiones.
+import logging
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+import numpy as np
+from sqlalchemy import insert
+
+from scripts.database import engine
+from scripts.loader import guardar_datos_en_bd_bulk
+from scripts.models import MetricasETL, MetricaPeticion
+from scripts.pipeline import PipelineETL
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+ETAPAS = ("extraccion", "transformacion", "carga")
+# 1: extracción y carga solapadas en micro-lotes (scripts.pipeline); 0: carga única al final
+USAR_PIPELINE = os.getenv('ETL_PIPELINE', '1') == '1'
+
+
+def memoria_pico_mb():
+    # Pico de memoria residente de toda la vida del proceso (ru_maxrss: KiB
+    # en Linux, bytes en macOS); en procesos largos no dice nada de una
+    # ejecución concreta, solo sirve restando dos lecturas
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return pico / (1024 * 1024) if sys.platform == "darwin" else pico / 1024
+
+
+def memoria_rss_mb():
+    # Memoria residente actual (Linux: /proc/self/statm); None si no se puede leer
+    try:
+        with open("/proc/self/statm") as statm:
+            paginas = int(statm.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return paginas * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+class MedicionETL:
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.tiempos = dict.fromkeys(ETAPAS, 0.0)
+        self.extraidos = self.guardados = self.fallidos = 0
+        self.pico_inicial = memoria_pico_mb()
+
+    @contextmanager
+    def etapa(self, nombre):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.tiempos[nombre] += time.perf_counter() - inicio
+
+    def guardar(self, extractor, estado, extraidos, guardados, fallidos):
+        latencias = extractor.latencias
+        valores = np.array([l["latencia_ms"] for l in latencias], dtype=float)
+        stats = extractor.cache.estadisticas() if extractor.cache else {}
+        total = time.perf_counter() - self.inicio
+        pico = memoria_pico_mb()
+
+        fila = {
+            "estado": estado,
+            "registros_extraidos": extraidos,
+            "registros_guardados": guardados,
+            "registros_fallidos": fallidos,
+            "registros_procesados": extraidos,
+            "tiempo_ejecucion": total,
+            "tiempo_ejecucion_segundos": total,
+            "tiempo_extraccion": self.tiempos["extraccion"],
+            "tiempo_transformacion": self.tiempos["transformacion"],
+            "tiempo_carga": self.tiempos["carga"],
+            "peticiones": len(latencias),
+            "reintentos": sum(l["intentos"] - 1 for l in latencias),
+            "latencia_p50_ms": float(np.percentile(valores, 50)) if valores.size else None,
+            "latencia_p95_ms": float(np.percentile(valores, 95)) if valores.size else None,
+            "latencia_max_ms": float(valores.max()) if valores.size else None,
+            "cache_hits": stats.get("hits"),
+            "cache_misses": stats.get("misses"),
+            "memoria_rss_mb": memoria_rss_mb(),
+            # Cuánto subió esta ejecución el pico del proceso (0 = no lo superó)
+            "memoria_pico_incremento_mb": pico - self.pico_inicial if pico is not None else None,
+        }
+
+        # Las métricas nunca deben tumbar el ETL
+        try:
+            with engine.begin() as conn:
+                ejecucion_id = conn.execute(
+                    insert(MetricasETL).values(**fila).returning(MetricasETL.id)
+                ).scalar_one()
+                if latencias:
+                    conn.execute(insert(MetricaPeticion), [
+                        {"ejecucion_id": ejecucion_id, **l} for l in latencias
+                    ])
+        except Exception as e:
+            logger.error(f"No se pudieron guardar las métricas: {str(e)}")
+
+        logger.info(
+            f"Ejecución {estado}: {extraidos} extraídos, {guardados} guardados, "
+            f"{fallidos} fallidos en {total:.2f}s "
+            f"(extracción {self.tiempos['extraccion']:.2f}s, "
+            f"transformación {self.tiempos['transformacion']:.2f}s, "
+            f"carga {self.tiempos['carga']:.2f}s)"
+        )
+        return fila
+
+
+def _ejecutar_pipeline(extractor, medicion, modo, ciudades):
+    # Las etapas se solapan: "extraccion" es el tiempo total del pipeline y
+    # transformación/carga lo que ocupó el hilo cargador
+    pipeline = PipelineETL(extractor, modo=modo)
+    try:
+        with medicion.etapa("extraccion"):
+            pipeline.ejecutar(ciudades)
+    finally:
+        medicion.tiempos["transformacion"] = pipeline.tiempo_transformacion
+        medicion.tiempos["carga"] = pipeline.tiempo_carga
+        medicion.extraidos = pipeline.extraidos
+        medicion.guardados = pipeline.guardados
+        medicion.fallidos = pipeline.fallidos
+
+
+def _ejecutar_secuencial(extractor, medicion, modo, ciudades):
+    with medicion.etapa("extraccion"):
+        datos = extractor.ejecutar_extraccion(ciudades=ciudades)
+    # La transformación por lotes corre dentro de ejecutar_extraccion
+    medicion.tiempos["transformacion"] = extractor.tiempo_transformacion
+    medicion.tiempos["extraccion"] = max(
+        0.0, medicion.tiempos["extraccion"] - extractor.tiempo_transformacion
+    )
+    medicion.extraidos = len(datos)
+
+    if len(datos):
+        try:
+            with medicion.etapa("carga"):
+                medicion.guardados = guardar_datos_en_bd_bulk(datos, modo=modo)
+        except Exception:
+            medicion.fallidos = len(datos)
+            raise
+        extractor.confirmar_cargadas(extractor.por_confirmar)
+
+
+def ejecutar_etl(extractor, modo="ignorar", ciudades=None, pipeline=None):
+    # Extracción + carga instrumentadas; devuelve el número de filas guardadas
+    medicion = MedicionETL()
+    consultadas = len(ciudades if ciudades is not None else extractor.ciudades)
+    pipeline = USAR_PIPELINE if pipeline is None else pipeline
+    estado = "ok"
+
+    try:
+        ejecutar = _ejecutar_pipeline if pipeline else _ejecutar_secuencial
+        ejecutar(extractor, medicion, modo, ciudades)
+    except Exception:
+        estado = "error"
+        raise
+    finally:
+        # Un micro-lote que no se pudo guardar también marca la ejecución
+        if medicion.fallidos:
+            estado = "error"
+        # Sin datos ni "sin cambios": la ciudad falló en la API
+        sin_respuesta = consultadas - medicion.extraidos - len(extractor.ciudades_sin_cambios())
+        medicion.guardar(
+            extractor, estado, medicion.extraidos, medicion.guardados,
+            medicion.fallidos + max(0, sin_respuesta)
+        )
+
+    return medicion.guardados
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+from sqlalchemy import inspect, text, select, func, delete, update, exists
+from sqlalchemy.orm import aliased
+from scripts.database import engine, Base
+from scripts import models  # IMPORTANTE: carga los modelos
+from scripts.models import Ciudad, ClimaActual, RegistroClima, AgregadoDiario
+from scripts.loader import reconstruir_clima_actual
+from scripts.agregados import reconstruir_agregados, trasladar_agregados
+from scripts.particiones import asegurar_particiones
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _agregar_columnas_faltantes(conn, tabla):
+    existentes = {c["name"] for c in inspect(conn).get_columns(tabla.name)}
+
+    for columna in tabla.columns:
+        if columna.name in existentes:
+            continue
+
+        tipo = columna.type.compile(dialect=conn.dialect)
+        conn.execute(text(
+            f"ALTER TABLE {tabla.name} ADD COLUMN {columna.name} {tipo}"
+        ))
+        logger.info(f"Columna agregada: {tabla.name}.{columna.name}")
+
+
+def _fusionar_ciudades_repetidas(conn):
+    # Antes del índice único sobre ciudades.nombre: cada nombre repetido se
+    # queda con su id más bajo. Sus lecturas pasan a ese id (descartando las
+    # que ya tiene con la misma observación) y clima_actual y acumulados se
+    # recalculan. Los Parquet archivados conservan el id viejo, pero se leen
+    # por nombre.
+    repetidas = conn.execute(
+        select(Ciudad.nombre, func.min(Ciudad.id))
+        .group_by(Ciudad.nombre)
+        .having(func.count() > 1)
+    ).all()
+    if not repetidas:
+        return
+
+    otra = aliased(RegistroClima)
+    canonicos = []
+    for nombre, canonico in repetidas:
+        sobrantes = list(conn.execute(
+            select(Ciudad.id).where(Ciudad.nombre == nombre, Ciudad.id != canonico)
+        ).scalars())
+
+        conn.execute(delete(RegistroClima).where(
+            RegistroClima.ciudad_id.in_(sobrantes),
+            exists().where(
+                otra.ciudad_id == canonico,
+                otra.fecha_observacion == RegistroClima.fecha_observacion
+            )
+        ))
+        conn.execute(
+            update(RegistroClima)
+            .where(RegistroClima.ciudad_id.in_(sobrantes))
+            .values(ciudad_id=canonico)
+        )
+        conn.execute(delete(ClimaActual).where(ClimaActual.ciudad_id.in_(sobrantes)))
+        trasladar_agregados(conn, sobrantes, canonico)
+        conn.execute(delete(Ciudad).where(Ciudad.id.in_(sobrantes)))
+        canonicos.append(canonico)
+        logger.info(f"Ciudad repetida fusionada: {nombre} ({len(sobrantes)} filas de más)")
+
+    reconstruir_clima_actual(conn)
+    # Las lecturas repetidas descartadas estaban sumadas dos veces
+    reconstruir_agregados(conn, ciudad_ids=canonicos)
+
+
+def aplicar_migraciones(bind=engine):
+    # create_all solo crea tablas nuevas: las columnas e índices agregados a
+    # tablas existentes se crean aquí de forma idempotente
+    Base.metadata.create_all(bind=bind)
+
+    with bind.begin() as conn:
+        for tabla in Base.metadata.sorted_tables:
+            _agregar_columnas_faltantes(conn, tabla)
+
+        # Requisito de uq_ciudades_nombre
+        _fusionar_ciudades_repetidas(conn)
+
+        for tabla in Base.metadata.sorted_tables:
+            for indice in tabla.indexes:
+                indice.create(bind=conn, checkfirst=True)
+
+        # PostgreSQL particionado: particiones de los próximos meses
+        asegurar_particiones(conn)
+
+        # Poblar clima_actual la primera vez sobre una base con histórico
+        vacia = not conn.execute(select(func.count()).select_from(ClimaActual)).scalar()
+        if vacia and conn.execute(select(func.count(RegistroClima.id))).scalar():
+            reconstruir_clima_actual(conn)
+            logger.info("clima_actual reconstruida desde registros_clima")
+
+        # Igual con los acumulados horarios/diarios
+        vacia = not conn.execute(select(func.count()).select_from(AgregadoDiario)).scalar()
+        if vacia and conn.execute(select(func.count(RegistroClima.id))).scalar():
+            reconstruir_agregados(conn)
+
+
+if __name__ == "__main__":
+    aplicar_migraciones()
+    print("Migraciones aplicadas correctamente")
@@ -1,5 +1,5 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, ForeignKey, Index
+from sqlalchemy.orm import relationship, declared_attr
 from datetime import datetime
 from scripts.database import Base
 
@@ -11,6 +11,12 @@ class Ciudad(Base):
     nombre = Column(String, nullable=False)
     pais = Column(String)
 
+    __table_args__ = (
+        # Varios cargadores a la vez (pipeline, trabajadores) no pueden
+        # crear dos filas para la misma ciudad
+        Index("uq_ciudades_nombre", "nombre", unique=True),
+    )
+
 
 class RegistroClima(Base):
     __tablename__ = "registros_clima"
@@ -20,14 +26,180 @@ class RegistroClima(Base):
     temperatura = Column(Float)
     humedad = Column(Integer)
     fecha_extraccion = Column(DateTime, default=datetime.utcnow)
+    # Hora real de la observación de la estación (UTC): clave natural junto a ciudad_id
+    fecha_observacion = Column(DateTime)
+
+    ciudad = relationship("Ciudad")
+
+    __table_args__ = (
+        Index(
+            "uq_registros_clima_ciudad_observacion",
+            "ciudad_id",
+            "fecha_observacion",
+            unique=True
+        ),
+        Index("ix_registros_clima_ciudad_fecha", "ciudad_id", "fecha_extraccion"),
+        Index("ix_registros_clima_fecha", "fecha_extraccion"),
+    )
+
+
+class ClimaActual(Base):
+    # Última lectura de cada ciudad, mantenida por el loader en la misma
+    # transacción que el insert en registros_clima
+    __tablename__ = "clima_actual"
+
+    ciudad_id = Column(Integer, ForeignKey("ciudades.id"), primary_key=True)
+    temperatura = Column(Float)
+    humedad = Column(Integer)
+    fecha_extraccion = Column(DateTime)
+    fecha_observacion = Column(DateTime)
 
     ciudad = relationship("Ciudad")
 
 
+class AgregadoMixin:
+    # Acumulados por ciudad y periodo: con n, suma, min, max y suma de
+    # cuadrados se obtienen media y desviación estándar sin leer datos crudos
+    @declared_attr
+    def ciudad_id(cls):
+        return Column(Integer, ForeignKey("ciudades.id"), primary_key=True)
+
+    periodo = Column(DateTime, primary_key=True)
+    registros = Column(Integer, nullable=False, default=0)
+
+    temperatura_n = Column(Integer, nullable=False, default=0)
+    temperatura_suma = Column(Float, nullable=False, default=0)
+    temperatura_min = Column(Float)
+    temperatura_max = Column(Float)
+    temperatura_suma_cuadrados = Column(Float, nullable=False, default=0)
+
+    humedad_n = Column(Integer, nullable=False, default=0)
+    humedad_suma = Column(Float, nullable=False, default=0)
+    humedad_min = Column(Float)
+    humedad_max = Column(Float)
+    humedad_suma_cuadrados = Column(Float, nullable=False, default=0)
+
+
+class AgregadoHorario(AgregadoMixin, Base):
+    __tablename__ = "agregados_horarios"
+
+
+class AgregadoDiario(AgregadoMixin, Base):
+    __tablename__ = "agregados_diarios"
+
+
+class ParticionArchivada(Base):
+    # Meses de registros_clima movidos a Parquet por el job de retención
+    __tablename__ = "particiones_archivadas"
+
+    id = Column(Integer, primary_key=True, index=True)
+    mes = Column(DateTime, nullable=False, unique=True)
+    ruta = Column(String, nullable=False)
+    registros = Column(Integer)
+    fecha_archivado = Column(DateTime, default=datetime.utcnow)
+
+
+class BackfillProgreso(Base):
+    # Checkpoint del backfill histórico: un día completado por ciudad
+    __tablename__ = "backfill_progreso"
+
+    id = Column(Integer, primary_key=True, index=True)
+    ciudad = Column(String, nullable=False)
+    fecha = Column(DateTime, nullable=False)
+    registros = Column(Integer)
+    fecha_completado = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("uq_backfill_progreso_ciudad_fecha", "ciudad", "fecha", unique=True),
+    )
+
+
+class CiudadTrabajo(Base):
+    # Cola de trabajo del modo multi-proceso: cada trabajador reclama un lote
+    # de ciudades vencidas con una concesión que caduca en concesion_hasta
+    __tablename__ = "ciudades_trabajo"
+
+    id = Column(Integer, primary_key=True, index=True)
+    ciudad = Column(String, nullable=False, unique=True)
+    proxima_ejecucion = Column(DateTime, nullable=False, default=datetime.utcnow)
+    intervalo = Column(Float)
+    trabajador = Column(String)
+    concesion_hasta = Column(DateTime)
+    ultima_ejecucion = Column(DateTime)
+
+    __table_args__ = (
+        Index("ix_ciudades_trabajo_pendientes", "proxima_ejecucion", "concesion_hasta"),
+    )
+
+
+class UsoClaveAPI(Base):
+    # Peticiones del mes por API key. La clave se guarda como huella
+    # (sha256 truncado), nunca en claro. Varios procesos suman sobre la misma fila
+    __tablename__ = "claves_api_uso"
+
+    id = Column(Integer, primary_key=True, index=True)
+    huella = Column(String, nullable=False)
+    mes = Column(DateTime, nullable=False)
+    peticiones = Column(Integer, nullable=False, default=0)
+    cuota = Column(Integer)
+    agotada = Column(Boolean, nullable=False, default=False)
+    ultimo_error = Column(String)
+    fecha_actualizacion = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("uq_claves_api_uso_huella_mes", "huella", "mes", unique=True),
+    )
+
+
 class MetricasETL(Base):
     __tablename__ = "metricas_etl"
 
     id = Column(Integer, primary_key=True, index=True)
     registros_procesados = Column(Integer)
     tiempo_ejecucion = Column(Float)
-    fecha_ejecucion = Column(DateTime, default=datetime.utcnow)
\ No newline at end of file
+    fecha_ejecucion = Column(DateTime, default=datetime.utcnow)
+
+    # "ok" o "error"
+    estado = Column(String)
+    registros_extraidos = Column(Integer)
+    registros_guardados = Column(Integer)
+    registros_fallidos = Column(Integer)
+
+    # Tiempos en segundos: total y por etapa
+    tiempo_ejecucion_segundos = Column(Float)
+    tiempo_extraccion = Column(Float)
+    tiempo_transformacion = Column(Float)
+    tiempo_carga = Column(Float)
+
+    # Peticiones HTTP de la ejecución
+    peticiones = Column(Integer)
+    reintentos = Column(Integer)
+    latencia_p50_ms = Column(Float)
+    latencia_p95_ms = Column(Float)
+    latencia_max_ms = Column(Float)
+    cache_hits = Column(Integer)
+    cache_misses = Column(Integer)
+
+    # RSS al terminar y cuánto subió la ejecución el pico del proceso
+    # (ru_maxrss es de toda la vida del proceso: planificador/trabajador)
+    memoria_rss_mb = Column(Float)
+    memoria_pico_incremento_mb = Column(Float)
+
+    peticiones_detalle = relationship("MetricaPeticion", back_populates="ejecucion")
+
+
+class MetricaPeticion(Base):
+    # Una fila por llamada a la API (ciudad o lote ';') de cada ejecución
+    __tablename__ = "metricas_etl_peticiones"
+
+    id = Column(Integer, primary_key=True, index=True)
+    ejecucion_id = Column(Integer, ForeignKey("metricas_etl.id"), nullable=False, index=True)
+    ciudad = Column(String)
+    # Tiempo en HTTP (todos los intentos) y el resto: límite por segundo,
+    # espera de clave y backoff
+    latencia_ms = Column(Float)
+    espera_ms = Column(Float)
+    intentos = Column(Integer)
+    ok = Column(Boolean)
+
+    ejecucion = relationship("MetricasETL", back_populates="peticiones_detalle")
\ No newline at end of file
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+import math
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import select, func, cast, BigInteger
+
+from scripts.models import Ciudad, RegistroClima
+
+# Cubetas SQL por punto final: la agregación en la base deja unas
+# PUNTOS * FACTOR_CUBETAS filas por serie y LTTB elige las definitivas
+FACTOR_CUBETAS = 4
+
+
+def lttb(x, y, umbral):
+    # Largest-Triangle-Three-Buckets: devuelve los índices de `umbral` puntos
+    # que conservan la forma visual de la serie (picos y valles incluidos)
+    n = len(x)
+    if umbral >= n or umbral < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+
+    cada = (n - 2) / (umbral - 2)
+    indices = np.empty(umbral, dtype=np.int64)
+    indices[0] = 0
+    a = 0
+
+    for i in range(umbral - 2):
+        # Promedio de la cubeta siguiente (la última es el punto final)
+        prom_inicio = int(math.floor((i + 1) * cada)) + 1
+        prom_fin = min(int(math.floor((i + 2) * cada)) + 1, n)
+        prom_x = x[prom_inicio:prom_fin].mean()
+        prom_y = y[prom_inicio:prom_fin].mean()
+
+        inicio = int(math.floor(i * cada)) + 1
+        fin = int(math.floor((i + 1) * cada)) + 1
+
+        areas = np.abs(
+            (x[a] - prom_x) * (y[inicio:fin] - y[a])
+            - (x[a] - x[inicio:fin]) * (prom_y - y[a])
+        )
+        a = inicio + int(np.argmax(areas))
+        indices[i + 1] = a
+
+    indices[-1] = n - 1
+    return indices
+
+
+def _epoch_sql(columna, dialecto):
+    # Segundos enteros en ambos motores, para que // sea división entera
+    if dialecto == "postgresql":
+        return cast(func.extract("epoch", columna), BigInteger)
+    return cast(func.strftime("%s", columna), BigInteger)
+
+
+def serie_submuestreada(conn, metrica="temperatura", ciudades=None, desde=None,
+                        hasta=None, puntos_max=500, temp_min=None, temp_max=None,
+                        archivado=None):
+    # 1) media por cubeta de tiempo y ciudad en SQL, 2) LTTB por ciudad hasta
+    # `puntos_max` puntos. Devuelve Ciudad, Fecha y la métrica pedida.
+    # `archivado`: filas crudas que ya no están en la base (Ciudad, Fecha y la
+    # métrica, ya filtradas, como las de leer_archivo); se agrupan en pandas
+    # con las mismas cubetas.
+    valor = getattr(RegistroClima, metrica)
+    nombre = metrica.capitalize()
+
+    filtros = [valor.is_not(None), RegistroClima.fecha_extraccion.is_not(None)]
+    if ciudades is not None:
+        filtros.append(Ciudad.nombre.in_(ciudades))
+    if desde is not None:
+        filtros.append(RegistroClima.fecha_extraccion >= desde)
+    if hasta is not None:
+        filtros.append(RegistroClima.fecha_extraccion <= hasta)
+    if temp_min is not None:
+        filtros.append(RegistroClima.temperatura >= temp_min)
+    if temp_max is not None:
+        filtros.append(RegistroClima.temperatura <= temp_max)
+
+    epoch = _epoch_sql(RegistroClima.fecha_extraccion, conn.dialect.name)
+
+    inicio, fin = conn.execute(
+        select(func.min(epoch), func.max(epoch))
+        .join(Ciudad, Ciudad.id == RegistroClima.ciudad_id)
+        .where(*filtros)
+    ).one()
+
+    extra = None
+    if archivado is not None and not archivado.empty:
+        extra = archivado.dropna(subset=[nombre, "Fecha"])
+        extra = pd.DataFrame({
+            "Ciudad": extra["Ciudad"].astype(object),
+            "epoch": (pd.to_datetime(extra["Fecha"]) - pd.Timestamp(0)) // pd.Timedelta(seconds=1),
+            nombre: extra[nombre].astype(float),
+        })
+        if not extra.empty:
+            extremos = [e for e in (inicio, fin) if e is not None]
+            inicio = min([extra["epoch"].min(), *extremos])
+            fin = max([extra["epoch"].max(), *extremos])
+
+    if inicio is None:
+        return pd.DataFrame(columns=["Ciudad", "Fecha", nombre])
+
+    ancho = max(1, int((float(fin) - float(inicio)) / (puntos_max * FACTOR_CUBETAS)) + 1)
+    # División entera de enteros: no depende de floor(), que SQLite no
+    # siempre trae compilado
+    cubeta = epoch // ancho
+
+    filas = conn.execute(
+        select(
+            Ciudad.nombre,
+            func.avg(epoch),
+            func.avg(valor),
+        )
+        .join(Ciudad, Ciudad.id == RegistroClima.ciudad_id)
+        .where(*filtros)
+        .group_by(Ciudad.nombre, cubeta)
+        .order_by(Ciudad.nombre, cubeta)
+    ).all()
+
+    df = pd.DataFrame(filas, columns=["Ciudad", "epoch", nombre])
+    df["epoch"] = df["epoch"].astype(float)
+    df[nombre] = df[nombre].astype(float)
+
+    if extra is not None and not extra.empty:
+        # Los meses archivados son anteriores a la tabla caliente
+        cubetas = (
+            extra.groupby(["Ciudad", extra["epoch"] // ancho], sort=True)[["epoch", nombre]]
+            .mean()
+            .reset_index(level=0)
+        )
+        df = pd.concat([cubetas.astype({"epoch": float}), df], ignore_index=True)
+        df = df.sort_values(["Ciudad", "epoch"], kind="stable", ignore_index=True)
+
+    partes = []
+    for ciudad, grupo in df.groupby("Ciudad", sort=False):
+        indices = lttb(grupo["epoch"].to_numpy(), grupo[nombre].to_numpy(), puntos_max)
+        partes.append(grupo.iloc[indices])
+
+    resultado = pd.concat(partes, ignore_index=True)
+    resultado["Fecha"] = pd.to_datetime(resultado["epoch"], unit="s")
+    return resultado[["Ciudad", "Fecha", nombre]]
@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+# Particionado mensual y archivo en Parquet de registros_clima.
+#
+# PostgreSQL: registros_clima se convierte en tabla con particiones
+# declarativas por mes (RANGE sobre fecha_observacion, que forma parte de la
+# clave natural y por eso puede ir en los índices únicos).
+# SQLite: no hay particiones nativas; la tabla caliente se mantiene y los meses
+# fríos se mueven a un Parquet por mes. En ambos casos el catálogo
+# particiones_archivadas indica qué meses viven fuera de la base.
+import argparse
+import logging
+import os
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import select, delete, func, insert, text, update
+
+from scripts.database import engine
+from scripts.models import Ciudad, RegistroClima, ParticionArchivada
+
+logger = logging.getLogger(__name__)
+
+DIRECTORIO_ARCHIVO = os.getenv("DIRECTORIO_ARCHIVO", "archivo/registros_clima")
+MESES_RETENCION = int(os.getenv("MESES_RETENCION", "12"))
+TAMANO_BLOQUE = 100_000
+
+# Clave de partición/archivo (los registros antiguos pueden no tener observación)
+FECHA_PARTICION = func.coalesce(RegistroClima.fecha_observacion, RegistroClima.fecha_extraccion)
+
+
+def inicio_mes(fecha):
+    return datetime(fecha.year, fecha.month, 1)
+
+
+def sumar_meses(mes, n):
+    indice = mes.year * 12 + mes.month - 1 + n
+    return datetime(indice // 12, indice % 12 + 1, 1)
+
+
+def _nombre_particion(mes):
+    return f"registros_clima_p{mes:%Y%m}"
+
+
+# ---------------------------------------------------
+# PostgreSQL: particiones declarativas
+# ---------------------------------------------------
+def esta_particionada(conn):
+    if conn.dialect.name != "postgresql":
+        return False
+
+    return bool(conn.execute(text("""
+        SELECT 1 FROM pg_partitioned_table p
+        JOIN pg_class c ON c.oid = p.partrelid
+        WHERE c.relname = 'registros_clima'
+    """)).scalar())
+
+
+def crear_particion(conn, mes):
+    nombre = _nombre_particion(mes)
+    conn.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {nombre} PARTITION OF registros_clima "
+        f"FOR VALUES FROM ('{mes:%Y-%m-%d}') TO ('{sumar_meses(mes, 1):%Y-%m-%d}')"
+    ))
+
+
+def asegurar_particiones(conn, meses_adelante=3):
+    # Crea las particiones del mes actual y los siguientes antes de que lleguen
+    # datos (así nada cae en la partición DEFAULT)
+    if not esta_particionada(conn):
+        return
+
+    actual = inicio_mes(datetime.utcnow())
+    for n in range(-1, meses_adelante + 1):
+        crear_particion(conn, sumar_meses(actual, n))
+
+
+def convertir_a_particionada(conn, meses_adelante=3):
+    if conn.dialect.name != "postgresql":
+        raise ValueError("El particionado declarativo solo está disponible en PostgreSQL")
+    if esta_particionada(conn):
+        logger.info("registros_clima ya está particionada")
+        return
+
+    conn.execute(text("ALTER TABLE registros_clima RENAME TO registros_clima_legacy"))
+    conn.execute(text(
+        "UPDATE registros_clima_legacy SET fecha_observacion = fecha_extraccion "
+        "WHERE fecha_observacion IS NULL"
+    ))
+
+    # La PK debe incluir la clave de partición
+    conn.execute(text("""
+        CREATE TABLE registros_clima (
+            id INTEGER NOT NULL DEFAULT nextval('registros_clima_id_seq'),
+            ciudad_id INTEGER REFERENCES ciudades (id),
+            temperatura DOUBLE PRECISION,
+            humedad INTEGER,
+            fecha_extraccion TIMESTAMP WITHOUT TIME ZONE,
+            fecha_observacion TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            PRIMARY KEY (id, fecha_observacion)
+        ) PARTITION BY RANGE (fecha_observacion)
+    """))
+    conn.execute(text(
+        "CREATE TABLE registros_clima_default PARTITION OF registros_clima DEFAULT"
+    ))
+
+    primero, ultimo = conn.execute(text(
+        "SELECT min(fecha_observacion), max(fecha_observacion) FROM registros_clima_legacy"
+    )).one()
+    mes = inicio_mes(primero or datetime.utcnow())
+    fin = sumar_meses(inicio_mes(max(ultimo or datetime.utcnow(), datetime.utcnow())), meses_adelante)
+    while mes <= fin:
+        crear_particion(conn, mes)
+        mes = sumar_meses(mes, 1)
+
+    conn.execute(text("""
+        INSERT INTO registros_clima
+            (id, ciudad_id, temperatura, humedad, fecha_extraccion, fecha_observacion)
+        SELECT id, ciudad_id, temperatura, humedad, fecha_extraccion, fecha_observacion
+        FROM registros_clima_legacy
+    """))
+
+    # La secuencia pertenecía a la tabla vieja: se traspasa antes de borrarla
+    conn.execute(text("ALTER SEQUENCE registros_clima_id_seq OWNED BY registros_clima.id"))
+    conn.execute(text("DROP TABLE registros_clima_legacy"))
+
+    for indice in RegistroClima.__table__.indexes:
+        if indice.name != "ix_registros_clima_id":
+            indice.create(bind=conn, checkfirst=True)
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_registros_clima_id ON registros_clima (id)"))
+
+    logger.info("registros_clima convertida a tabla particionada por mes")
+
+
+# ---------------------------------------------------
+# Retención: meses fríos -> Parquet
+# ---------------------------------------------------
+def _escribir_parquet(conn, desde, hasta, ruta, previo=None):
+    # `previo`: Parquet ya archivado del mes. Se copia primero y se descartan
+    # las filas de la base cuya clave natural ya estaba archivada.
+    # Devuelve (filas tomadas de la base, filas del archivo)
+    consulta = select(
+        RegistroClima.id,
+        RegistroClima.ciudad_id,
+        Ciudad.nombre.label("ciudad"),
+        RegistroClima.temperatura,
+        RegistroClima.humedad,
+        RegistroClima.fecha_extraccion,
+        RegistroClima.fecha_observacion,
+    ).join(Ciudad, Ciudad.id == RegistroClima.ciudad_id).where(
+        FECHA_PARTICION >= desde,
+        FECHA_PARTICION < hasta
+    ).order_by(RegistroClima.fecha_extraccion)
+
+    escritor = None
+    claves = None
+    filas = total = 0
+
+    try:
+        if previo is not None:
+            archivo = pq.ParquetFile(previo)
+            escritor = pq.ParquetWriter(ruta, archivo.schema_arrow, compression="zstd")
+            for lote in archivo.iter_batches(batch_size=TAMANO_BLOQUE):
+                escritor.write_batch(lote)
+                total += lote.num_rows
+            claves = pd.MultiIndex.from_frame(
+                pq.read_table(previo, columns=["ciudad_id", "fecha_observacion"]).to_pandas()
+            )
+
+        resultado = conn.execution_options(stream_results=True, yield_per=TAMANO_BLOQUE).execute(consulta)
+        columnas = list(resultado.keys())
+        for bloque in resultado.partitions():
+            df = pd.DataFrame.from_records(bloque, columns=columnas)
+            df["temperatura"] = df["temperatura"].astype("float32")
+            df["humedad"] = df["humedad"].astype("Int16")
+            df["fecha_extraccion"] = pd.to_datetime(df["fecha_extraccion"])
+            df["fecha_observacion"] = pd.to_datetime(df["fecha_observacion"])
+            filas += len(df)
+            if claves is not None:
+                df = df[~pd.MultiIndex.from_frame(df[["ciudad_id", "fecha_observacion"]]).isin(claves)]
+
+            tabla = pa.Table.from_pandas(df, preserve_index=False)
+            if escritor is None:
+                escritor = pq.ParquetWriter(ruta, tabla.schema, compression="zstd")
+            else:
+                tabla = tabla.cast(escritor.schema)
+            escritor.write_table(tabla)
+            total += len(df)
+    finally:
+        if escritor is not None:
+            escritor.close()
+
+    return filas, total
+
+
+def archivar_mes(conn, mes, directorio=DIRECTORIO_ARCHIVO):
+    # Un mes ya archivado puede recibir filas después (backfill, reproducción
+    # del archivo crudo): se reescribe su Parquet con ellas al final
+    from scripts.agregados import reconstruir_agregados
+
+    siguiente = sumar_meses(mes, 1)
+    previa = conn.execute(
+        select(ParticionArchivada.ruta).where(ParticionArchivada.mes == mes)
+    ).scalar()
+
+    if previa is None:
+        os.makedirs(directorio, exist_ok=True)
+        ruta = os.path.join(directorio, f"{mes:%Y-%m}.parquet")
+        destino = ruta
+    else:
+        ruta = previa
+        destino = f"{ruta}.tmp"
+
+    try:
+        filas, total = _escribir_parquet(
+            conn, mes, siguiente, destino,
+            previo=ruta if previa is not None and os.path.exists(ruta) else None
+        )
+
+        particion = _nombre_particion(mes)
+        if esta_particionada(conn) and conn.execute(
+            text("SELECT to_regclass(:nombre)"), {"nombre": particion}
+        ).scalar():
+            conn.execute(text(f"ALTER TABLE registros_clima DETACH PARTITION {particion}"))
+            conn.execute(text(f"DROP TABLE {particion}"))
+        else:
+            # En PostgreSQL las filas que llegan tras archivar caen en la DEFAULT
+            conn.execute(delete(RegistroClima).where(
+                FECHA_PARTICION >= mes,
+                FECHA_PARTICION < siguiente
+            ))
+
+        if previa is None:
+            conn.execute(insert(ParticionArchivada).values(
+                mes=mes, ruta=ruta, registros=total, fecha_archivado=datetime.utcnow()
+            ))
+        else:
+            conn.execute(update(ParticionArchivada).where(ParticionArchivada.mes == mes).values(
+                registros=total, fecha_archivado=datetime.utcnow()
+            ))
+            if os.path.exists(destino):
+                os.replace(destino, ruta)
+            # Las filas descartadas por repetidas se habían sumado a los acumulados
+            reconstruir_agregados(conn, mes, siguiente - timedelta(days=1))
+    except Exception:
+        if destino != ruta and os.path.exists(destino):
+            os.remove(destino)
+        raise
+
+    logger.info(f"Mes {mes:%Y-%m} archivado en {ruta} ({filas} registros)")
+    return filas
+
+
+def archivar(meses_retencion=MESES_RETENCION, directorio=DIRECTORIO_ARCHIVO):
+    # Mueve a Parquet cada mes anterior a la ventana de retención que tenga
+    # filas en la base (también los ya archivados que recibieron filas
+    # nuevas); cada mes es una transacción (si algo falla, queda intacto)
+    limite = sumar_meses(inicio_mes(datetime.utcnow()), -meses_retencion)
+
+    with engine.connect() as conn:
+        primero = conn.execute(select(func.min(FECHA_PARTICION))).scalar()
+
+    if primero is None:
+        return 0
+
+    total = 0
+    mes = inicio_mes(primero)
+    while mes < limite:
+        with engine.begin() as conn:
+            ya_archivado = conn.execute(
+                select(ParticionArchivada.id).where(ParticionArchivada.mes == mes)
+            ).scalar()
+            pendientes = ya_archivado and conn.execute(
+                select(func.count()).select_from(RegistroClima).where(
+                    FECHA_PARTICION >= mes,
+                    FECHA_PARTICION < sumar_meses(mes, 1)
+                )
+            ).scalar()
+            if not ya_archivado or pendientes:
+                total += archivar_mes(conn, mes, directorio)
+        mes = sumar_meses(mes, 1)
+
+    return total
+
+
+# ---------------------------------------------------
+# Lectura transparente: base caliente + Parquet archivado
+# ---------------------------------------------------
+def meses_archivados(conn):
+    # [(inicio, fin, ruta)] de cada mes movido a Parquet
+    return [
+        (mes, sumar_meses(mes, 1), ruta)
+        for mes, ruta in conn.execute(
+            select(ParticionArchivada.mes, ParticionArchivada.ruta).order_by(ParticionArchivada.mes)
+        )
+    ]
+
+
+def rutas_archivadas(conn, desde=None, hasta=None):
+    # Parquet de los meses archivados que se solapan con el rango, en orden
+    consulta = select(ParticionArchivada.ruta).order_by(ParticionArchivada.mes)
+    # Holgura de un día: el mes se define por observación, el filtro por extracción
+    if desde is not None:
+        consulta = consulta.where(
+            ParticionArchivada.mes >= inicio_mes(desde - timedelta(days=1))
+        )
+    if hasta is not None:
+        consulta = consulta.where(ParticionArchivada.mes <= hasta + timedelta(days=1))
+
+    return [ruta for ruta in conn.execute(consulta).scalars() if os.path.exists(ruta)]
+
+
+def leer_archivo(conn, desde=None, hasta=None, ciudades=None):
+    # Registros archivados (Ciudad, Temperatura, Humedad, Fecha) que caen en el
+    # rango; solo se abren los Parquet de los meses que se solapan
+    rutas = rutas_archivadas(conn, desde, hasta)
+    if not rutas:
+        return pd.DataFrame(columns=["Ciudad", "Temperatura", "Humedad", "Fecha"])
+
+    filtros = []
+    if desde is not None:
+        filtros.append(("fecha_extraccion", ">=", pd.Timestamp(desde)))
+    if hasta is not None:
+        filtros.append(("fecha_extraccion", "<=", pd.Timestamp(hasta)))
+    if ciudades is not None:
+        filtros.append(("ciudad", "in", list(ciudades)))
+
+    partes = [
+        pd.read_parquet(
+            ruta,
+            columns=["ciudad", "temperatura", "humedad", "fecha_extraccion"],
+            filters=filtros or None
+        )
+        for ruta in rutas
+    ]
+    df = pd.concat(partes, ignore_index=True)
+    return df.rename(columns={
+        "ciudad": "Ciudad",
+        "temperatura": "Temperatura",
+        "humedad": "Humedad",
+        "fecha_extraccion": "Fecha",
+    })
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Particionado y archivo de registros_clima")
+    parser.add_argument("accion", choices=["convertir", "asegurar", "archivar"])
+    parser.add_argument("--meses-retencion", type=int, default=MESES_RETENCION)
+    parser.add_argument("--meses-adelante", type=int, default=3)
+    parser.add_argument("--directorio", default=DIRECTORIO_ARCHIVO)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    if args.accion == "convertir":
+        with engine.begin() as conn:
+            convertir_a_particionada(conn, args.meses_adelante)
+    elif args.accion == "asegurar":
+        with engine.begin() as conn:
+            asegurar_particiones(conn, args.meses_adelante)
+    else:
+        print(f"{archivar(args.meses_retencion, args.directorio)} registros archivados")
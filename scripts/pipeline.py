@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# Extracción y carga en paralelo: los hilos de extracción dejan cada
+# respuesta en una cola acotada y un hilo cargador la vacía en micro-lotes
+# (por tamaño o por tiempo), cada uno en su propia transacción.
+#
+# Si la cola se llena los productores esperan (backpressure): la memoria
+# queda acotada por CAPACIDAD_COLA sin importar cuántas ciudades haya, y un
+# fallo tardío solo pierde el micro-lote en curso.
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from scripts.loader import guardar_datos_en_bd_bulk
+from scripts.transformador import transformar_respuestas
+
+logger = logging.getLogger(__name__)
+
+CAPACIDAD_COLA = int(os.getenv('PIPELINE_CAPACIDAD_COLA', '1000'))
+TAMANO_MICRO_LOTE = int(os.getenv('PIPELINE_TAMANO_LOTE', '200'))
+# Segundos máximos que una respuesta espera en el cargador antes de guardarse
+MAX_ESPERA_LOTE = float(os.getenv('PIPELINE_MAX_ESPERA', '2'))
+
+_FIN = object()
+
+
+class PipelineETL:
+    def __init__(self, extractor, modo="ignorar", capacidad=CAPACIDAD_COLA,
+                 tamano_lote=TAMANO_MICRO_LOTE, max_espera=MAX_ESPERA_LOTE):
+        self.extractor = extractor
+        self.modo = modo
+        self.cola = queue.Queue(maxsize=max(1, capacidad))
+        self.tamano_lote = max(1, tamano_lote)
+        self.max_espera = max_espera
+
+        self.extraidos = 0
+        self.guardados = 0
+        self.fallidos = 0
+        self.lotes = 0
+        self.tiempo_transformacion = 0.0
+        self.tiempo_carga = 0.0
+        self._error = None
+
+    # ---------------------------------------------------
+    # Productores
+    # ---------------------------------------------------
+    def _producir(self, lote):
+        for par in self.extractor.extraer_nuevas(lote):
+            # put() bloquea si la cola está llena
+            self.cola.put(par)
+
+    # ---------------------------------------------------
+    # Consumidor
+    # ---------------------------------------------------
+    def _guardar(self, pendientes):
+        # Nunca propaga: si el cargador muere los productores quedan
+        # bloqueados en put() con la cola llena
+        datos = []
+        try:
+            inicio = time.perf_counter()
+            datos = transformar_respuestas([respuesta for _, respuesta in pendientes])
+            self.tiempo_transformacion += time.perf_counter() - inicio
+            self.extraidos += len(datos)
+
+            inicio = time.perf_counter()
+            try:
+                self.guardados += guardar_datos_en_bd_bulk(datos, modo=self.modo)
+                self.lotes += 1
+            finally:
+                self.tiempo_carga += time.perf_counter() - inicio
+
+            # Solo ahora la caché da estas observaciones por guardadas
+            self.extractor.confirmar_cargadas(pendientes)
+        except Exception as e:
+            # El micro-lote se pierde pero los anteriores ya están confirmados
+            self.fallidos += len(datos) or len(pendientes)
+            self._error = e
+
+    def _consumir(self):
+        pendientes = []
+        limite = None
+
+        while True:
+            espera = None if limite is None else max(0.0, limite - time.monotonic())
+            try:
+                elemento = self.cola.get(timeout=espera)
+            except queue.Empty:
+                elemento = None
+
+            if elemento is not None and elemento is not _FIN:
+                if not pendientes:
+                    limite = time.monotonic() + self.max_espera
+                pendientes.append(elemento)
+
+            vencido = limite is not None and time.monotonic() >= limite
+            if pendientes and (len(pendientes) >= self.tamano_lote or vencido or elemento is _FIN):
+                self._guardar(pendientes)
+                pendientes, limite = [], None
+
+            if elemento is _FIN:
+                return
+
+    # ---------------------------------------------------
+    def ejecutar(self, ciudades=None, concurrencia=None):
+        concurrencia = max(1, concurrencia or self.extractor.max_concurrencia)
+        lotes = self.extractor.preparar_extraccion(ciudades)
+
+        logger.info(
+            f"Pipeline: {sum(map(len, lotes))} ciudades en {len(lotes)} peticiones "
+            f"(concurrencia={concurrencia}, micro-lotes de {self.tamano_lote})"
+        )
+
+        cargador = threading.Thread(target=self._consumir, name="pipeline-cargador")
+        cargador.start()
+        try:
+            with ThreadPoolExecutor(max_workers=concurrencia) as executor:
+                list(executor.map(self._producir, lotes))
+        finally:
+            # Volcado final: también si la extracción se interrumpe
+            self.cola.put(_FIN)
+            cargador.join()
+            self.extractor.finalizar_extraccion()
+
+        logger.info(
+            f"Pipeline: {self.guardados} registros guardados en {self.lotes} micro-lotes, "
+            f"{self.fallidos} fallidos"
+        )
+        if self._error is not None:
+            logger.error(f"Último error de carga: {str(self._error)}")
+
+        return self.guardados
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# Modo residente del ETL: en lugar de lanzarlo desde cron, un solo proceso
+# mantiene el extractor (sesión HTTP, caché) y el engine de la base entre
+# ciclos y decide cuándo toca consultar cada ciudad.
+#
+#   python -m scripts.planificador
+#   python -m scripts.planificador --ciclos 3
+#
+# Cada ciudad tiene su propio intervalo: si la estación no publicó una
+# observación nueva el intervalo se multiplica (hasta un máximo); en cuanto
+# cambia vuelve al intervalo base.
+import argparse
+import heapq
+import logging
+import os
+import random
+import signal
+import threading
+import time
+
+from scripts.extractor import WeatherstackExtractor
+from scripts.metricas import ejecutar_etl
+
+logger = logging.getLogger(__name__)
+
+INTERVALO_BASE = float(os.getenv('PLANIFICADOR_INTERVALO_BASE', '300'))
+INTERVALO_MAX = float(os.getenv('PLANIFICADOR_INTERVALO_MAX', '3600'))
+FACTOR_BACKOFF = float(os.getenv('PLANIFICADOR_FACTOR', '2'))
+# Fracción aleatoria (+/-) aplicada a cada intervalo
+JITTER = float(os.getenv('PLANIFICADOR_JITTER', '0.1'))
+# Ciudades que vencen dentro de esta ventana se extraen en el mismo ciclo
+VENTANA_AGRUPACION = float(os.getenv('PLANIFICADOR_VENTANA', '5'))
+
+
+class Planificador:
+    def __init__(self, extractor, intervalo_base=INTERVALO_BASE,
+                 intervalo_max=INTERVALO_MAX, factor=FACTOR_BACKOFF,
+                 jitter=JITTER, ventana=VENTANA_AGRUPACION,
+                 modo_carga=os.getenv('MODO_CARGA', 'ignorar')):
+        self.extractor = extractor
+        self.intervalo_base = intervalo_base
+        self.intervalo_max = max(intervalo_max, intervalo_base)
+        self.factor = factor
+        self.jitter = jitter
+        self.ventana = ventana
+        self.modo_carga = modo_carga
+        self._detener = threading.Event()
+
+        # Heap de (próxima ejecución monotónica, ciudad) e intervalo actual
+        self.intervalos = {}
+        self.cola = []
+        ahora = time.monotonic()
+        for ciudad in extractor.ciudades:
+            ciudad = ciudad.strip()
+            self.intervalos[ciudad] = intervalo_base
+            # Arranque escalonado para no consultar todas a la vez
+            heapq.heappush(self.cola, (ahora + random.uniform(0, self.ventana), ciudad))
+
+    def _con_jitter(self, intervalo):
+        return intervalo * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def _reprogramar(self, ciudades, sin_cambios):
+        ahora = time.monotonic()
+        for ciudad in ciudades:
+            if ciudad in sin_cambios:
+                intervalo = min(self.intervalos[ciudad] * self.factor, self.intervalo_max)
+            else:
+                intervalo = self.intervalo_base
+            self.intervalos[ciudad] = intervalo
+            heapq.heappush(self.cola, (ahora + self._con_jitter(intervalo), ciudad))
+
+    def _vencidas(self):
+        limite = time.monotonic() + self.ventana
+        ciudades = []
+        while self.cola and self.cola[0][0] <= limite:
+            ciudades.append(heapq.heappop(self.cola)[1])
+        return ciudades
+
+    def ejecutar_ciclo(self):
+        ciudades = self._vencidas()
+        if not ciudades:
+            return 0
+
+        guardados = 0
+        sin_cambios = set()
+        try:
+            guardados = ejecutar_etl(self.extractor, modo=self.modo_carga, ciudades=ciudades)
+            sin_cambios = self.extractor.ciudades_sin_cambios()
+        except Exception as e:
+            # Un ciclo fallido no detiene el proceso: se reintenta al intervalo base
+            logger.error(f"Error en ciclo del planificador: {str(e)}")
+        finally:
+            self._reprogramar(ciudades, sin_cambios)
+
+        logger.info(
+            f"Ciclo: {len(ciudades)} ciudades, {guardados} registros guardados, "
+            f"{len(sin_cambios)} sin cambios"
+        )
+        return guardados
+
+    def detener(self, *args):
+        self._detener.set()
+
+    def ejecutar(self, ciclos=None):
+        logger.info(
+            f"Planificador iniciado para {len(self.intervalos)} ciudades "
+            f"(intervalo {self.intervalo_base:.0f}s - {self.intervalo_max:.0f}s)"
+        )
+        hechos = 0
+        while not self._detener.is_set() and (ciclos is None or hechos < ciclos):
+            espera = self.cola[0][0] - time.monotonic()
+            if espera > 0 and self._detener.wait(espera):
+                break
+            self.ejecutar_ciclo()
+            hechos += 1
+
+        self.extractor.cerrar()
+        logger.info("Planificador detenido")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ETL residente con sondeo adaptativo por ciudad")
+    parser.add_argument("--ciclos", type=int, help="Termina tras N ciclos (por defecto, indefinido)")
+    args = parser.parse_args()
+
+    planificador = Planificador(WeatherstackExtractor())
+    signal.signal(signal.SIGINT, planificador.detener)
+    signal.signal(signal.SIGTERM, planificador.detener)
+    planificador.ejecutar(args.ciclos)
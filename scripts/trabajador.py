@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+# Modo multi-proceso: las ciudades viven en ciudades_trabajo y cada
+# trabajador (en esta u otra máquina) reclama un lote de ciudades vencidas
+# con una concesión que caduca, lo extrae y carga, y lo libera.
+#
+#   python -m scripts.trabajador
+#   python -m scripts.trabajador --lote 20 --ciclos 5
+#
+# Para escalar basta con lanzar más procesos contra la misma DATABASE_URL.
+# Si un trabajador muere, su concesión caduca y otro retoma esas ciudades.
+# Los intervalos por ciudad siguen las reglas del planificador.
+import argparse
+import logging
+import os
+import random
+import signal
+import socket
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, or_, select, update
+
+from scripts.database import engine, insert_dialecto
+from scripts.extractor import WeatherstackExtractor
+from scripts.metricas import ejecutar_etl
+from scripts.models import CiudadTrabajo
+from scripts.planificador import FACTOR_BACKOFF, INTERVALO_BASE, INTERVALO_MAX, JITTER
+
+logger = logging.getLogger(__name__)
+
+TAMANO_LOTE_TRABAJO = int(os.getenv('TRABAJADOR_LOTE', '50'))
+# Debe cubrir con holgura la extracción + carga de un lote
+DURACION_CONCESION = float(os.getenv('TRABAJADOR_CONCESION', '300'))
+# Espera cuando no hay ciudades vencidas
+ESPERA_SIN_TRABAJO = float(os.getenv('TRABAJADOR_ESPERA', '5'))
+
+
+def sincronizar_ciudades(ciudades, bind=engine):
+    # Agrega a la cola las ciudades que falten; las existentes no se tocan
+    with bind.begin() as conn:
+        stmt = insert_dialecto(conn, CiudadTrabajo).on_conflict_do_nothing(
+            index_elements=['ciudad']
+        )
+        conn.execute(stmt, [
+            {'ciudad': c.strip(), 'proxima_ejecucion': datetime.utcnow(), 'intervalo': INTERVALO_BASE}
+            for c in ciudades
+        ])
+
+
+def reclamar(conn, trabajador, limite, duracion=DURACION_CONCESION):
+    # Un solo UPDATE ... WHERE id IN (SELECT ...) RETURNING. En PostgreSQL el
+    # SELECT lleva FOR UPDATE SKIP LOCKED: dos trabajadores nunca esperan ni
+    # se llevan la misma fila. SQLite serializa las escrituras, así que el
+    # UPDATE completo ya es atómico frente a otros procesos.
+    ahora = datetime.utcnow()
+    libre = or_(CiudadTrabajo.concesion_hasta.is_(None), CiudadTrabajo.concesion_hasta < ahora)
+
+    candidatas = (
+        select(CiudadTrabajo.id)
+        .where(CiudadTrabajo.proxima_ejecucion <= ahora, libre)
+        .order_by(CiudadTrabajo.proxima_ejecucion)
+        .limit(limite)
+    )
+    if conn.dialect.name == "postgresql":
+        candidatas = candidatas.with_for_update(skip_locked=True)
+
+    stmt = (
+        update(CiudadTrabajo)
+        .where(CiudadTrabajo.id.in_(candidatas.scalar_subquery()), libre)
+        .values(trabajador=trabajador, concesion_hasta=ahora + timedelta(seconds=duracion))
+        .returning(CiudadTrabajo.ciudad, CiudadTrabajo.intervalo)
+    )
+    return dict(conn.execute(stmt).all())
+
+
+def liberar(conn, trabajador, intervalos):
+    # Reprograma cada ciudad y suelta la concesión, solo si sigue siendo
+    # nuestra (si caducó, otro trabajador pudo haberla reclamado)
+    ahora = datetime.utcnow()
+    for ciudad, intervalo in intervalos.items():
+        conn.execute(
+            update(CiudadTrabajo)
+            .where(
+                CiudadTrabajo.ciudad == ciudad,
+                and_(CiudadTrabajo.trabajador == trabajador, CiudadTrabajo.concesion_hasta >= ahora)
+            )
+            .values(
+                trabajador=None,
+                concesion_hasta=None,
+                intervalo=intervalo,
+                ultima_ejecucion=ahora,
+                proxima_ejecucion=ahora + timedelta(
+                    seconds=intervalo * random.uniform(1 - JITTER, 1 + JITTER)
+                ),
+            )
+        )
+
+
+class Trabajador:
+    def __init__(self, extractor, nombre=None, tamano_lote=TAMANO_LOTE_TRABAJO,
+                 duracion=DURACION_CONCESION, espera=ESPERA_SIN_TRABAJO,
+                 modo_carga=os.getenv('MODO_CARGA', 'ignorar')):
+        self.extractor = extractor
+        self.nombre = nombre or f"{socket.gethostname()}-{os.getpid()}"
+        self.tamano_lote = max(1, tamano_lote)
+        self.duracion = duracion
+        self.espera = espera
+        self.modo_carga = modo_carga
+        self._detener = threading.Event()
+
+    def ejecutar_ciclo(self):
+        with engine.begin() as conn:
+            reclamadas = reclamar(conn, self.nombre, self.tamano_lote, self.duracion)
+        if not reclamadas:
+            return None
+
+        ciudades = list(reclamadas)
+        guardados = 0
+        sin_cambios = set()
+        try:
+            guardados = ejecutar_etl(self.extractor, modo=self.modo_carga, ciudades=ciudades)
+            sin_cambios = self.extractor.ciudades_sin_cambios()
+        except Exception as e:
+            # Las ciudades se liberan igual, al intervalo base
+            logger.error(f"Error en el lote de {self.nombre}: {str(e)}")
+        finally:
+            intervalos = {
+                ciudad: min((intervalo or INTERVALO_BASE) * FACTOR_BACKOFF, INTERVALO_MAX)
+                if ciudad in sin_cambios else INTERVALO_BASE
+                for ciudad, intervalo in reclamadas.items()
+            }
+            with engine.begin() as conn:
+                liberar(conn, self.nombre, intervalos)
+
+        logger.info(
+            f"{self.nombre}: {len(ciudades)} ciudades, {guardados} registros guardados, "
+            f"{len(sin_cambios)} sin cambios"
+        )
+        return guardados
+
+    def detener(self, *args):
+        self._detener.set()
+
+    def ejecutar(self, ciclos=None):
+        logger.info(
+            f"Trabajador {self.nombre} iniciado (lotes de {self.tamano_lote}, "
+            f"concesión {self.duracion:.0f}s)"
+        )
+        hechos = 0
+        while not self._detener.is_set() and (ciclos is None or hechos < ciclos):
+            if self.ejecutar_ciclo() is None:
+                self._detener.wait(self.espera)
+            hechos += 1
+
+        self.extractor.cerrar()
+        logger.info(f"Trabajador {self.nombre} detenido")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Trabajador del ETL con concesiones en la base")
+    parser.add_argument("--lote", type=int, default=TAMANO_LOTE_TRABAJO)
+    parser.add_argument("--ciclos", type=int, help="Termina tras N intentos de reclamar (por defecto, indefinido)")
+    parser.add_argument("--nombre", help="Identificador del trabajador (por defecto host-pid)")
+    args = parser.parse_args()
+
+    extractor = WeatherstackExtractor()
+    sincronizar_ciudades(extractor.ciudades)
+
+    trabajador = Trabajador(extractor, nombre=args.nombre, tamano_lote=args.lote)
+    signal.signal(signal.SIGINT, trabajador.detener)
+    signal.signal(signal.SIGTERM, trabajador.detener)
+    trabajador.ejecutar(args.ciclos)
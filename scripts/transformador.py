@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# Transformación por lotes: lista de respuestas crudas de /current -> un
+# DataFrame tipado, en una sola pasada vectorizada (sin un dict por registro).
+import logging
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Rangos físicamente plausibles; fuera de ellos el valor se descarta (NaN)
+RANGO_TEMPERATURA = (-90.0, 60.0)
+RANGO_HUMEDAD = (0, 100)
+
+# Campos de la respuesta que se leen: columna -> (sección, clave)
+CAMPOS = {
+    "ciudad": ("location", "name"),
+    "pais": ("location", "country"),
+    "localtime_epoch": ("location", "localtime_epoch"),
+    "utc_offset": ("location", "utc_offset"),
+    "unidad": ("request", "unit"),
+    "temperatura": ("current", "temperature"),
+    "humedad": ("current", "humidity"),
+    "descripciones": ("current", "weather_descriptions"),
+    "observation_time": ("current", "observation_time"),
+}
+
+COLUMNAS = {
+    "ciudad": "object",
+    "pais": "object",
+    "temperatura": "float64",
+    "humedad": "Int16",
+    "descripcion": "object",
+    "fecha_extraccion": "datetime64[ns]",
+    "fecha_observacion": "datetime64[ns, UTC]",
+}
+
+
+def marco_vacio():
+    return pd.DataFrame({c: pd.Series(dtype=t) for c, t in COLUMNAS.items()})
+
+
+def _a_celsius(temperatura, unidad):
+    # Weatherstack: m = métrico (°C), f = Fahrenheit, s = científico (Kelvin)
+    return np.select(
+        [unidad == "f", unidad == "s"],
+        [(temperatura - 32) * 5 / 9, temperatura - 273.15],
+        default=temperatura
+    )
+
+
+def _fecha_observacion(crudo):
+    # localtime_epoch es la hora local expresada como epoch (no UTC real);
+    # restando utc_offset se obtiene "ahora" en UTC. observation_time solo
+    # trae la hora UTC ("02:55 PM"): se combina con esa fecha y, si queda en
+    # el futuro, la observación es del día anterior.
+    epoch = pd.to_numeric(crudo["localtime_epoch"], errors="coerce")
+    desfase = pd.to_numeric(crudo["utc_offset"], errors="coerce").fillna(0)
+    ahora_utc = pd.to_datetime(epoch - desfase * 3600, unit="s", utc=True)
+
+    hora = pd.to_datetime(crudo["observation_time"], format="%I:%M %p", errors="coerce")
+    observacion = ahora_utc.dt.normalize() + (hora - hora.dt.normalize())
+
+    futuro = observacion > ahora_utc + pd.Timedelta(minutes=5)
+    return observacion.mask(futuro, observacion - pd.Timedelta(days=1))
+
+
+def _valida(respuesta):
+    return isinstance(respuesta, dict) and "error" not in respuesta and "current" in respuesta
+
+
+def transformar_respuestas(respuestas, fecha_extraccion=None):
+    # Respuestas con error o sin "current" se descartan. Todas las filas del
+    # lote comparten la misma fecha_extraccion (UTC, como fecha_observacion),
+    # salvo que se pase una por respuesta (p. ej. al reproducir el archivo crudo).
+    if isinstance(fecha_extraccion, (list, tuple)):
+        pares = [(r, f) for r, f in zip(respuestas, fecha_extraccion) if _valida(r)]
+        validas = [r for r, _ in pares]
+        fecha_extraccion = pd.to_datetime([f for _, f in pares])
+    else:
+        validas = [r for r in respuestas if _valida(r)]
+        fecha_extraccion = pd.Timestamp(fecha_extraccion or datetime.utcnow())
+
+    if not validas:
+        return marco_vacio()
+
+    # Una columna por campo directamente desde los dicts (json_normalize
+    # copia cada respuesta completa y es mucho más lento)
+    crudo = pd.DataFrame({
+        columna: [(r.get(seccion) or {}).get(clave) for r in validas]
+        for columna, (seccion, clave) in CAMPOS.items()
+    })
+
+    unidad = crudo["unidad"].fillna("m").to_numpy()
+    temperatura = pd.Series(
+        _a_celsius(pd.to_numeric(crudo["temperatura"], errors="coerce").to_numpy(dtype=float), unidad)
+    )
+    humedad = pd.to_numeric(crudo["humedad"], errors="coerce")
+
+    temperatura_invalida = temperatura.notna() & ~temperatura.between(*RANGO_TEMPERATURA)
+    humedad_invalida = humedad.notna() & ~humedad.between(*RANGO_HUMEDAD)
+    if temperatura_invalida.any() or humedad_invalida.any():
+        logger.warning(
+            f"Valores fuera de rango descartados: {int(temperatura_invalida.sum())} "
+            f"temperaturas, {int(humedad_invalida.sum())} humedades"
+        )
+
+    df = pd.DataFrame({
+        "ciudad": crudo["ciudad"],
+        "pais": crudo["pais"],
+        "temperatura": temperatura.mask(temperatura_invalida),
+        "humedad": humedad.mask(humedad_invalida).round().astype("Int16"),
+        "descripcion": crudo["descripciones"].str[0].fillna("N/A"),
+        "fecha_extraccion": fecha_extraccion,
+        "fecha_observacion": _fecha_observacion(crudo),
+    })
+
+    sin_ciudad = df["ciudad"].isna()
+    if sin_ciudad.any():
+        logger.warning(f"{int(sin_ciudad.sum())} respuestas sin ciudad descartadas")
+        df = df[~sin_ciudad]
+
+    return df.reset_index(drop=True)
+
+
+def a_registros(df):
+    # DataFrame -> dicts con tipos de Python (lo que espera executemany):
+    # None en lugar de NaN/NA y fechas naive en UTC
+    marco = pd.DataFrame({
+        "ciudad": df["ciudad"].astype(object),
+        "pais": df["pais"].astype(object),
+        "temperatura": df["temperatura"],
+        "humedad": df["humedad"].astype("Float64"),
+        "descripcion": df["descripcion"].astype(object),
+        "fecha_extraccion": pd.Series(df["fecha_extraccion"].dt.to_pydatetime(), dtype=object, index=df.index),
+        "fecha_observacion": pd.Series(
+            df["fecha_observacion"].dt.tz_convert(None).dt.to_pydatetime(), dtype=object, index=df.index
+        ),
+    })
+    registros = marco.astype(object).where(marco.notna(), None).to_dict("records")
+    for registro in registros:
+        if registro["humedad"] is not None:
+            registro["humedad"] = int(registro["humedad"])
+    return registros
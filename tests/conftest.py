@@ -0,0 +1,112 @@
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pytest
+
+# Base, caché y logs en un directorio temporal. Se fija antes de importar
+# scripts.*, que lee el entorno (y abre logs/etl.log) al importarse.
+_TMP = Path(tempfile.mkdtemp(prefix="clima-tests-"))
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{_TMP / 'clima.db'}",
+    "CACHE_RUTA": str(_TMP / "cache.db"),
+    "ARCHIVO_CRUDO_DIR": "",
+    "CIUDADES": "Madrid,Lima",
+    "API_KEYS": "clave-test",
+    "WEATHERSTACK_BASE_URL": "http://weatherstack.test",
+    "MAX_REINTENTOS": "2",
+    "BACKOFF_BASE": "0",
+})
+(_TMP / "logs").mkdir()
+os.chdir(_TMP)
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+
+@pytest.fixture
+def bd():
+    # Esquema vacío en cada test
+    from scripts.database import Base, engine
+    from scripts.migraciones import aplicar_migraciones
+
+    Base.metadata.drop_all(engine)
+    aplicar_migraciones()
+    return engine
+
+
+@pytest.fixture
+def zona_horaria(monkeypatch):
+    # Proceso en UTC+9: datetime.now() va nueve horas por delante de utcnow()
+    monkeypatch.setenv("TZ", "Asia/Tokyo")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def respuesta_api(ciudad, temperatura=20.0, humedad=50, observacion="12:00 PM",
+                  localtime=datetime(2026, 10, 17, 14, 0)):
+    # Respuesta de /current de Weatherstack (utc_offset 0)
+    return {
+        "request": {"query": ciudad, "unit": "m"},
+        "location": {
+            "name": ciudad,
+            "country": "Test",
+            "localtime": localtime.strftime("%Y-%m-%d %H:%M"),
+            "localtime_epoch": int(localtime.replace(tzinfo=timezone.utc).timestamp()),
+            "utc_offset": "0.0",
+        },
+        "current": {
+            "observation_time": observacion,
+            "temperature": temperatura,
+            "humidity": humedad,
+            "weather_descriptions": ["Sunny"],
+        },
+    }
+
+
+def lectura(temperatura, extraccion, observacion=datetime(2026, 10, 17, 12, 0), ciudad="Madrid"):
+    # Registro ya transformado, como lo recibe guardar_datos_en_bd_bulk
+    return {
+        "ciudad": ciudad,
+        "pais": "Spain",
+        "temperatura": temperatura,
+        "humedad": 50,
+        "fecha_extraccion": extraccion,
+        "fecha_observacion": observacion,
+    }
+
+
+class RespuestaHTTP:
+    def __init__(self, data, status_code=200):
+        self.data = data
+        self.status_code = status_code
+
+    def json(self):
+        return self.data
+
+    def raise_for_status(self):
+        pass
+
+
+class SesionFalsa:
+    # Responde /current con la observación fija de cada ciudad; `guion` fija
+    # las primeras respuestas (errores, 429...)
+    def __init__(self, guion=()):
+        self.peticiones = 0
+        self.claves = []
+        self.guion = list(guion)
+
+    def get(self, url, params, timeout):
+        self.peticiones += 1
+        self.claves.append(params["access_key"])
+        if self.guion:
+            return self.guion.pop(0)
+        ciudades = params["query"].split(";")
+        datos = [respuesta_api(c) for c in ciudades]
+        return RespuestaHTTP(datos if len(datos) > 1 else datos[0])
+
+    def close(self):
+        pass
@@ -0,0 +1,20 @@
+from datetime import datetime
+
+from scripts.agregados import percentiles_por_ciudad
+from scripts.loader import guardar_datos_en_bd_bulk
+
+from conftest import lectura
+
+
+def test_percentiles_solo_de_la_ventana(bd):
+    guardar_datos_en_bd_bulk([
+        lectura(float(t), datetime(2026, 10, d, 12), observacion=datetime(2026, 10, d, 12))
+        for d, t in [(1, 100), (15, 10), (16, 20), (17, 30)]
+    ])
+
+    with bd.connect() as conn:
+        todo = percentiles_por_ciudad(conn, cuantiles=(0.5,))
+        ventana = percentiles_por_ciudad(conn, cuantiles=(0.5,), desde=datetime(2026, 10, 10))
+
+    assert todo["temperatura_p50"].tolist() == [25.0]
+    assert ventana["temperatura_p50"].tolist() == [20.0]
@@ -0,0 +1,111 @@
+import io
+from datetime import datetime
+
+import pandas as pd
+import pytest
+from sqlalchemy import func, select
+
+from scripts import consultas
+from scripts.agregados import reconstruir_agregados, resumen_por_ciudad
+from scripts.exportador import exportar_csv, exportar_parquet
+from scripts.loader import guardar_datos_en_bd_bulk
+from scripts.models import AgregadoDiario, ParticionArchivada, RegistroClima
+from scripts.particiones import archivar, archivar_mes
+
+from conftest import lectura
+
+
+@pytest.fixture
+def archivado(bd, tmp_path):
+    # Septiembre archivado en Parquet, octubre en la tabla caliente
+    guardar_datos_en_bd_bulk([
+        lectura(float(dia), datetime(2026, mes, dia, 12), observacion=datetime(2026, mes, dia, 12),
+                ciudad=ciudad)
+        for mes in (9, 10)
+        for dia in (1, 2, 3)
+        for ciudad in ("Madrid", "Lima")
+    ])
+    with bd.begin() as conn:
+        assert archivar_mes(conn, datetime(2026, 9, 1), directorio=str(tmp_path)) == 6
+    return bd
+
+
+def test_serie_incluye_meses_archivados(archivado):
+    df = consultas.serie(("archivo", 1), ciudades=["Madrid"])
+
+    assert len(df) == 6
+    assert df["Fecha"].min() == pd.Timestamp(2026, 9, 1, 12)
+    assert df["Fecha"].is_monotonic_increasing
+
+
+def test_serie_filtra_el_archivo(archivado):
+    df = consultas.serie(("archivo", 2), ciudades=["Lima"], temp_min=2, hasta=datetime(2026, 9, 30))
+
+    assert df["Fecha"].tolist() == [pd.Timestamp(2026, 9, 2, 12), pd.Timestamp(2026, 9, 3, 12)]
+
+
+def test_exportacion_csv_incluye_meses_archivados(archivado):
+    destino = io.StringIO()
+
+    assert exportar_csv(destino, ciudades=["Madrid"]) == 6
+
+    df = pd.read_csv(io.StringIO(destino.getvalue()), parse_dates=["fecha_extraccion"])
+    assert df["fecha_extraccion"].is_monotonic_increasing
+    assert df["pais"].tolist() == ["Spain"] * 6
+
+
+def test_exportacion_parquet_incluye_meses_archivados(archivado, tmp_path):
+    destino = str(tmp_path / "export.parquet")
+
+    assert exportar_parquet(destino, desde=datetime(2026, 9, 2)) == 10
+    assert len(pd.read_parquet(destino)) == 10
+
+
+
+def _registros_diarios(bd):
+    with bd.connect() as conn:
+        return conn.execute(select(func.sum(AgregadoDiario.registros))).scalar()
+
+
+def test_reconstruir_sin_rango_conserva_los_meses_archivados(archivado):
+    assert _registros_diarios(archivado) == 12
+
+    with archivado.begin() as conn:
+        reconstruir_agregados(conn)
+
+    assert _registros_diarios(archivado) == 12
+
+
+def test_reconstruir_rango_lee_el_archivo(archivado):
+    with archivado.begin() as conn:
+        reconstruir_agregados(conn, datetime(2026, 9, 2), datetime(2026, 10, 2))
+
+    assert _registros_diarios(archivado) == 12
+    with archivado.connect() as conn:
+        resumen = resumen_por_ciudad(conn, desde=datetime(2026, 9, 1), hasta=datetime(2026, 9, 30))
+    assert resumen["temperatura_suma"].tolist() == [6.0, 6.0]
+
+
+def test_archivar_otra_vez_un_mes_con_filas_nuevas(archivado, tmp_path):
+    # Tras archivar septiembre llega una lectura nueva y otra repetida
+    guardar_datos_en_bd_bulk([
+        lectura(4.0, datetime(2026, 9, 4, 12), observacion=datetime(2026, 9, 4, 12)),
+        lectura(99.0, datetime(2026, 9, 1, 12), observacion=datetime(2026, 9, 1, 12)),
+    ])
+
+    assert archivar(meses_retencion=0, directorio=str(tmp_path)) == 2
+
+    with archivado.connect() as conn:
+        calientes = conn.execute(
+            select(func.count()).select_from(RegistroClima)
+            .where(RegistroClima.fecha_observacion < datetime(2026, 10, 1))
+        ).scalar()
+        catalogo = conn.execute(select(ParticionArchivada.mes, ParticionArchivada.registros)).all()
+    assert calientes == 0
+    assert catalogo == [(datetime(2026, 9, 1), 7)]
+    assert len(pd.read_parquet(tmp_path / "2026-09.parquet")) == 7
+    assert not list(tmp_path.glob("*.tmp"))
+
+    df = consultas.serie(("archivo", 3), ciudades=["Madrid"], hasta=datetime(2026, 9, 30))
+    assert df["Temperatura"].tolist() == [1.0, 2.0, 3.0, 4.0]
+    assert _registros_diarios(archivado) == 13
@@ -0,0 +1,70 @@
+from datetime import datetime
+
+from sqlalchemy import select
+
+from scripts.backfill import ejecutar_backfill, pendientes
+from scripts.models import BackfillProgreso, ClimaActual, RegistroClima
+
+
+class ExtractorHistorico:
+    # /historical que solo trae datos de los días en `disponibles`
+    ciudades = ["Madrid"]
+    max_concurrencia = 1
+    archivo = None
+
+    def __init__(self, disponibles):
+        self.disponibles = disponibles
+        self.peticiones = []
+
+    def llamar_api(self, endpoint, params, consulta):
+        fechas = params["historical_date"].split(";")
+        self.peticiones.append(fechas)
+        return {
+            "location": {"name": consulta, "country": "Spain", "utc_offset": "0"},
+            "historical": {
+                fecha: {"hourly": [
+                    {"time": "0", "temperature": 10, "humidity": 40},
+                    {"time": "1200", "temperature": 20, "humidity": 60},
+                ]}
+                for fecha in fechas if fecha in self.disponibles
+            },
+        }
+
+
+def test_checkpoint_solo_de_dias_con_datos(bd):
+    extractor = ExtractorHistorico({"2026-10-01", "2026-10-03"})
+
+    assert ejecutar_backfill(
+        datetime(2026, 10, 1), datetime(2026, 10, 3), extractor=extractor
+    ) == 4
+
+    with bd.connect() as conn:
+        hechos = conn.execute(
+            select(BackfillProgreso.fecha, BackfillProgreso.registros)
+            .order_by(BackfillProgreso.fecha)
+        ).all()
+    assert hechos == [(datetime(2026, 10, 1), 2), (datetime(2026, 10, 3), 2)]
+
+    # El día que no vino queda pendiente para la próxima ejecución
+    assert pendientes(["Madrid"], datetime(2026, 10, 1), datetime(2026, 10, 3)) == [
+        ("Madrid", [datetime(2026, 10, 2)])
+    ]
+
+
+def test_reintento_completa_el_dia_faltante(bd):
+    ejecutar_backfill(
+        datetime(2026, 10, 1), datetime(2026, 10, 2),
+        extractor=ExtractorHistorico({"2026-10-01"})
+    )
+    extractor = ExtractorHistorico({"2026-10-01", "2026-10-02"})
+
+    assert ejecutar_backfill(
+        datetime(2026, 10, 1), datetime(2026, 10, 2), extractor=extractor
+    ) == 2
+    assert extractor.peticiones == [["2026-10-02"]]
+
+    with bd.connect() as conn:
+        assert len(conn.execute(select(RegistroClima.id)).all()) == 4
+        assert conn.execute(
+            select(ClimaActual.temperatura, ClimaActual.fecha_observacion)
+        ).one() == (20.0, datetime(2026, 10, 2, 12, 0))
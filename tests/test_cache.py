@@ -0,0 +1,97 @@
+import pytest
+from sqlalchemy import func, select
+
+from conftest import SesionFalsa, respuesta_api
+
+
+@pytest.fixture
+def cache(tmp_path):
+    from scripts.cache import CacheRespuestas
+
+    cache = CacheRespuestas(str(tmp_path / "cache.db"))
+    yield cache
+    cache.cerrar()
+
+
+@pytest.fixture
+def extractor(bd, tmp_path, monkeypatch):
+    from scripts.extractor import WeatherstackExtractor
+
+    monkeypatch.setenv("CACHE_RUTA", str(tmp_path / "cache.db"))
+    extractor = WeatherstackExtractor()
+    extractor.session = SesionFalsa()
+    yield extractor
+    extractor.cerrar()
+
+
+def test_observacion_sin_confirmar_sigue_siendo_nueva(cache):
+    data = respuesta_api("Madrid")
+
+    assert cache.guardar("Madrid", data)
+    assert cache.guardar("Madrid", data)
+    assert not cache.ya_cargada("Madrid", data)
+
+    cache.confirmar([("Madrid", data)])
+
+    assert cache.ya_cargada("Madrid", data)
+    assert not cache.guardar("Madrid", data)
+    assert cache.estadisticas()["sin_cambios"] == 1
+
+
+def test_observacion_nueva_tras_confirmar(cache):
+    cache.guardar("Madrid", respuesta_api("Madrid"))
+    cache.confirmar([("Madrid", respuesta_api("Madrid"))])
+
+    assert cache.guardar("Madrid", respuesta_api("Madrid", observacion="12:30 PM"))
+
+
+def test_tabla_anterior_recibe_columna_confirmada(tmp_path):
+    import sqlite3
+    from scripts.cache import CacheRespuestas
+
+    ruta = str(tmp_path / "vieja.db")
+    conn = sqlite3.connect(ruta)
+    conn.execute(
+        "CREATE TABLE respuestas (ciudad TEXT PRIMARY KEY, observacion TEXT, "
+        "payload TEXT NOT NULL, guardado REAL NOT NULL, accedido REAL NOT NULL)"
+    )
+    conn.close()
+
+    cache = CacheRespuestas(ruta)
+    try:
+        assert cache.guardar("Madrid", respuesta_api("Madrid"))
+    finally:
+        cache.cerrar()
+
+
+@pytest.mark.parametrize("pipeline", [False, True])
+def test_carga_fallida_se_reintenta_con_la_cache_vigente(extractor, monkeypatch, pipeline):
+    import scripts.metricas
+    import scripts.pipeline
+    from scripts.metricas import ejecutar_etl
+    from scripts.models import RegistroClima
+
+    def carga_fallida(datos, modo):
+        raise RuntimeError("base caída")
+
+    with monkeypatch.context() as m:
+        m.setattr(scripts.metricas, "guardar_datos_en_bd_bulk", carga_fallida)
+        m.setattr(scripts.pipeline, "guardar_datos_en_bd_bulk", carga_fallida)
+        try:
+            ejecutar_etl(extractor, pipeline=pipeline)
+        except RuntimeError:
+            pass
+
+    # La segunda ejecución sale de la caché (TTL vigente) pero la carga anterior
+    # nunca hizo commit: no puede contar como "sin cambios"
+    peticiones = extractor.session.peticiones
+    assert ejecutar_etl(extractor, pipeline=pipeline) == 2
+    assert extractor.session.peticiones == peticiones
+    assert extractor.ciudades_sin_cambios() == set()
+
+    with scripts.metricas.engine.connect() as conn:
+        assert conn.execute(select(func.count(RegistroClima.id))).scalar() == 2
+
+    # Ya confirmada: la tercera no vuelve a cargar
+    assert ejecutar_etl(extractor, pipeline=pipeline) == 0
+    assert extractor.ciudades_sin_cambios() == {"Madrid", "Lima"}
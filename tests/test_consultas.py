@@ -0,0 +1,88 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, select
+
+from scripts import consultas
+from scripts.agregados import totales
+from scripts.consultas import VistaIncremental
+from scripts.loader import guardar_datos_en_bd_bulk
+from scripts.models import Ciudad, RegistroClima
+
+from conftest import lectura
+
+
+def insertar(bd, id, fecha, temperatura=20.0):
+    with bd.begin() as conn:
+        ciudad_id = conn.execute(select(Ciudad.id).where(Ciudad.nombre == "Madrid")).scalar()
+        conn.execute(insert(RegistroClima).values(
+            id=id, ciudad_id=ciudad_id, temperatura=temperatura, humedad=50,
+            fecha_extraccion=fecha, fecha_observacion=fecha
+        ))
+
+
+def test_vista_incremental_solo_lee_lo_nuevo(bd):
+    ahora = datetime.utcnow()
+    guardar_datos_en_bd_bulk([lectura(10.0, ahora, observacion=ahora)])
+    vista = VistaIncremental()
+
+    assert vista.actualizar() == 1
+    assert vista.actualizar() == 0
+
+    insertar(bd, 50, ahora + timedelta(minutes=1))
+    assert vista.actualizar() == 1
+    assert vista.ultimo_id == 50
+    assert list(vista.df.index) == [1, 50]
+
+
+def test_vista_incremental_recoge_commits_fuera_de_orden(bd):
+    ahora = datetime.utcnow()
+    guardar_datos_en_bd_bulk([lectura(10.0, ahora, observacion=ahora)])
+    insertar(bd, 3, ahora + timedelta(minutes=2))
+    vista = VistaIncremental(solape=10)
+    vista.actualizar()
+
+    # Id 2 asignado antes que el 3 pero confirmado después de leer la marca
+    insertar(bd, 2, ahora + timedelta(minutes=1))
+
+    assert vista.actualizar() == 1
+    assert sorted(vista.df.index) == [1, 2, 3]
+    assert vista.ultimo_id == 3
+    assert vista.actualizar() == 0
+
+
+def test_vista_incremental_descarta_lo_que_sale_de_la_ventana(bd):
+    ahora = datetime.utcnow()
+    guardar_datos_en_bd_bulk([
+        lectura(10.0, ahora - timedelta(hours=5), observacion=ahora - timedelta(hours=5)),
+        lectura(20.0, ahora, observacion=ahora),
+    ])
+    vista = VistaIncremental(ventana=timedelta(hours=2))
+
+    assert vista.actualizar() == 1
+    assert vista.df["Temperatura"].tolist() == [20.0]
+
+
+def test_ventana_de_la_vista_en_utc(bd, zona_horaria):
+    hace_una_hora = datetime.utcnow() - timedelta(hours=1)
+    guardar_datos_en_bd_bulk([lectura(10.0, hace_una_hora, observacion=hace_una_hora)])
+    vista = VistaIncremental(ventana=timedelta(hours=2))
+
+    assert vista.actualizar() == 1
+    assert vista.actualizado <= datetime.utcnow()
+
+
+def test_resumen_con_ventana_horaria(bd):
+    ahora = datetime(2026, 10, 17, 12, 30)
+    guardar_datos_en_bd_bulk([
+        lectura(10.0, ahora - timedelta(hours=5), observacion=ahora - timedelta(hours=5)),
+        lectura(20.0, ahora, observacion=ahora),
+    ])
+
+    todo = totales(consultas.resumen(("resumen", 1)))
+    ventana = totales(consultas.resumen(
+        ("resumen", 1), desde=ahora - timedelta(hours=2), grano="hora"
+    ))
+
+    assert todo["registros"] == 2
+    assert ventana["registros"] == 1
+    assert ventana["temperatura_media"] == 20.0
@@ -0,0 +1,15 @@
+import pandas as pd
+
+from scripts.exportador import exportar_parquet
+
+
+def test_exportacion_parquet_vacia_conserva_el_esquema(bd, tmp_path):
+    destino = str(tmp_path / "vacio.parquet")
+
+    assert exportar_parquet(destino) == 0
+
+    df = pd.read_parquet(destino)
+    assert df.empty
+    assert list(df.columns) == [
+        "ciudad", "pais", "temperatura", "humedad", "fecha_extraccion", "fecha_observacion"
+    ]
@@ -0,0 +1,144 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import func, select
+
+import scripts.extractor
+import scripts.loader
+from scripts.extractor import ErrorReintentable, WeatherstackExtractor
+from scripts.loader import guardar_datos_en_bd_bulk
+from scripts.models import AgregadoDiario
+
+from conftest import RespuestaHTTP, SesionFalsa, lectura, respuesta_api
+
+
+def error_api(codigo):
+    return RespuestaHTTP({"success": False, "error": {"code": codigo, "info": "error"}})
+
+
+@pytest.fixture
+def esperas(monkeypatch):
+    # Segundos de backoff pedidos, sin dormir
+    esperas = []
+    monkeypatch.setattr(scripts.extractor.time, "sleep", esperas.append)
+    return esperas
+
+
+@pytest.fixture
+def extractor(bd, monkeypatch):
+    monkeypatch.setenv("API_KEYS", "clave-a,clave-b")
+    monkeypatch.setenv("CACHE_TTL_SEGUNDOS", "0")
+    extractor = WeatherstackExtractor()
+    yield extractor
+    extractor.cerrar()
+
+
+@pytest.mark.parametrize("respuesta", [error_api(104), error_api(101), RespuestaHTTP({}, status_code=429)])
+def test_error_de_clave_rota_sin_backoff_ni_reintento(extractor, esperas, respuesta):
+    extractor.session = SesionFalsa([respuesta])
+
+    data = extractor.llamar_api("current", {"query": "Madrid"}, "Madrid")
+
+    assert data["location"]["name"] == "Madrid"
+    assert len(set(extractor.session.claves)) == 2
+    assert esperas == []
+    assert extractor.latencias[-1]["intentos"] == 1
+
+
+def test_error_transitorio_usa_backoff(extractor, esperas):
+    extractor.session = SesionFalsa([error_api(615), RespuestaHTTP({}, status_code=503)])
+
+    extractor.llamar_api("current", {"query": "Madrid"}, "Madrid")
+
+    assert len(esperas) == 2
+    assert extractor.latencias[-1]["intentos"] == 3
+
+
+def test_rotacion_acotada_si_todas_las_claves_fallan(extractor, esperas):
+    extractor.claves.pausa_limite = 0
+    extractor.session = SesionFalsa([RespuestaHTTP({}, status_code=429)] * 10)
+
+    with pytest.raises(ErrorReintentable):
+        extractor.llamar_api("current", {"query": "Madrid"}, "Madrid")
+
+    # Dos cambios de clave gratis y después los reintentos normales (MAX_REINTENTOS=2)
+    assert extractor.session.peticiones == 2 + 3
+    assert len(esperas) == 2
+
+
+def test_latencia_solo_mide_http(extractor, monkeypatch):
+    import time
+
+    class SesionLenta(SesionFalsa):
+        def get(self, url, params, timeout):
+            time.sleep(0.02)
+            return super().get(url, params, timeout)
+
+    adquirir = extractor.claves.adquirir
+
+    def adquirir_lento():
+        # Como el límite por segundo: espera antes de cada petición
+        time.sleep(0.1)
+        return adquirir()
+
+    monkeypatch.setattr(extractor.claves, "adquirir", adquirir_lento)
+    extractor.session = SesionLenta()
+
+    extractor.llamar_api("current", {"query": "Madrid"}, "Madrid")
+
+    medida = extractor.latencias[-1]
+    assert 20 <= medida["latencia_ms"] < 100
+    assert medida["espera_ms"] >= 100
+
+
+@pytest.mark.parametrize("params, esperadas", [
+    ({"query": "Madrid;Lima"}, 2),
+    ({"query": "Madrid", "historical_date": "2026-10-01;2026-10-02;2026-10-03", "hourly": 1}, 3),
+    ({"query": "Madrid;Lima", "historical_date": "2026-10-01;2026-10-02"}, 4),
+])
+def test_cuota_por_ubicacion_y_fecha(extractor, params, esperadas):
+    extractor.session = SesionFalsa()
+
+    extractor.llamar_api("historical" if "historical_date" in params else "current", params, "consulta")
+
+    assert sum(c.usadas for c in extractor.claves.claves) == esperadas
+
+
+def test_reproducir_reconstruye_los_acumulados_una_sola_vez(bd, tmp_path, monkeypatch):
+    monkeypatch.setenv("ARCHIVO_CRUDO_DIR", str(tmp_path / "crudo"))
+    llamadas = []
+    original = scripts.loader.reconstruir_agregados
+
+    def espia(conn, desde=None, hasta=None, ciudad_ids=None):
+        llamadas.append((desde, hasta))
+        return original(conn, desde, hasta, ciudad_ids)
+
+    monkeypatch.setattr(scripts.loader, "reconstruir_agregados", espia)
+    # Lectura del 1 guardada con una extracción del día 5: la reproducción la mueve
+    guardar_datos_en_bd_bulk([lectura(99.0, datetime(2026, 10, 5, 9), observacion=datetime(2026, 10, 1, 12))])
+
+    extractor = WeatherstackExtractor(reproduccion=True)
+    try:
+        for dia in (1, 2, 3):
+            for ciudad in ("Madrid", "Lima"):
+                extractor.archivo.agregar(
+                    "current", ciudad,
+                    respuesta_api(ciudad, temperatura=float(dia), localtime=datetime(2026, 10, dia, 14)),
+                    fecha=datetime(2026, 10, dia, 12, 5)
+                )
+        extractor.archivo.volcar()
+
+        assert extractor.reproducir(tamano_bloque=1) == 6
+    finally:
+        extractor.cerrar()
+
+    assert llamadas == [
+        (datetime(2026, 10, 1), datetime(2026, 10, 3)),
+        (datetime(2026, 10, 5), datetime(2026, 10, 5)),
+    ]
+    with bd.connect() as conn:
+        diarios = conn.execute(
+            select(AgregadoDiario.periodo, func.sum(AgregadoDiario.registros))
+            .group_by(AgregadoDiario.periodo).order_by(AgregadoDiario.periodo)
+        ).all()
+    assert diarios == [(datetime(2026, 10, d), 2) for d in (1, 2, 3)]
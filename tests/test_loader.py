@@ -0,0 +1,152 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import func, insert, select, text
+from sqlalchemy.exc import IntegrityError
+
+from scripts.agregados import reconstruir_agregados
+from scripts.loader import _resolver_ciudades, guardar_datos_en_bd_bulk, reconstruir_clima_actual
+from scripts.migraciones import aplicar_migraciones
+from scripts.models import AgregadoDiario, AgregadoHorario, Ciudad, ClimaActual, RegistroClima
+
+from conftest import lectura
+
+
+def contar(conn, modelo):
+    return conn.execute(select(func.count()).select_from(modelo)).scalar()
+
+
+def acumulado_diario(conn):
+    return conn.execute(
+        select(AgregadoDiario.registros, AgregadoDiario.temperatura_suma)
+    ).all()
+
+
+def test_ignorar_no_duplica_ni_toca_acumulados(bd):
+    assert guardar_datos_en_bd_bulk([lectura(10.0, datetime(2026, 10, 17, 12, 5))]) == 1
+    assert guardar_datos_en_bd_bulk([lectura(99.0, datetime(2026, 10, 17, 12, 30))]) == 0
+
+    with bd.connect() as conn:
+        assert contar(conn, RegistroClima) == 1
+        assert acumulado_diario(conn) == [(1, 10.0)]
+        assert conn.execute(select(func.sum(AgregadoHorario.registros))).scalar() == 1
+
+
+def test_duplicado_ignorado_no_pisa_clima_actual(bd):
+    guardar_datos_en_bd_bulk([lectura(10.0, datetime(2026, 10, 17, 12, 5))])
+    # Misma observación releída más tarde: ON CONFLICT DO NOTHING la descarta
+    guardar_datos_en_bd_bulk([lectura(99.0, datetime(2026, 10, 17, 12, 30))])
+
+    with bd.connect() as conn:
+        temperatura, extraccion = conn.execute(
+            select(ClimaActual.temperatura, ClimaActual.fecha_extraccion)
+        ).one()
+
+    assert temperatura == 10.0
+    assert extraccion == datetime(2026, 10, 17, 12, 5)
+
+
+def test_insertar_falla_con_duplicados(bd):
+    guardar_datos_en_bd_bulk([lectura(10.0, datetime(2026, 10, 17, 12, 5))], modo="insertar")
+
+    with pytest.raises(Exception):
+        guardar_datos_en_bd_bulk([lectura(11.0, datetime(2026, 10, 17, 12, 30))], modo="insertar")
+
+    with bd.connect() as conn:
+        assert contar(conn, RegistroClima) == 1
+
+
+def test_actualizar_reemplaza_la_lectura_y_recalcula(bd):
+    guardar_datos_en_bd_bulk([lectura(10.0, datetime(2026, 10, 17, 12, 5))])
+    assert guardar_datos_en_bd_bulk(
+        [lectura(12.0, datetime(2026, 10, 17, 12, 30))], modo="actualizar"
+    ) == 1
+
+    with bd.connect() as conn:
+        assert contar(conn, RegistroClima) == 1
+        assert acumulado_diario(conn) == [(1, 12.0)]
+        assert conn.execute(select(ClimaActual.temperatura)).scalar() == 12.0
+
+
+def test_modo_invalido(bd):
+    with pytest.raises(ValueError):
+        guardar_datos_en_bd_bulk([lectura(10.0, datetime(2026, 10, 17, 12, 5))], modo="fusionar")
+
+
+def test_actualizar_recalcula_el_dia_del_que_sale_la_lectura(bd):
+    guardar_datos_en_bd_bulk([
+        lectura(10.0, datetime(2026, 10, 16, 23, 55)),
+        lectura(5.0, datetime(2026, 10, 16, 22, 0), observacion=datetime(2026, 10, 16, 22, 0)),
+    ])
+    # La misma observación, re-extraída al día siguiente
+    guardar_datos_en_bd_bulk([lectura(12.0, datetime(2026, 10, 17, 0, 10))], modo="actualizar")
+
+    with bd.connect() as conn:
+        diarios = conn.execute(
+            select(AgregadoDiario.periodo, AgregadoDiario.registros, AgregadoDiario.temperatura_suma)
+            .order_by(AgregadoDiario.periodo)
+        ).all()
+        horarios = conn.execute(select(func.sum(AgregadoHorario.registros))).scalar()
+
+    assert diarios == [
+        (datetime(2026, 10, 16), 1, 5.0),
+        (datetime(2026, 10, 17), 1, 12.0),
+    ]
+    assert horarios == 2
+
+
+
+class CarreraConOtroCargador:
+    # La consulta de ciudades no ve "Madrid" y justo después otro cargador la crea
+    def __init__(self, conn):
+        self.conn = conn
+        self.dialect = conn.dialect
+        self.primera = True
+
+    def execute(self, *args):
+        resultado = self.conn.execute(*args)
+        if not self.primera:
+            return resultado
+        self.primera = False
+        filas = resultado.all()
+        self.conn.execute(insert(Ciudad).values(nombre="Madrid", pais="Spain"))
+        return SimpleNamespace(all=lambda: filas)
+
+
+def test_ciudad_creada_por_otro_cargador(bd):
+    with bd.begin() as conn:
+        ids = _resolver_ciudades(CarreraConOtroCargador(conn), [lectura(10.0, datetime(2026, 10, 17))])
+        filas = conn.execute(select(Ciudad.id, Ciudad.nombre)).all()
+
+    assert filas == [(ids["Madrid"], "Madrid")]
+
+
+def test_migracion_fusiona_ciudades_repetidas(bd):
+    dia = datetime(2026, 10, 17, 12)
+    with bd.begin() as conn:
+        conn.execute(text("DROP INDEX uq_ciudades_nombre"))
+        conn.execute(insert(Ciudad), [{"id": 1, "nombre": "Madrid"}, {"id": 2, "nombre": "Madrid"}])
+        conn.execute(insert(RegistroClima), [
+            {"ciudad_id": 1, "temperatura": 10.0, "fecha_extraccion": dia, "fecha_observacion": dia},
+            # La misma observación cargada dos veces, una por id
+            {"ciudad_id": 2, "temperatura": 10.0, "fecha_extraccion": dia, "fecha_observacion": dia},
+            {"ciudad_id": 2, "temperatura": 20.0, "fecha_extraccion": dia + timedelta(hours=1),
+             "fecha_observacion": dia + timedelta(hours=1)},
+        ])
+        reconstruir_agregados(conn)
+        reconstruir_clima_actual(conn)
+
+    aplicar_migraciones()
+
+    with bd.connect() as conn:
+        assert conn.execute(select(Ciudad.id)).scalars().all() == [1]
+        assert conn.execute(
+            select(RegistroClima.ciudad_id, RegistroClima.temperatura).order_by(RegistroClima.id)
+        ).all() == [(1, 10.0), (1, 20.0)]
+        assert acumulado_diario(conn) == [(2, 30.0)]
+        assert conn.execute(select(ClimaActual.ciudad_id, ClimaActual.temperatura)).all() == [(1, 20.0)]
+
+    with pytest.raises(IntegrityError):
+        with bd.begin() as conn:
+            conn.execute(insert(Ciudad).values(nombre="Madrid"))
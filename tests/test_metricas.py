@@ -0,0 +1,35 @@
+import sys
+
+import pytest
+from sqlalchemy import select
+
+from scripts.metricas import MedicionETL
+from scripts.models import MetricasETL
+
+
+class ExtractorSinPeticiones:
+    latencias = []
+    cache = None
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="RSS desde /proc")
+def test_memoria_por_ejecucion(bd):
+    medicion = MedicionETL()
+    # ~50 MB vivos durante la ejecución
+    bloque = bytearray(50 * 1024 * 1024)
+
+    medicion.guardar(ExtractorSinPeticiones(), "ok", 0, 0, 0)
+    del bloque
+    # El pico del proceso ya quedó alto: otra ejecución igual no lo sube
+    medicion = MedicionETL()
+    medicion.guardar(ExtractorSinPeticiones(), "ok", 0, 0, 0)
+
+    with bd.connect() as conn:
+        filas = conn.execute(
+            select(MetricasETL.memoria_rss_mb, MetricasETL.memoria_pico_incremento_mb)
+            .order_by(MetricasETL.id)
+        ).all()
+
+    assert filas[0].memoria_rss_mb > 50
+    assert filas[0].memoria_pico_incremento_mb >= 0
+    assert filas[1].memoria_pico_incremento_mb == 0
@@ -0,0 +1,57 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from scripts.loader import guardar_datos_en_bd_bulk
+from scripts.muestreo import lttb, serie_submuestreada
+
+from conftest import lectura
+
+
+def test_lttb_conserva_extremos_y_picos():
+    x = np.arange(1000)
+    y = np.zeros(1000)
+    y[437] = 50.0
+    y[712] = -30.0
+
+    indices = lttb(x, y, 20)
+
+    assert len(indices) == 20
+    assert indices[0] == 0 and indices[-1] == 999
+    assert np.all(np.diff(indices) > 0)
+    assert {437, 712} <= set(indices.tolist())
+
+
+@pytest.mark.parametrize("umbral", [10, 11, 50, 2, 0])
+def test_lttb_sin_submuestreo(umbral):
+    # Con umbral >= n (o < 3, sin triángulos posibles) vuelven todos los puntos
+    x = np.arange(10)
+
+    assert lttb(x, x * 2.0, umbral).tolist() == list(range(10))
+
+
+def test_lttb_con_umbral_minimo():
+    x = np.arange(100)
+
+    assert lttb(x, np.sin(x), 3).tolist()[::2] == [0, 99]
+
+
+def test_serie_submuestreada_acota_los_puntos_por_ciudad(bd):
+    inicio = datetime(2026, 10, 1)
+    guardar_datos_en_bd_bulk([
+        lectura(float(i % 24), inicio + timedelta(minutes=10 * i),
+                observacion=inicio + timedelta(minutes=10 * i), ciudad=ciudad)
+        for i in range(2000)
+        for ciudad in ("Madrid", "Lima")
+    ])
+
+    with bd.connect() as conn:
+        df = serie_submuestreada(conn, puntos_max=50)
+
+    conteos = df.groupby("Ciudad").size()
+    assert conteos.to_dict() == {"Lima": 50, "Madrid": 50}
+    madrid = df[df["Ciudad"] == "Madrid"]
+    assert madrid["Fecha"].is_monotonic_increasing
+    assert madrid["Fecha"].iloc[0] < inicio + timedelta(hours=2)
+    assert madrid["Fecha"].iloc[-1] > inicio + timedelta(minutes=10 * 1999) - timedelta(hours=2)
@@ -0,0 +1,131 @@
+import threading
+import time
+
+import pytest
+from sqlalchemy import select
+
+import scripts.pipeline
+from scripts.extractor import WeatherstackExtractor
+from scripts.metricas import ejecutar_etl
+from scripts.models import MetricasETL
+from scripts.pipeline import PipelineETL
+
+from conftest import SesionFalsa, respuesta_api
+
+
+class ExtractorFalso:
+    # Un lote por ciudad; `pausa` separa las respuestas de cada lote
+    max_concurrencia = 1
+
+    def __init__(self, ciudades, pausa=0.0):
+        self.ciudades = ciudades
+        self.pausa = pausa
+        self.producidas = 0
+        self.confirmadas = []
+
+    def preparar_extraccion(self, ciudades=None):
+        return [self.ciudades]
+
+    def extraer_nuevas(self, lote):
+        for ciudad in lote:
+            self.producidas += 1
+            yield ciudad, respuesta_api(ciudad)
+            time.sleep(self.pausa)
+
+    def confirmar_cargadas(self, pares):
+        self.confirmadas += [ciudad for ciudad, _ in pares]
+
+    def finalizar_extraccion(self):
+        pass
+
+
+@pytest.fixture
+def cargas(monkeypatch):
+    # Ciudades de cada micro-lote, sin tocar la base
+    cargas = []
+
+    def guardar(datos, modo):
+        cargas.append(datos["ciudad"].tolist())
+        return len(datos)
+
+    monkeypatch.setattr(scripts.pipeline, "guardar_datos_en_bd_bulk", guardar)
+    return cargas
+
+
+def ciudades(n):
+    return [f"C{i}" for i in range(n)]
+
+
+def test_vuelca_por_tamano(cargas):
+    extractor = ExtractorFalso(ciudades(5))
+    pipeline = PipelineETL(extractor, tamano_lote=2, max_espera=60)
+
+    assert pipeline.ejecutar() == 5
+    assert cargas == [["C0", "C1"], ["C2", "C3"], ["C4"]]
+    assert pipeline.lotes == 3
+
+
+def test_vuelca_por_tiempo(cargas):
+    extractor = ExtractorFalso(ciudades(2), pausa=0.3)
+    pipeline = PipelineETL(extractor, tamano_lote=100, max_espera=0.05)
+
+    assert pipeline.ejecutar() == 2
+    assert cargas == [["C0"], ["C1"]]
+
+
+def test_cola_llena_frena_a_los_productores(monkeypatch):
+    liberar = threading.Event()
+
+    def guardar_lento(datos, modo):
+        liberar.wait(5)
+        return len(datos)
+
+    monkeypatch.setattr(scripts.pipeline, "guardar_datos_en_bd_bulk", guardar_lento)
+    extractor = ExtractorFalso(ciudades(10))
+    pipeline = PipelineETL(extractor, capacidad=1, tamano_lote=1, max_espera=60)
+
+    hilo = threading.Thread(target=pipeline.ejecutar)
+    hilo.start()
+    time.sleep(0.3)
+    # Una en carga, una en la cola y el productor bloqueado en put()
+    assert extractor.producidas <= 3
+    liberar.set()
+    hilo.join(5)
+
+    assert not hilo.is_alive()
+    assert pipeline.guardados == 10
+
+
+def test_error_de_carga_no_detiene_el_pipeline(monkeypatch):
+    def guardar(datos, modo):
+        if "C2" in datos["ciudad"].tolist():
+            raise RuntimeError("base caída")
+        return len(datos)
+
+    monkeypatch.setattr(scripts.pipeline, "guardar_datos_en_bd_bulk", guardar)
+    extractor = ExtractorFalso(ciudades(6))
+    pipeline = PipelineETL(extractor, tamano_lote=2, max_espera=60)
+
+    assert pipeline.ejecutar() == 4
+    assert pipeline.fallidos == 2
+    assert isinstance(pipeline._error, RuntimeError)
+    # El micro-lote perdido no se confirma en la caché
+    assert extractor.confirmadas == ["C0", "C1", "C4", "C5"]
+
+
+def test_error_de_carga_marca_la_ejecucion(bd, tmp_path, monkeypatch):
+    def carga_fallida(datos, modo):
+        raise RuntimeError("base caída")
+
+    monkeypatch.setattr(scripts.pipeline, "guardar_datos_en_bd_bulk", carga_fallida)
+    monkeypatch.setenv("CACHE_RUTA", str(tmp_path / "cache.db"))
+    extractor = WeatherstackExtractor()
+    extractor.session = SesionFalsa()
+    try:
+        assert ejecutar_etl(extractor, pipeline=True) == 0
+    finally:
+        extractor.cerrar()
+
+    with bd.connect() as conn:
+        fila = conn.execute(select(MetricasETL.estado, MetricasETL.registros_fallidos)).one()
+    assert fila == ("error", 2)
@@ -0,0 +1,97 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select, update
+
+import scripts.trabajador
+from scripts.models import CiudadTrabajo
+from scripts.planificador import INTERVALO_BASE
+from scripts.trabajador import Trabajador, liberar, reclamar, sincronizar_ciudades
+
+
+@pytest.fixture
+def cola(bd):
+    sincronizar_ciudades(["Madrid", "Lima", "Quito"], bind=bd)
+    return bd
+
+
+def fila(bd, ciudad):
+    with bd.connect() as conn:
+        return conn.execute(select(CiudadTrabajo).where(CiudadTrabajo.ciudad == ciudad)).one()
+
+
+def test_dos_trabajadores_no_reclaman_la_misma_ciudad(cola):
+    with cola.begin() as conn:
+        primero = reclamar(conn, "a", 2)
+    with cola.begin() as conn:
+        segundo = reclamar(conn, "b", 10)
+    with cola.begin() as conn:
+        tercero = reclamar(conn, "c", 10)
+
+    assert len(primero) == 2
+    assert set(segundo) == {"Madrid", "Lima", "Quito"} - set(primero)
+    assert tercero == {}
+    assert fila(cola, next(iter(primero))).trabajador == "a"
+
+
+def test_concesion_vencida_la_retoma_otro_trabajador(cola):
+    with cola.begin() as conn:
+        reclamar(conn, "a", 10)
+        # El trabajador "a" muere y su concesión caduca
+        conn.execute(update(CiudadTrabajo).where(CiudadTrabajo.ciudad == "Lima").values(
+            concesion_hasta=datetime.utcnow() - timedelta(seconds=1)
+        ))
+    with cola.begin() as conn:
+        retomadas = reclamar(conn, "b", 10)
+
+    assert list(retomadas) == ["Lima"]
+    assert fila(cola, "Lima").trabajador == "b"
+
+
+def test_liberar_no_toca_una_concesion_ajena(cola):
+    with cola.begin() as conn:
+        reclamar(conn, "a", 10)
+        conn.execute(update(CiudadTrabajo).values(
+            concesion_hasta=datetime.utcnow() - timedelta(seconds=1)
+        ))
+    with cola.begin() as conn:
+        reclamar(conn, "b", 10)
+    with cola.begin() as conn:
+        # "a" vuelve tarde: sus concesiones ya son de "b"
+        liberar(conn, "a", {"Madrid": 999.0})
+
+    madrid = fila(cola, "Madrid")
+    assert madrid.trabajador == "b"
+    assert madrid.intervalo == INTERVALO_BASE
+
+
+def test_liberar_reprograma_y_suelta(cola):
+    with cola.begin() as conn:
+        reclamar(conn, "a", 10)
+    with cola.begin() as conn:
+        liberar(conn, "a", {"Madrid": 600.0})
+
+    madrid = fila(cola, "Madrid")
+    assert madrid.trabajador is None and madrid.concesion_hasta is None
+    assert madrid.intervalo == 600.0
+    assert madrid.proxima_ejecucion > datetime.utcnow() + timedelta(seconds=300)
+    with cola.begin() as conn:
+        assert "Madrid" not in reclamar(conn, "b", 10)
+
+
+class ExtractorFalso:
+    def ciudades_sin_cambios(self):
+        return set()
+
+
+def test_ciclo_fallido_libera_las_ciudades(cola, monkeypatch):
+    def falla(*args, **kwargs):
+        raise RuntimeError("sin base")
+    monkeypatch.setattr(scripts.trabajador, "ejecutar_etl", falla)
+
+    assert Trabajador(ExtractorFalso(), nombre="a").ejecutar_ciclo() == 0
+
+    for ciudad in ("Madrid", "Lima", "Quito"):
+        restante = fila(cola, ciudad)
+        assert restante.trabajador is None
+        assert restante.intervalo == INTERVALO_BASE
@@ -0,0 +1,73 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from scripts.transformador import a_registros, transformar_respuestas
+
+from conftest import respuesta_api
+
+
+def respuesta(ciudad="Lima", localtime=datetime(2026, 10, 17, 9, 0), utc_offset="-5.0",
+              observacion="01:55 PM", temperatura=20.0, humedad=50, unidad="m"):
+    data = respuesta_api(ciudad, temperatura, humedad, observacion, localtime)
+    data["location"]["utc_offset"] = utc_offset
+    data["request"]["unit"] = unidad
+    return data
+
+
+def test_fecha_extraccion_por_defecto_en_utc(zona_horaria):
+    antes = datetime.utcnow()
+    df = transformar_respuestas([respuesta_api("Madrid")])
+    despues = datetime.utcnow()
+
+    assert datetime.now() > despues + timedelta(hours=8)
+    assert antes <= df["fecha_extraccion"][0].to_pydatetime() <= despues
+
+
+@pytest.mark.parametrize("localtime, utc_offset, observacion, esperada", [
+    # Lima 09:00 (UTC-5) = 14:00 UTC
+    (datetime(2026, 10, 17, 9, 0), "-5.0", "01:55 PM", datetime(2026, 10, 17, 13, 55)),
+    # Tokio ya es día 18 en hora local; en UTC sigue siendo el 17
+    (datetime(2026, 10, 18, 8, 30), "9.0", "11:15 PM", datetime(2026, 10, 17, 23, 15)),
+    # Desfase de media hora (India)
+    (datetime(2026, 10, 17, 19, 40), "5.5", "02:00 PM", datetime(2026, 10, 17, 14, 0)),
+    # 00:10 UTC con observación de las 23:55: es del día anterior
+    (datetime(2026, 10, 18, 9, 10), "9.0", "11:55 PM", datetime(2026, 10, 17, 23, 55)),
+])
+def test_fecha_observacion_en_utc(localtime, utc_offset, observacion, esperada):
+    df = transformar_respuestas(
+        [respuesta(localtime=localtime, utc_offset=utc_offset, observacion=observacion)],
+        fecha_extraccion=datetime(2026, 10, 17, 14, 0)
+    )
+
+    assert a_registros(df)[0]["fecha_observacion"] == esperada
+
+
+@pytest.mark.parametrize("unidad, temperatura", [("m", 20.0), ("f", 68.0), ("s", 293.15)])
+def test_temperatura_en_celsius(unidad, temperatura):
+    df = transformar_respuestas([respuesta(unidad=unidad, temperatura=temperatura)])
+
+    assert df["temperatura"][0] == pytest.approx(20.0)
+
+
+def test_descarta_valores_fuera_de_rango_y_respuestas_con_error():
+    df = transformar_respuestas([
+        respuesta("Lima", temperatura=200.0, humedad=50),
+        respuesta("Quito", temperatura=15.0, humedad=150),
+        {"success": False, "error": {"code": 615, "info": "error"}},
+    ])
+    registros = a_registros(df)
+
+    assert [r["ciudad"] for r in registros] == ["Lima", "Quito"]
+    assert registros[0]["temperatura"] is None and registros[0]["humedad"] == 50
+    assert registros[1]["temperatura"] == 15.0 and registros[1]["humedad"] is None
+
+
+def test_fecha_de_extraccion_por_respuesta():
+    fechas = [datetime(2026, 10, 17, 14, 0), datetime(2026, 10, 17, 15, 0)]
+    df = transformar_respuestas(
+        [respuesta("Lima"), {"error": {"code": 615}}, respuesta("Quito")],
+        fecha_extraccion=[fechas[0], datetime(2026, 1, 1), fechas[1]]
+    )
+
+    assert [r["fecha_extraccion"] for r in a_registros(df)] == fechas